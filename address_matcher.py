@@ -0,0 +1,257 @@
+# address_matcher.py
+# Fuzzy koppeling van FleetGO-adressen ("Quellijnstraat 79, Amsterdam, NL", meestal zonder postcode)
+# aan klantadressen ("Singel 460, 1017 AW, Amsterdam, NL").
+#
+# Blocking: een kandidaat moet hetzelfde huisnummer hebben (en dezelfde postcode als beide die
+# hebben); zonder huisnummer worden kandidaten gezocht via straatnaam-trigrammen. Binnen een
+# blok scoort trigram-gelijkenis van de straatnaam, met een kleine straf voor een andere stad.
+# Zo blijft matchen bijna lineair i.p.v. elke leg tegen elke klant.
+#
+#   python address_matcher.py                          legs uit data/matched vs data/customers.csv
+#   python address_matcher.py customers_old.csv        zelfde, tegen de originele klantexport
+
+import re
+import sys
+import time
+import threading
+import unicodedata
+from collections import defaultdict, namedtuple, Counter
+from pathlib import Path
+
+BASE = Path(__file__).parent
+
+MIN_SCORE = 0.82
+CITY_PENALTY = 0.9
+NGRAM = 3
+MAX_GRAM_CANDIDATES = 25
+
+# Afkortingen in straatnamen (na lowercase, zonder punten)
+ABBREVIATIONS = {
+    "str": "straat", "ln": "laan", "pl": "plein", "wg": "weg", "gr": "gracht", "kd": "kade",
+    "v": "van", "vd": "van de", "mr": "meester", "dr": "doctor", "prof": "professor",
+    "st": "sint", "burg": "burgemeester", "1e": "eerste", "2e": "tweede", "3e": "derde",
+}
+
+Address = namedtuple("Address", "street number suffix postcode city")
+AddressMatch = namedtuple("AddressMatch", "key score method")
+
+_PC_RE = re.compile(r"^(\d{4})\s*([A-Za-z]{2})$")
+_STREET_NR_RE = re.compile(r"^(.*?\D)\s*(\d+)\s*[-/]?\s*([A-Za-z]{0,3}\d{0,3})?$")
+
+
+def _fold(s):
+    s = unicodedata.normalize("NFKD", str(s))
+    return "".join(c for c in s if not unicodedata.combining(c)).lower()
+
+
+def normalize_street(street):
+    """'Mt. Ondinaweg' -> 'mt ondinaweg'; '1e Const. Huygensstr' -> 'eerste const huygensstraat'."""
+    s = re.sub(r"[^\w\s]", " ", _fold(street or ""))
+    tokens = []
+    for t in s.split():
+        if t.endswith("str") and len(t) > 3 and t[:-3] not in ("", "a"):
+            t = t[:-3] + "straat"
+        tokens.append(ABBREVIATIONS.get(t, t))
+    return " ".join(tokens)
+
+
+def normalize_postcode(pc):
+    m = _PC_RE.match(re.sub(r"\s+", "", str(pc or "")))
+    return f"{m.group(1)} {m.group(2).upper()}" if m else None
+
+
+def parse_address(address):
+    """
+    'Straat 12A, 1234 AB, Stad, NL' -> Address (postcode en stad optioneel).
+    Tekstdelen: eerste = straat + nr, laatste = stad; 1 tekstdeel zonder cijfer is de stad.
+    """
+    parts = [p.strip() for p in str(address or "").split(",") if p.strip()]
+    if parts and parts[-1].upper() == "NL":
+        parts = parts[:-1]
+    postcode = next((normalize_postcode(p) for p in parts if normalize_postcode(p)), None)
+    text = [p for p in parts if not normalize_postcode(p)]
+
+    street = number = suffix = city = None
+    if len(text) >= 2 or (text and re.search(r"\d", text[0])):
+        m = _STREET_NR_RE.match(text[0])
+        if m:
+            street, number, suffix = m.group(1).strip(), int(m.group(2)), (m.group(3) or "").lower() or None
+        else:
+            street = text[0]
+        city = text[-1] if len(text) >= 2 else None
+    elif text:
+        city = text[0]
+    return Address(normalize_street(street) if street else None, number, suffix, postcode,
+                   _fold(city).strip() if city else None)
+
+
+def ngrams(s, n=NGRAM):
+    s = f" {s.replace(' ', '')} "
+    return {s[i:i + n] for i in range(max(1, len(s) - n + 1))}
+
+
+def dice(a, b):
+    return 2 * len(a & b) / (len(a) + len(b)) if a and b else 0.0
+
+
+class AddressMatcher:
+    """
+    Herbruikbare index over klantadressen. records: iterable van (key, Address) of alleen keys
+    (strings worden met parse_address geparsed). match() geeft AddressMatch of None.
+    """
+
+    def __init__(self, records, min_score: float = MIN_SCORE):
+        self.min_score = min_score
+        self.keys, self.addrs, self.grams = [], [], []
+        self.by_pc_nr = defaultdict(list)
+        self.by_nr = defaultdict(list)
+        self.by_gram = defaultdict(list)
+        self.exact = {}
+        for rec in records:
+            key, addr = (rec, parse_address(rec)) if isinstance(rec, str) else rec
+            i = len(self.keys)
+            self.keys.append(key)
+            self.addrs.append(addr)
+            g = ngrams(addr.street) if addr.street else set()
+            self.grams.append(g)
+            self.exact.setdefault(key, i)
+            if addr.number is not None:
+                self.by_nr[addr.number].append(i)
+                if addr.postcode:
+                    self.by_pc_nr[(addr.postcode, addr.number)].append(i)
+            for gram in g:
+                self.by_gram[gram].append(i)
+        self._cache = {}
+        self.stats = Counter()
+        self._lock = threading.Lock()  # cache + stats; de index zelf is na __init__ read-only
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _score(self, q, q_grams, i):
+        c = self.addrs[i]
+        if q.number is not None and c.number is not None and q.number != c.number:
+            return 0.0
+        if q.postcode and c.postcode and q.postcode != c.postcode:
+            return 0.0
+        if not c.street:
+            # Klant zonder straat: alleen postcode + huisnummer kan nog
+            return 1.0 if (q.postcode and q.postcode == c.postcode and q.number == c.number) else 0.0
+        score = dice(q_grams, self.grams[i])
+        if q.suffix and c.suffix and q.suffix != c.suffix:
+            score *= 0.95
+        if q.city and c.city and q.city != c.city:
+            score *= CITY_PENALTY
+        return score
+
+    def candidates(self, q, q_grams):
+        """(kandidaat-ids, methode) volgens de blocking-regels."""
+        if q.postcode and q.number is not None and (q.postcode, q.number) in self.by_pc_nr:
+            return self.by_pc_nr[(q.postcode, q.number)], "postcode+nr"
+        if q.number is not None:
+            return self.by_nr.get(q.number, ()), "nr+ngram"
+        if not q_grams:
+            return (), "none"
+        counts = Counter()
+        for gram in q_grams:
+            counts.update(self.by_gram.get(gram, ()))
+        return [i for i, _ in counts.most_common(MAX_GRAM_CANDIDATES)], "ngram"
+
+    def match(self, address):
+        with self._lock:
+            if address in self._cache:
+                self.stats["cache_hits"] += 1
+                return self._cache[address]
+        # Scoren buiten de lock; 2 threads met hetzelfde adres rekenen hooguit dubbel
+        result, comparisons = self._match(address)
+        with self._lock:
+            self._cache[address] = result
+            self.stats["queries"] += 1
+            self.stats["comparisons"] += comparisons
+            self.stats["matched" if result else "unmatched"] += 1
+        return result
+
+    def _match(self, address):
+        """(AddressMatch of None, aantal vergeleken kandidaten)."""
+        i = self.exact.get(address)
+        if i is not None:
+            return AddressMatch(self.keys[i], 1.0, "exact"), 0
+        q = parse_address(address)
+        q_grams = ngrams(q.street) if q.street else set()
+        ids, method = self.candidates(q, q_grams)
+        return self._best(q, q_grams, ids, method), len(ids)
+
+    def _best(self, q, q_grams, ids, method):
+        best, best_score = None, 0.0
+        for i in ids:
+            s = self._score(q, q_grams, i)
+            if s > best_score:
+                best, best_score = i, s
+        if best is None or best_score < self.min_score:
+            return None
+        return AddressMatch(self.keys[best], round(best_score, 3), method)
+
+    def match_bruteforce(self, address):
+        """Zelfde scoring tegen alle klanten (zonder blocking); alleen voor vergelijking."""
+        q = parse_address(address)
+        q_grams = ngrams(q.street) if q.street else set()
+        return self._best(q, q_grams, range(len(self.keys)), "bruteforce")
+
+    def match_many(self, addresses):
+        return {a: self.match(a) for a in dict.fromkeys(addresses) if a}
+
+
+# -------------------------------------------------
+# Klantbestanden
+# -------------------------------------------------
+def records_from_export(path: Path):
+    """Originele klantexport (customers_old.csv: 'Adres + nr', nummer, toevoeging, Postcode, Plaats)."""
+    import csv
+    out = []
+    with Path(path).open("r", encoding="utf-8", errors="ignore", newline="") as f:
+        for row in csv.DictReader(f):
+            street_nr = (row.get("Adres + nr") or "").strip()
+            pc = normalize_postcode(row.get("Postcode"))
+            city = (row.get("Plaats") or "").strip()
+            if not street_nr:
+                continue
+            key = ", ".join(p for p in (street_nr, pc, city or "Amsterdam", "NL") if p)
+            out.append((key, parse_address(key)))
+    return out
+
+
+def main(argv=None):
+    import route_merge as rm
+    argv = sys.argv[1:] if argv is None else argv
+
+    if argv:
+        records = records_from_export(Path(argv[0]))
+        source = argv[0]
+    else:
+        records = list(rm.get_customer_coords())
+        source = str(rm.CUSTOMERS_PATH)
+
+    t = time.perf_counter()
+    matcher = AddressMatcher(records)
+    build_s = time.perf_counter() - t
+
+    legs = []
+    for p in rm.iter_partitions():
+        df = rm.read_partition(p)
+        legs += df["from_address"].dropna().tolist() + df["to_address"].dropna().tolist()
+
+    t = time.perf_counter()
+    matches = matcher.match_many(legs)
+    match_s = time.perf_counter() - t
+    matched_legs = sum(1 for a in legs if matches.get(a))
+    print(f"Klanten: {len(matcher)} ({source}), index in {build_s * 1000:.0f} ms")
+    print(f"Leg-adressen: {len(legs)} ({len(matches)} uniek)")
+    print(f"Gematcht: {matched_legs / max(1, len(legs)):.1%} van de leg-adressen, "
+          f"{sum(1 for m in matches.values() if m) / max(1, len(matches)):.1%} van de unieke adressen")
+    print(f"Tijd: {match_s:.3f} s ({len(matches) / match_s:.0f} unieke adressen/s), "
+          f"{matcher.stats['comparisons'] / max(1, matcher.stats['queries']):.1f} vergelijkingen per adres")
+    print(f"Per methode: {dict(Counter(m.method for m in matches.values() if m))}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
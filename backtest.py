@@ -0,0 +1,206 @@
+# backtest.py
+# Offline backtest: speelt elke historische dag (routes_training.jsonl) opnieuw af door optimize_route
+# en vergelijkt het plan met wat er echt gereden is: busverdeling, stops per bus, km en de regels
+# uit validate_and_fix. Dagen lopen parallel in een process pool (1 pool per engine-variant).
+#
+#   python backtest.py                                   local + llm (tegen mock_llm), alle cores
+#   python backtest.py --engines local,local@SEQUENCE_COST=time --workers 8
+#   python backtest.py --engines llm --mock-llm-latency 1.0 --mock-llm-invalid-rate 0.1
+#
+# Variant: engine[@KEY=VAL[@KEY=VAL]]; de KEY=VAL's worden als environment in de workers gezet
+# vóór route_brain geladen wordt (zelfde knoppen als de Railway Variables).
+# Rapport: data/reports/backtest.json (samenvatting per variant + 1 compacte regel per dag).
+
+import os
+import sys
+import json
+import time
+import argparse
+from collections import defaultdict, Counter
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+BASE = Path(__file__).parent
+TRAINING_JSONL = BASE / "data" / "routes_training.jsonl"
+REPORT_PATH = BASE / "data" / "reports" / "backtest.json"
+
+MAX_STOPS_PER_BUS = 18
+BUSES = ["Ocho", "Rebel"]
+
+
+# -------------------------------------------------
+# Historische dagen
+# -------------------------------------------------
+def historical_days(path: Path = TRAINING_JSONL):
+    """
+    Per datum: de aanvraag (alle stops van die dag, zonder de vertrekpunten/depots)
+    en wat er gebeurde: stops per bus en geregistreerde km (som van distance_from_prev).
+    """
+    per_date = defaultdict(list)
+    with Path(path).open("r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                r = json.loads(line)
+                per_date[r["date"]].append(r)
+
+    days = []
+    for date, routes in sorted(per_date.items()):
+        depots = {r["stops"][0]["address"] for r in routes}
+        stops, actual, km = {}, {}, {}
+        for r in routes:
+            bus = r.get("bus_name") or "?"
+            addrs = [s["address"] for s in r["stops"][1:] if s["address"] not in depots]
+            actual.setdefault(bus, []).extend(a for a in dict.fromkeys(addrs) if a not in stops)
+            stops.update(dict.fromkeys(addrs))
+            km[bus] = km.get(bus, 0.0) + sum((s.get("distance_from_prev") or 0) for s in r["stops"]) / 1000.0
+        request = {
+            "date": date,
+            "max_stops_per_bus": MAX_STOPS_PER_BUS,
+            "buses": list(BUSES),
+            "stops": [{"address": a} for a in stops],
+        }
+        days.append({"request": request, "actual": actual, "recorded_km": km})
+    return days
+
+
+# -------------------------------------------------
+# Worker (draait in een apart proces)
+# -------------------------------------------------
+def _init_worker(env):
+    # Vóór de eerste import van route_brain, zodat de module-constanten de variant oppikken
+    os.environ.update(env)
+    os.environ["ROUTE_CACHE_SIZE"] = "0"
+    sys.stdout = open(os.devnull, "w")
+
+
+def _score(day, plan, reasons, elapsed_s):
+    from route_sequencer import route_km
+
+    actual = day["actual"]
+    planned = {bus: arr for bus, arr in (plan.get("bus_routes") or {}).items()}
+    bus_of = {a: bus for bus, arr in actual.items() for a in arr}
+    assigned = [(a, bus) for bus, arr in planned.items() for a in arr]
+    same_bus = sum(1 for a, bus in assigned if bus_of.get(a) == bus)
+    n_stops = len(day["request"]["stops"])
+
+    # Historische volgorde op dezelfde afstandsmatrix als het plan (appels met appels)
+    actual_km = sum(route_km(arr) for arr in actual.values() if arr)
+    plan_km = sum((plan.get("km_per_bus") or {}).values())
+    return {
+        "date": day["request"]["date"],
+        "stops": n_stops,
+        "buses_actual": sum(1 for arr in actual.values() if arr),
+        "buses_plan": sum(1 for arr in planned.values() if arr),
+        "per_bus_actual": {bus: len(arr) for bus, arr in actual.items()},
+        "per_bus_plan": {bus: len(arr) for bus, arr in planned.items()},
+        "same_bus": round(same_bus / n_stops, 3) if n_stops else None,
+        "recorded_km": round(sum(day["recorded_km"].values()), 1),
+        "actual_km": round(actual_km, 1),
+        "plan_km": round(plan_km, 1),
+        "violations": reasons,
+        "ms": round(elapsed_s * 1000, 1),
+    }
+
+
+def run_day(args):
+    engine, day = args
+    import metrics
+    from route_brain import optimize_route
+
+    before = metrics.FALLBACKS.values()
+    t = time.perf_counter()
+    try:
+        plan = optimize_route(day["request"], engine=engine, use_cache=False)
+    except Exception as e:
+        return {"date": day["request"]["date"], "error": str(e), "ms": round((time.perf_counter() - t) * 1000, 1)}
+    elapsed = time.perf_counter() - t
+    after = metrics.FALLBACKS.values()
+    reasons = sorted(k[1] for k, n in after.items() if n > before.get(k, 0))
+    return _score(day, plan, reasons, elapsed)
+
+
+# -------------------------------------------------
+# Samenvatting
+# -------------------------------------------------
+def summarize(rows):
+    ok = [r for r in rows if "error" not in r]
+    violations = Counter(v for r in ok for v in r["violations"])
+    # single_route_* zijn dagregels, geen afgekeurde plannen
+    rejected = sum(1 for r in ok if any(not v.startswith("single_route_") for v in r["violations"]))
+    actual_km = sum(r["actual_km"] for r in ok)
+    plan_km = sum(r["plan_km"] for r in ok)
+    return {
+        "days": len(rows),
+        "errors": len(rows) - len(ok),
+        "bus_split_match": round(sum(r["buses_plan"] == r["buses_actual"] for r in ok) / len(ok), 3) if ok else None,
+        "same_bus_rate": round(sum(r["same_bus"] or 0 for r in ok) / len(ok), 3) if ok else None,
+        "recorded_km": round(sum(r["recorded_km"] for r in ok)),
+        "actual_km": round(actual_km),
+        "plan_km": round(plan_km),
+        "km_vs_actual": round(plan_km / actual_km - 1, 3) if actual_km else None,
+        "rejected_rate": round(rejected / len(ok), 3) if ok else None,
+        "violations": dict(violations.most_common()),
+        "ms_total": round(sum(r["ms"] for r in rows)),
+    }
+
+
+def parse_variant(spec):
+    engine, *pairs = spec.split("@")
+    env = dict(p.split("=", 1) for p in pairs if "=" in p)
+    return engine.strip(), env
+
+
+def run_variant(spec, days, workers, extra_env=None):
+    engine, env = parse_variant(spec)
+    env = dict(extra_env or {}, **env)
+    # Zware imports zonder env-knoppen 1x in de parent; geforkte workers erven ze (~0.7 s per worker)
+    import numpy  # noqa: F401
+    import openai  # noqa: F401
+    t = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(env,)) as ex:
+        rows = list(ex.map(run_day, [(engine, d) for d in days], chunksize=max(1, len(days) // (workers * 8))))
+    wall = time.perf_counter() - t
+    summary = summarize(rows)
+    summary.update(variant=spec, workers=workers, wall_s=round(wall, 2))
+    return summary, rows
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Backtest van optimize_route tegen de historische FleetGO-dagen")
+    ap.add_argument("--engines", default="local,llm", help="komma-gescheiden varianten: engine[@KEY=VAL...]")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--days", type=int, default=0, help="alleen de eerste N dagen (0 = alle)")
+    ap.add_argument("--real-llm", action="store_true", help="echte OpenAI-API i.p.v. mock_llm")
+    ap.add_argument("--mock-llm-latency", type=float, default=0.0)
+    ap.add_argument("--mock-llm-failure-rate", type=float, default=0.0)
+    ap.add_argument("--mock-llm-invalid-rate", type=float, default=0.0)
+    ap.add_argument("--out", type=Path, default=REPORT_PATH)
+    args = ap.parse_args(argv)
+
+    days = historical_days()
+    if args.days:
+        days = days[:args.days]
+    specs = [s.strip() for s in args.engines.split(",") if s.strip()]
+
+    extra_env = {}
+    if not args.real_llm and any(parse_variant(s)[0] == "llm" for s in specs):
+        from mock_llm import start_mock_llm
+        _, base_url, _ = start_mock_llm(latency_s=args.mock_llm_latency, failure_rate=args.mock_llm_failure_rate,
+                                        invalid_rate=args.mock_llm_invalid_rate, seed=1)
+        extra_env = {"OPENAI_BASE_URL": base_url, "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "mock")}
+
+    print(f"Backtest: {len(days)} dagen, varianten {specs}, {args.workers} workers")
+    report = {"generated": time.strftime("%Y-%m-%dT%H:%M:%S"), "summary": [], "days": {}}
+    for spec in specs:
+        summary, rows = run_variant(spec, days, args.workers, extra_env)
+        report["summary"].append(summary)
+        report["days"][spec] = rows
+        print(json.dumps(summary, ensure_ascii=False))
+
+    args.out.parent.mkdir(parents=True, exist_ok=True)
+    args.out.write_text(json.dumps(report, ensure_ascii=False, separators=(",", ":")), encoding="utf-8")
+    print(f"Rapport: {args.out}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
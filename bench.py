@@ -0,0 +1,937 @@
+# bench.py
+# Benchmarks voor route-bot (alles lokaal, geen netwerk: de LLM is mock_llm.py)
+#
+#   python bench.py loadtest --server async --concurrency 1,4,16,32 --llm-latency 1.0
+#   python bench.py loadtest --server threaded --engine llm,local --llm-failure-rate 0.1 --corpus-out corpus.jsonl
+#   python bench.py loadtest --corpus corpus.jsonl          (zelfde aanvragen opnieuw afspelen)
+#   python bench.py convert --years 5
+#   python bench.py startup --customers 50000
+#   python bench.py geocode-store --addresses 5000
+#   python bench.py geocode --latency 0.2 --rate 40 --workers 1,4,16
+#   python bench.py ingest --years 5
+#   python bench.py build-training --years 5
+#   python bench.py match --sample 500
+#   python bench.py sequence --budget-ms 50
+#   python bench.py travel-times --holdout-days 60
+#   python bench.py workers --workers 1,2,4
+
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import threading
+import contextlib
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+BASE = Path(__file__).parent
+TRAINING_JSON = BASE / "data" / "routes_training.json"
+
+
+# -------------------------------------------------
+# Hulpfuncties
+# -------------------------------------------------
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    k = (len(values) - 1) * p / 100.0
+    lo, hi = int(k), min(int(k) + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def build_corpus(path: Path = TRAINING_JSON, max_stops_per_bus: int = 18):
+    """Eén /optimize-route aanvraag per historische datum (alle stops van die dag, zonder depot)."""
+    routes = json.loads(path.read_text(encoding="utf-8"))
+    per_date = defaultdict(dict)
+    for r in routes:
+        for s in r["stops"][1:]:
+            per_date[r["date"]][s["address"]] = None
+    return [
+        {
+            "date": date,
+            "max_stops_per_bus": max_stops_per_bus,
+            "buses": ["Ocho", "Rebel"],
+            "stops": [{"address": a} for a in addrs],
+        }
+        for date, addrs in sorted(per_date.items())
+    ]
+
+
+def save_corpus(corpus, path: Path):
+    with Path(path).open("w", encoding="utf-8") as f:
+        for req in corpus:
+            f.write(json.dumps(req, ensure_ascii=False) + "\n")
+
+
+def load_corpus(path: Path):
+    with Path(path).open("r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def rss_hwm_mb():
+    """Piek-RSS van dit proces (VmHWM) in MB; None als /proc er niet is."""
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def reset_rss_hwm():
+    # Linux: "5" in clear_refs zet VmHWM terug naar de huidige RSS (piek per meting)
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def post_json(url, payload, timeout=300):
+    req = urllib.request.Request(
+        url, data=json.dumps(payload).encode("utf-8"), headers={"Content-Type": "application/json"}
+    )
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        return resp.status, json.loads(resp.read())
+
+
+def get_json(url, timeout=30):
+    with urllib.request.urlopen(url, timeout=timeout) as resp:
+        return resp.status, json.loads(resp.read())
+
+
+def use_mock_llm(**kwargs):
+    """Start mock_llm en zet de omgeving zo dat route_brain ermee praat."""
+    from mock_llm import start_mock_llm
+    server, base_url, config = start_mock_llm(**kwargs)
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ.setdefault("OPENAI_API_KEY", "mock")
+    return server, config
+
+
+# -------------------------------------------------
+# Servers (in-process, op een vrije poort)
+# -------------------------------------------------
+def start_async_server(port):
+    import uvicorn
+    from server_async import app
+    config = uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", lifespan="on")
+    server = uvicorn.Server(config)
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+
+    def stop():
+        server.should_exit = True
+    return stop
+
+
+def start_sync_server(port, threaded=False):
+    # threaded=False: zelfde gedrag als gunicorn -w 1 (sync worker), 1 request tegelijk
+    import logging
+    from werkzeug.serving import make_server
+    from server import app
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = make_server("127.0.0.1", port, app, threaded=threaded)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server.shutdown
+
+
+# -------------------------------------------------
+# Loadtest
+# -------------------------------------------------
+def run_load(base_url, corpus, concurrency, n_requests, engine="llm"):
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+
+    def one(i):
+        nonlocal errors
+        payload = dict(corpus[i % len(corpus)], engine=engine)
+        t = time.perf_counter()
+        try:
+            status, _ = post_json(base_url + "/optimize-route", payload)
+            ok = status == 200
+        except Exception:
+            ok = False
+        dt = time.perf_counter() - t
+        with lock:
+            latencies.append(dt)
+            if not ok:
+                errors += 1
+
+    # /health meten terwijl de optimalisaties lopen
+    health = []
+    stop = threading.Event()
+
+    def probe():
+        while not stop.is_set():
+            t = time.perf_counter()
+            try:
+                get_json(base_url + "/health", timeout=300)
+            except Exception:
+                pass
+            health.append(time.perf_counter() - t)
+            stop.wait(0.05)
+
+    prober = threading.Thread(target=probe, daemon=True)
+    t0 = time.perf_counter()
+    prober.start()
+    with ThreadPoolExecutor(max_workers=concurrency) as ex:
+        list(ex.map(one, range(n_requests)))
+    wall = time.perf_counter() - t0
+    stop.set()
+    prober.join()
+
+    return {
+        "concurrency": concurrency,
+        "requests": n_requests,
+        "errors": errors,
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(n_requests / wall, 2),
+        "p50_s": round(percentile(latencies, 50), 3),
+        "p95_s": round(percentile(latencies, 95), 3),
+        "p99_s": round(percentile(latencies, 99), 3),
+        "health_max_s": round(max(health), 3) if health else None,
+    }
+
+
+def _fallback_snapshot():
+    import metrics
+    return metrics.VALIDATIONS.values(), metrics.FALLBACKS.values()
+
+
+def _fallback_delta(before, after):
+    """Per engine: aantal validaties, fallbacks per reden en fallback-rate tussen 2 snapshots."""
+    (v0, f0), (v1, f1) = before, after
+    out = {}
+    for (engine,), n in v1.items():
+        out[engine] = {"validations": n - v0.get((engine,), 0), "fallbacks": {}}
+    for (engine, reason), n in f1.items():
+        d = n - f0.get((engine, reason), 0)
+        if d:
+            out.setdefault(engine, {"validations": 0, "fallbacks": {}})["fallbacks"][reason] = d
+    for stats in out.values():
+        # single_route_* zijn dagregels (maandag, weinig stops), geen afgekeurde verdelingen
+        bad = sum(n for r, n in stats["fallbacks"].items() if not r.startswith("single_route_"))
+        stats["fallback_rate"] = round(bad / stats["validations"], 3) if stats["validations"] else None
+    return {e: s for e, s in out.items() if s["validations"] or s["fallbacks"]}
+
+
+def cmd_loadtest(args):
+    if not args.cache:
+        os.environ["ROUTE_CACHE_SIZE"] = "0"  # elke aanvraag moet echt door de solver/LLM
+    _, llm = use_mock_llm(latency_s=args.llm_latency, failure_rate=args.llm_failure_rate,
+                          invalid_rate=args.llm_invalid_rate, seed=args.seed)
+
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    corpus = load_corpus(args.corpus) if args.corpus else build_corpus()
+    if args.corpus_out:
+        save_corpus(corpus, args.corpus_out)
+    engines = [e.strip() for e in args.engine.split(",") if e.strip()]
+    config = {"server": args.server, "cache": args.cache, "llm_latency": args.llm_latency,
+              "llm_failure_rate": args.llm_failure_rate, "llm_invalid_rate": args.llm_invalid_rate,
+              "corpus": len(corpus)}
+
+    results = []
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        if args.server == "async":
+            stop_server = start_async_server(port)
+        else:
+            stop_server = start_sync_server(port, threaded=args.server == "threaded")
+        try:
+            # 1 warme request per engine, zodat trainingsdata/matrix niet in de eerste meting zitten
+            for engine in engines:
+                post_json(base_url + "/optimize-route", dict(corpus[0], engine=engine))
+            for engine in engines:
+                for c in [int(x) for x in args.concurrency.split(",")]:
+                    n = args.requests or max(c * 2, 8)
+                    before, llm_before = _fallback_snapshot(), llm.requests
+                    reset_rss_hwm()
+                    r = run_load(base_url, corpus, c, n, engine)
+                    r.update(engine=engine, rss_hwm_mb=rss_hwm_mb(), llm_calls=llm.requests - llm_before,
+                             **_fallback_delta(before, _fallback_snapshot()).get(engine, {}))
+                    results.append(r)
+        finally:
+            stop_server()
+
+    print(json.dumps(config))
+    for r in results:
+        print(json.dumps(r))
+
+
+# -------------------------------------------------
+# FleetGO-conversie (route_merge)
+# -------------------------------------------------
+def synthetic_export(frames, years):
+    """Plakt de meegeleverde exports `years` keer achter elkaar, elke kopie 1 jaar later gedateerd."""
+    import pandas as pd
+    base = pd.concat(frames, ignore_index=True)
+    dates = pd.to_datetime(base["Datum"].astype(str).str[2:].str.strip(), format="%d-%m-%Y")
+    prefix = base["Datum"].astype(str).str[:2]
+    copies = []
+    for k in range(years):
+        c = base.copy()
+        c["Datum"] = prefix + " " + (dates + pd.DateOffset(years=k)).dt.strftime("%d-%m-%Y")
+        copies.append(c)
+    return pd.concat(copies, ignore_index=True)
+
+
+def time_parser(fn, df, path, max_rows=None):
+    if max_rows and len(df) > max_rows:
+        df = df.iloc[:max_rows]
+    t = time.perf_counter()
+    out = fn(df, path)
+    dt = time.perf_counter() - t
+    return out, {"rows": len(df), "s": round(dt, 3), "rows_per_s": round(len(df) / dt)}
+
+
+def cmd_convert(args):
+    import route_merge as rm
+
+    csvs = sorted(p for d in rm.FLEETGO_DIRS if d.exists() for p in d.glob("*.csv"))
+    if not csvs:
+        print("Geen FleetGO CSV's gevonden")
+        return 1
+
+    frames = []
+    for path in csvs:
+        df = rm.read_csv_auto(path)
+        frames.append(df)
+        old, r_old = time_parser(rm.legs_rowwise, df, path)
+        new, r_new = time_parser(rm.legs_vectorized, df, path)
+        print(json.dumps({
+            "file": path.name,
+            "rowwise": r_old,
+            "vectorized": r_new,
+            "speedup": round(r_new["rows_per_s"] / r_old["rows_per_s"], 1),
+            "identical": bool(old.equals(new)),
+        }))
+
+    big = synthetic_export(frames, args.years)
+    path = csvs[0]
+    _, r_old = time_parser(rm.legs_rowwise, big, path, max_rows=args.rowwise_max_rows)
+    _, r_new = time_parser(rm.legs_vectorized, big, path)
+    print(json.dumps({
+        "file": f"synthetic {args.years} jaar",
+        "rowwise": r_old,
+        "vectorized": r_new,
+        "speedup": round(r_new["rows_per_s"] / r_old["rows_per_s"], 1),
+    }))
+
+
+# -------------------------------------------------
+# Import/startup
+# -------------------------------------------------
+def time_import(module, runs=5):
+    """Mediane wandkloktijd van `import module` in een vers proces (zonder de interpreter-start)."""
+    import subprocess
+    code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    times = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", code], cwd=BASE, capture_output=True, text=True, check=True)
+        times.append(float(out.stdout.strip().splitlines()[-1]))
+    return round(percentile(times, 50) * 1000, 1)
+
+
+def synthetic_customers(path: Path, n):
+    """customers.csv-formaat met n unieke adressen (meegeleverde adressen + volgnummer)."""
+    import pandas as pd
+    import route_merge as rm
+    base = rm.read_csv_auto(rm.CUSTOMERS_PATH)
+    big = pd.concat([base] * (n // len(base) + 1), ignore_index=True).iloc[:n].copy()
+    big["FullAddress"] = big["FullAddress"].astype(str).str.replace(", NL", "", regex=False) + " " + big.index.astype(str)
+    big["Latitude"] = 52.3 + (big.index % 1000) / 10000
+    big["Longitude"] = 4.9 + (big.index % 997) / 10000
+    big.to_csv(path, index=False)
+
+
+def cmd_startup(args):
+    import tempfile
+    print(json.dumps({"import_ms": {m: time_import(m, args.runs) for m in ("pandas", "route_merge")}}))
+
+    import route_merge as rm
+    t = time.perf_counter()
+    cache = rm.get_geo_cache()
+    t_cache = time.perf_counter() - t
+    t = time.perf_counter()
+    customers = rm.get_customer_coords()
+    t_cust = time.perf_counter() - t
+    print(json.dumps({
+        "geo_cache": {"entries": len(cache), "first_use_ms": round(t_cache * 1000, 1)},
+        "customers": {"entries": len(customers), "first_use_ms": round(t_cust * 1000, 1)},
+    }))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "customers.csv"
+        for n in [int(x) for x in args.customers.split(",")]:
+            synthetic_customers(path, n)
+            t = time.perf_counter()
+            mapping = rm.load_customers_mapping(path)
+            dt = time.perf_counter() - t
+            print(json.dumps({"customers": n, "keys": len(mapping), "build_s": round(dt, 3),
+                              "rows_per_s": round(n / dt)}))
+
+
+# -------------------------------------------------
+# Geocode-cache: JSON herschrijven vs SQLite-store
+# -------------------------------------------------
+def stub_geocode(address):
+    """Deterministische lokale stand-in voor Nominatim (geen netwerk, geen latency)."""
+    h = hash(address)
+    return 52.3 + (h % 1000) / 10000, 4.8 + (h // 1000 % 1000) / 10000
+
+
+def _windows(per_lookup, parts=5):
+    """Gemiddelde kosten per lookup (µs) per opeenvolgend deel van de run."""
+    size = max(1, len(per_lookup) // parts)
+    return [round(sum(per_lookup[i:i + size]) / len(per_lookup[i:i + size]) * 1e6, 1)
+            for i in range(0, size * parts, size)]
+
+
+def cmd_geocode_store(args):
+    import tempfile
+    import route_merge as rm
+    from geocode_store import GeocodeStore
+
+    addresses = [f"Teststraat {i}, {1000 + i % 9000} AB, Amsterdam, NL" for i in range(args.addresses)]
+    with tempfile.TemporaryDirectory() as tmp:
+        # Oud gedrag: dict bijwerken en na elke miss de hele JSON (indent=2) herschrijven
+        json_path = Path(tmp) / "geocode_cache.json"
+        cache, per = {}, []
+        for a in addresses:
+            t = time.perf_counter()
+            lat, lon = stub_geocode(a)
+            cache[a] = {"lat": lat, "lon": lon}
+            json_path.write_text(json.dumps(cache, ensure_ascii=False, indent=2))
+            per.append(time.perf_counter() - t)
+        print(json.dumps({"store": "json-rewrite", "lookups": len(per), "total_s": round(sum(per), 3),
+                          "us_per_lookup_by_fifth": _windows(per)}))
+
+        store = GeocodeStore(Path(tmp) / "geocode.sqlite")
+        per = []
+        for a in addresses:
+            t = time.perf_counter()
+            rm.geocode_cached(a, geocode=stub_geocode, store=store)
+            per.append(time.perf_counter() - t)
+        store.flush()
+        hits = []
+        for a in addresses:
+            t = time.perf_counter()
+            rm.geocode_cached(a, geocode=stub_geocode, store=store)
+            hits.append(time.perf_counter() - t)
+        print(json.dumps({"store": "sqlite", "lookups": len(per), "total_s": round(sum(per), 3),
+                          "us_per_lookup_by_fifth": _windows(per),
+                          "hit_us_by_fifth": _windows(hits), "rows": len(store)}))
+        store.close()
+
+
+# -------------------------------------------------
+# Batch-geocoding tegen mock_nominatim
+# -------------------------------------------------
+def cmd_geocode(args):
+    import tempfile
+    import route_merge as rm
+    from geocoder import BatchGeocoder, NominatimBackend
+    from geocode_store import GeocodeStore
+    from mock_nominatim import start_mock_nominatim
+
+    addresses = rm.collect_addresses()
+    if args.limit:
+        addresses = addresses[:args.limit]
+    # Oude pad: serieel geocode_online + time.sleep(1.1) per miss
+    serial_s = len(addresses) * (args.latency + 1.1)
+    print(json.dumps({"addresses": len(addresses), "serial_estimate_s": round(serial_s, 1)}))
+
+    for workers in [int(x) for x in args.workers.split(",")]:
+        server, url, config = start_mock_nominatim(
+            latency_s=args.latency, failure_rate=args.failure_rate,
+            not_found_rate=args.not_found_rate, max_rps=args.max_rps, seed=1,
+        )
+        with tempfile.TemporaryDirectory() as tmp:
+            store = GeocodeStore(Path(tmp) / "geocode.sqlite")
+            geocoder = BatchGeocoder(NominatimBackend(url), store, rate=args.rate, burst=workers,
+                                     workers=workers, backoff_base=0.05)
+            report = geocoder.geocode_many(addresses)
+            again = BatchGeocoder(NominatimBackend(url), store, rate=args.rate).geocode_many(addresses)
+            store.close()
+        server.shutdown()
+        report.update({
+            "workers": workers,
+            "rate": args.rate,
+            "addresses_per_s": round(report["looked_up"] / report["elapsed_s"], 1) if report["elapsed_s"] else None,
+            "http_429": config.rate_limited,
+            "http_503": config.failures,
+            "rerun_looked_up": again["looked_up"],
+        })
+        print(json.dumps(report))
+
+
+# -------------------------------------------------
+# Incrementele route_merge-import
+# -------------------------------------------------
+def next_day_export(df):
+    """Nieuwe 'dagexport': de rijen van de laatste dag in df, 1 dag later gedateerd."""
+    import pandas as pd
+    dates = pd.to_datetime(df["Datum"].astype(str).str[2:].str.strip(), format="%d-%m-%Y")
+    day = dates.max() + pd.Timedelta(days=1)
+    last = df[(dates == dates.max()).to_numpy()].copy()
+    last["Datum"] = ("Ma", "Di", "Wo", "Do", "Vr", "Za", "Zo")[day.weekday()] + " " + day.strftime("%d-%m-%Y")
+    return last
+
+
+def cmd_ingest(args):
+    import tempfile
+    import route_merge as rm
+
+    csvs = rm.find_csvs()
+    frames = [rm.read_csv_auto(p) for p in csvs]
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        src, out = tmp / "fleetgo", tmp / "matched"
+        src.mkdir(); out.mkdir()
+
+        # Historie: per bus een export van `years` jaar
+        for path, df in zip(csvs, frames):
+            synthetic_export([df], args.years).to_csv(src / path.name, sep=";", index=False)
+
+        def run(label):
+            t = time.perf_counter()
+            written, reports = rm.ingest(sorted(src.glob("*.csv")), out)
+            print(json.dumps({
+                "run": label,
+                "s": round(time.perf_counter() - t, 3),
+                "new_rows": sum(r.get("rows", 0) for r in reports),
+                "skipped_files": sum(1 for r in reports if r.get("skipped")),
+                "partitions_written": len(written),
+                "partitions_total": len(rm.iter_partitions(out)),
+            }))
+
+        run(f"eerste import ({args.years} jaar)")
+        run("opnieuw, niets veranderd")
+        latest = {path.name: rm.read_csv_auto(src / path.name) for path in csvs}
+        for day in range(1, args.days + 1):
+            for path in csvs:
+                latest[path.name] = next_day_export(latest[path.name])
+                latest[path.name].to_csv(src / f"{path.stem}_dag{day:02d}.csv", sep=";", index=False)
+            run(f"nieuwe dagexport {day}")
+
+        rm.reset_output(out)
+        run("volledig opnieuw (--full)")
+
+
+# -------------------------------------------------
+# build_training_routes: alles in het geheugen vs streaming
+# -------------------------------------------------
+def measure(fn):
+    """(resultaat, seconden, piek-geheugen in MB volgens tracemalloc)."""
+    import gc
+    import tracemalloc
+    gc.collect()
+    tracemalloc.start()
+    t = time.perf_counter()
+    result = fn()
+    dt = time.perf_counter() - t
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, round(dt, 3), round(peak / 1e6, 1)
+
+
+def cmd_build_training(args):
+    import tempfile
+    import route_merge as rm
+    import build_training_routes as btr
+    from route_store import StoreWriter, RouteStore, JsonlRoutes
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        src, matched = tmp / "fleetgo", tmp / "matched"
+        src.mkdir(); matched.mkdir()
+        for path in rm.find_csvs():
+            synthetic_export([rm.read_csv_auto(path)], args.years).to_csv(src / path.name, sep=";", index=False)
+        with contextlib.redirect_stdout(open(os.devnull, "w")):
+            rm.ingest(sorted(src.glob("*.csv")), matched)
+        files = rm.iter_partitions(matched)
+
+        def in_memory():
+            legs = []
+            for p in files:
+                legs += btr.load_legs(p)
+            routes = btr.build_routes(legs)
+            with (tmp / "routes.json").open("w", encoding="utf-8") as f:
+                json.dump(routes, f, ensure_ascii=False, indent=2)
+            return len(routes)
+
+        def streaming():
+            store = StoreWriter()
+            n = 0
+            with (tmp / "routes.jsonl").open("w", encoding="utf-8") as f:
+                for route in btr.stream_routes(files, args.chunk_rows):
+                    f.write(json.dumps(route, ensure_ascii=False) + "\n")
+                    store.add(route)
+                    n += 1
+            store.finish(tmp / "store")
+            return n
+
+        legs = sum(1 for p in files for _ in open(p, encoding="utf-8")) - len(files)
+        for label, fn in (("in-memory + json", in_memory), ("streaming jsonl + store", streaming)):
+            n, dt, peak = measure(fn)
+            print(json.dumps({"build": label, "years": args.years, "legs": legs, "routes": n,
+                              "s": dt, "peak_mb": peak}))
+
+        # Laden in de server: monolithische JSON vs JSON Lines (offsets) vs store (mmap)
+        loaders = (
+            ("json.load", lambda: json.loads((tmp / "routes.json").read_text(encoding="utf-8"))),
+            ("JsonlRoutes", lambda: JsonlRoutes(tmp / "routes.jsonl")),
+            ("RouteStore", lambda: RouteStore(tmp / "store")),
+        )
+        for label, fn in loaders:
+            routes, dt, peak = measure(fn)
+            t = time.perf_counter()
+            for i in range(0, len(routes), max(1, len(routes) // 100)):
+                routes[i]
+            access_us = (time.perf_counter() - t) / min(100, len(routes)) * 1e6
+            print(json.dumps({"load": label, "open_s": dt, "peak_mb": peak,
+                              "random_access_us": round(access_us, 1)}))
+
+
+# -------------------------------------------------
+# Adres-matching: exact vs blocked fuzzy vs brute force
+# -------------------------------------------------
+def cmd_match(args):
+    import random
+    import route_merge as rm
+    import address_matcher as am
+
+    legs = []
+    for p in rm.iter_partitions():
+        df = rm.read_partition(p)
+        legs += df["from_address"].dropna().tolist() + df["to_address"].dropna().tolist()
+    unique = list(dict.fromkeys(legs))
+    sample = random.Random(args.seed).sample(unique, min(args.sample, len(unique)))
+
+    sources = (
+        ("customers.csv", lambda: list(rm.get_customer_coords())),
+        ("customers_old.csv", lambda: am.records_from_export(BASE / "customers_old.csv")),
+    )
+    for label, load in sources:
+        records = load()
+        keys = {r if isinstance(r, str) else r[0] for r in records}
+        t = time.perf_counter()
+        matcher = am.AddressMatcher(records)
+        build_ms = (time.perf_counter() - t) * 1000
+
+        t = time.perf_counter()
+        matches = matcher.match_many(legs)
+        blocked_s = time.perf_counter() - t
+
+        t = time.perf_counter()
+        brute = {a: matcher.match_bruteforce(a) for a in sample}
+        brute_s = time.perf_counter() - t
+        agree = sum((brute[a] and brute[a].key) == (matches[a] and matches[a].key) for a in sample)
+
+        print(json.dumps({
+            "customers": label, "records": len(matcher), "legs": len(legs), "unique": len(unique),
+            "exact_rate": round(sum(a in keys for a in legs) / len(legs), 4),
+            "matched_rate": round(sum(1 for a in legs if matches[a]) / len(legs), 4),
+            "index_ms": round(build_ms, 1),
+            "blocked_per_s": round(len(unique) / blocked_s),
+            "comparisons_per_address": round(matcher.stats["comparisons"] / max(1, matcher.stats["queries"]), 1),
+            "bruteforce_per_s": round(len(sample) / brute_s),
+            "bruteforce_agreement": round(agree / len(sample), 3),
+        }))
+
+
+# -------------------------------------------------
+# Stop-volgorde: historische routes vs nearest-neighbour vs NN + 2-opt/Or-opt
+# -------------------------------------------------
+def cmd_sequence(args):
+    import random
+    import numpy as np
+    import route_sequencer as rs
+    from distance_matrix import get_matrix, haversine_matrix
+    from route_brain import load_training_routes, TRAINING_JSON
+
+    known = get_matrix()
+    rows = []
+    for route in load_training_routes(TRAINING_JSON):
+        addrs = [s["address"] for s in route["stops"]]
+        start = addrs[0]
+        middle = [a for a in addrs[1:] if a not in (start, rs.DEPOT_ADDRESS)]
+        if len(middle) < 3:
+            continue
+        hist = rs.route_km(middle, start)
+        nn = rs.sequence_stops(middle, start, time_budget_s=0)[1]
+        t = time.perf_counter()
+        opt = rs.sequence_stops(middle, start, time_budget_s=args.budget_ms / 1000)[1]
+        rows.append((len(middle), hist, nn, opt, (time.perf_counter() - t) * 1000,
+                     all(a in known for a in [start] + middle)))
+
+    def summary(label, sel):
+        if not sel:
+            return
+        hist, nn, opt = (sum(r[i] for r in sel) for i in (1, 2, 3))
+        gains = [1 - r[3] / r[1] for r in sel if r[1] > 0]
+        ms = [r[4] for r in sel]
+        print(json.dumps({
+            "routes": label, "n": len(sel), "stops_avg": round(sum(r[0] for r in sel) / len(sel), 1),
+            "hist_km": round(hist), "nn_km": round(nn), "opt_km": round(opt),
+            "saving_total": round(1 - opt / hist, 3) if hist else None,
+            "saving_median": round(float(np.median(gains)), 3) if gains else None,
+            "ms_p50": round(percentile(ms, 50), 2), "ms_p95": round(percentile(ms, 95), 2),
+        }))
+
+    summary("historisch (alle)", rows)
+    summary("historisch (alle adressen gegeocodeerd)", [r for r in rows if r[5]])
+    summary("historisch (18-40 stops)", [r for r in rows if 18 <= r[0] <= 40])
+
+    # Synthetisch: rekentijd en kwaliteit bij 18..40 stops rond Amsterdam
+    rng = random.Random(args.seed)
+    for n in (18, 25, 32, 40):
+        pts = [rs.DEPOT_COORDS] + [(52.30 + rng.random() * 0.14, 4.78 + rng.random() * 0.22) for _ in range(n)]
+        dist = haversine_matrix(pts, pts).tolist()
+        names = [str(i) for i in range(n)]
+        nn = rs.sequence_stops(names, "depot", time_budget_s=0, dist=dist)[1]
+        t = time.perf_counter()
+        opt = rs.sequence_stops(names, "depot", time_budget_s=args.budget_ms / 1000, dist=dist)[1]
+        print(json.dumps({"synthetic_stops": n, "nn_km": round(nn, 1), "opt_km": round(opt, 1),
+                          "ms": round((time.perf_counter() - t) * 1000, 2)}))
+
+
+# -------------------------------------------------
+# Geleerde reistijden: voorspellen van niet-geziene legs (laatste dagen apart gehouden)
+# -------------------------------------------------
+def cmd_travel_times(args):
+    import tempfile
+    import numpy as np
+    import pandas as pd
+    import travel_times as tt_mod
+
+    legs = tt_mod.load_legs()
+    dates = pd.to_datetime(legs["route_id"].str[:10])
+    cutoff = dates.max() - pd.Timedelta(days=args.holdout_days)
+    train, test = legs[dates <= cutoff], legs[dates > cutoff]
+    test = test[test["from_address"].notna() & test["to_address"].notna()
+                & (test["from_address"] != test["to_address"]) & (test["duration_s"] > 0)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        t = time.perf_counter()
+        meta = tt_mod.build_table(train, Path(tmp))
+        build_s = time.perf_counter() - t
+        t = time.perf_counter()
+        learned = tt_mod.TravelTimes.load(Path(tmp))
+        load_ms = (time.perf_counter() - t) * 1000
+        size_kb = sum(p.stat().st_size for p in Path(tmp).iterdir()) / 1024
+
+        for label, table in (("hemelsbreed 30 km/u", tt_mod.TravelTimes()), ("geleerd", learned)):
+            pred, lookup_s = [], 0.0
+            for _, route in test.groupby("route_id", sort=False):
+                addrs = list(dict.fromkeys(route["from_address"].tolist() + route["to_address"].tolist()))
+                pos = {a: i for i, a in enumerate(addrs)}
+                t = time.perf_counter()
+                dur = table.durations(addrs)
+                lookup_s += time.perf_counter() - t
+                pred += [dur[pos[a], pos[b]] for a, b in zip(route["from_address"], route["to_address"])]
+            pred = np.array(pred)
+            actual = test["duration_s"].to_numpy(dtype=float)
+            print(json.dumps({
+                "model": label, "train_legs": meta["legs"], "test_legs": len(test),
+                "mae_s": round(float(np.mean(np.abs(pred - actual))), 1),
+                "median_ape": round(float(np.median(np.abs(pred - actual) / actual)), 3),
+                "route_total_err": round(float(abs(pred.sum() - actual.sum()) / actual.sum()), 3),
+                "sources": dict(table.stats), "lookup_ms_total": round(lookup_s * 1000, 1),
+            }))
+        print(json.dumps({"table_pairs": meta["pairs"], "area_pairs": meta["area_pairs"], "size_kb": round(size_kb),
+                          "build_s": round(build_s, 2), "load_ms": round(load_ms, 1)}))
+
+
+# -------------------------------------------------
+# Gunicorn-workers: lazy laden per worker vs warm-up in de master (--preload)
+# -------------------------------------------------
+def child_pids(pid):
+    """Directe kindprocessen (gunicorn-workers) via /proc/<pid>/stat."""
+    out = []
+    for d in Path("/proc").iterdir():
+        if not d.name.isdigit():
+            continue
+        try:
+            stat = (d / "stat").read_text()
+        except OSError:
+            continue
+        # Veld 4 (ppid) staat na de procesnaam tussen haakjes
+        if int(stat.rsplit(")", 1)[1].split()[1]) == pid:
+            out.append(int(d.name))
+    return sorted(out)
+
+
+def smaps_mb(pid):
+    """RSS, PSS (gedeelde pages naar rato) en private geheugen van 1 proces in MB."""
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup", encoding="ascii") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[1].isdigit():
+                fields[parts[0].rstrip(":")] = int(parts[1])
+    private = fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)
+    return {"rss": fields.get("Rss", 0) / 1024, "pss": fields.get("Pss", 0) / 1024, "private": private / 1024}
+
+
+def start_gunicorn(port, workers, warm, env):
+    import subprocess
+    env = dict(os.environ, **env, WARM_STARTUP="1" if warm else "0", WEB_CONCURRENCY=str(workers),
+               PORT=str(port), ROUTE_CACHE_SIZE="0")
+    return subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", str(BASE / "gunicorn.conf.py"), "-b", f"127.0.0.1:{port}", "server:app"],
+        cwd=BASE, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+
+def wait_ready(base_url, timeout=120):
+    """Poll /health tot 200 (warm) en geef de status terug."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            status, body = get_json(base_url + "/health", timeout=5)
+            if status == 200:
+                return body
+        except Exception:
+            pass  # nog niet luisterend, of 503 "warming"
+        time.sleep(0.02)
+    raise TimeoutError(f"{base_url}/health niet ready binnen {timeout} s")
+
+
+def cmd_workers(args):
+    _, _ = use_mock_llm(latency_s=args.llm_latency, seed=1)
+    env = {"OPENAI_BASE_URL": os.environ["OPENAI_BASE_URL"], "OPENAI_API_KEY": os.environ["OPENAI_API_KEY"]}
+    corpus = build_corpus()
+
+    for warm in (False, True):
+        for n in [int(x) for x in args.workers.split(",")]:
+            port = free_port()
+            base_url = f"http://127.0.0.1:{port}"
+            t0 = time.perf_counter()
+            proc = start_gunicorn(port, n, warm, env)
+            try:
+                wait_ready(base_url)
+                ready_s = time.perf_counter() - t0
+                t = time.perf_counter()
+                post_json(base_url + "/optimize-route", dict(corpus[0], engine=args.engine))
+                first_s = time.perf_counter() - t
+
+                # Genoeg gelijktijdige requests dat elke worker (lazy) zijn data geladen heeft
+                with ThreadPoolExecutor(max_workers=n * 2) as ex:
+                    list(ex.map(lambda i: post_json(base_url + "/optimize-route",
+                                                    dict(corpus[i % len(corpus)], engine=args.engine)),
+                                range(args.requests * n)))
+                master = smaps_mb(proc.pid)
+                per_worker = [smaps_mb(pid) for pid in child_pids(proc.pid)]
+                print(json.dumps({
+                    "mode": "preload" if warm else "lazy", "workers": n,
+                    "ready_s": round(ready_s, 2), "first_request_ms": round(first_s * 1000, 1),
+                    "cold_start_s": round(ready_s + first_s, 2),
+                    "worker_rss_mb": round(sum(w["rss"] for w in per_worker) / max(1, len(per_worker)), 1),
+                    "worker_pss_mb": round(sum(w["pss"] for w in per_worker) / max(1, len(per_worker)), 1),
+                    "worker_private_mb": round(sum(w["private"] for w in per_worker) / max(1, len(per_worker)), 1),
+                    "master_rss_mb": round(master["rss"], 1),
+                    "total_pss_mb": round(master["pss"] + sum(w["pss"] for w in per_worker), 1),
+                }))
+            finally:
+                proc.terminate()
+                proc.wait(timeout=30)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="route-bot benchmarks")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("loadtest", help="gelijktijdige /optimize-route calls tegen een mock LLM")
+    p.add_argument("--server", choices=("async", "sync", "threaded"), default="async",
+                   help="async = server_async (uvicorn), sync = Flask 1 request tegelijk, threaded = Flask met threads")
+    p.add_argument("--engine", default="llm", help="komma-gescheiden engines, bv. llm,local")
+    p.add_argument("--concurrency", default="1,4,16,32")
+    p.add_argument("--requests", type=int, default=0, help="aantal requests per niveau (standaard 2x concurrency)")
+    p.add_argument("--llm-latency", type=float, default=1.0)
+    p.add_argument("--llm-failure-rate", type=float, default=0.0, help="kans op HTTP 500 van de mock LLM")
+    p.add_argument("--llm-invalid-rate", type=float, default=0.0, help="kans op een ongeldige verdeling")
+    p.add_argument("--cache", action="store_true", help="resultaat-cache aan laten (standaard uit)")
+    p.add_argument("--corpus", type=Path, help="aanvragen uit een eerder opgeslagen corpus (JSON Lines)")
+    p.add_argument("--corpus-out", type=Path, help="gebruikte aanvragen opslaan om later opnieuw af te spelen")
+    p.add_argument("--seed", type=int, default=1, help="seed van de mock LLM (fouten/ongeldige antwoorden)")
+    p.set_defaults(func=cmd_loadtest)
+
+    p = sub.add_parser("convert", help="route_merge: rij-voor-rij vs kolomsgewijze leg-parser (rows/s)")
+    p.add_argument("--years", type=int, default=5, help="lengte van de synthetische export in jaren")
+    p.add_argument("--rowwise-max-rows", type=int, default=20000,
+                   help="rij-parser alleen op de eerste N rijen van de synthetische export meten")
+    p.set_defaults(func=cmd_convert)
+
+    p = sub.add_parser("startup", help="importtijd van route_merge + lazy laden van geocode-cache en klanten")
+    p.add_argument("--runs", type=int, default=5)
+    p.add_argument("--customers", default="10000,50000", help="aantallen voor de synthetische klantbestanden")
+    p.set_defaults(func=cmd_startup)
+
+    p = sub.add_parser("geocode-store", help="geocode-cache: JSON herschrijven per miss vs SQLite-store")
+    p.add_argument("--addresses", type=int, default=5000)
+    p.set_defaults(func=cmd_geocode_store)
+
+    p = sub.add_parser("geocode", help="batch-geocoding van alle adressen tegen mock_nominatim")
+    p.add_argument("--workers", default="1,4,16")
+    p.add_argument("--rate", type=float, default=40.0, help="token-bucket limiet (req/s)")
+    p.add_argument("--latency", type=float, default=0.2)
+    p.add_argument("--failure-rate", type=float, default=0.05)
+    p.add_argument("--not-found-rate", type=float, default=0.02)
+    p.add_argument("--max-rps", type=float, default=50.0, help="rate limit van de mock (HTTP 429 daarboven)")
+    p.add_argument("--limit", type=int, default=0, help="alleen de eerste N adressen")
+    p.set_defaults(func=cmd_geocode)
+
+    p = sub.add_parser("ingest", help="route_merge: eerste import vs incrementele dagexports")
+    p.add_argument("--years", type=int, default=5, help="lengte van de synthetische historie")
+    p.add_argument("--days", type=int, default=3, help="aantal nieuwe dagexports")
+    p.set_defaults(func=cmd_ingest)
+
+    p = sub.add_parser("build-training", help="build_training_routes: in-memory vs streaming, en laadtijden")
+    p.add_argument("--years", type=int, default=5)
+    p.add_argument("--chunk-rows", type=int, default=50_000)
+    p.set_defaults(func=cmd_build_training)
+
+    p = sub.add_parser("match", help="adres-matching legs -> klanten: exact vs blocked fuzzy vs brute force")
+    p.add_argument("--sample", type=int, default=500, help="aantal unieke adressen voor de brute-force vergelijking")
+    p.add_argument("--seed", type=int, default=1)
+    p.set_defaults(func=cmd_match)
+
+    p = sub.add_parser("sequence", help="stop-volgorde per bus: historisch vs nearest-neighbour vs 2-opt/Or-opt")
+    p.add_argument("--budget-ms", type=float, default=50.0)
+    p.add_argument("--seed", type=int, default=1)
+    p.set_defaults(func=cmd_sequence)
+
+    p = sub.add_parser("travel-times", help="geleerde reistijden vs hemelsbrede schatting op apart gehouden dagen")
+    p.add_argument("--holdout-days", type=int, default=60)
+    p.set_defaults(func=cmd_travel_times)
+
+    p = sub.add_parser("workers", help="gunicorn met 1/2/4 workers: lazy laden vs warm-up vóór de fork (--preload)")
+    p.add_argument("--workers", default="1,2,4")
+    p.add_argument("--engine", default="llm", help="engine van de requests (llm laadt ook de trainingsdata)")
+    p.add_argument("--requests", type=int, default=8, help="requests per worker vóór de geheugenmeting")
+    p.add_argument("--llm-latency", type=float, default=0.0)
+    p.set_defaults(func=cmd_workers)
+
+    args = ap.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
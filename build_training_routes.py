@@ -1,56 +1,138 @@
+import os
 import csv
+import sys
 import json
+import argparse
+import itertools
 from pathlib import Path
 from collections import defaultdict
+from route_store import StoreWriter, STORE_DIR
 
 BASE = Path(__file__).parent
-INPUT_CSV = BASE / "data" / "matched" / "2024-11-01_to_2025-11-11.csv"
+MATCHED_DIR = BASE / "data" / "matched"
+# Oud formaat (1 bestand); route_merge schrijft nu per bus/maand: data/matched/<bus>/<YYYY-MM>.csv
+INPUT_CSV = MATCHED_DIR / "2024-11-01_to_2025-11-11.csv"
 OUTPUT_JSON = BASE / "data" / "routes_training.json"
+# 1 route per regel; route_brain kan dit streamen of per route openen (route_store.JsonlRoutes)
+OUTPUT_JSONL = BASE / "data" / "routes_training.jsonl"
+
+CHUNK_ROWS = 50_000
+FORMATS = ("jsonl", "store", "json")
+
+def _int_or_none(v):
+    try:
+        return int(float(v)) if v not in (None, "", "nan") else None
+    except:
+        return None
+
+def parse_leg(row):
+    # minimale velden die we nodig hebben
+    leg = row.get("leg")
+    try:
+        leg = int(leg) if leg not in (None, "", "nan") else None
+    except:
+        leg = None
+
+    return {
+        "date": row.get("date"),
+        "route_id": row.get("route_id"),
+        "leg": leg,
+        "bus_name": row.get("bus_name"),
+        "from_address": row.get("from_address") or None,
+        "to_address": row.get("to_address") or None,
+        "distance_m": _int_or_none(row.get("distance_m")),
+        "duration_s": _int_or_none(row.get("duration_s")),
+    }
 
 def load_legs(path: Path):
     legs = []
-    with path.open("r", encoding="utf-8", newline="") as f:
-        r = csv.DictReader(f)
-        for row in r:
-            # minimale velden die we nodig hebben
-            date = row.get("date")
-            route_id = row.get("route_id")
-            leg = row.get("leg")
-            bus = row.get("bus_name")
-            from_addr = row.get("from_address")
-            to_addr = row.get("to_address")
-            dist = row.get("distance_m")
-            dur = row.get("duration_s")
-
-            try:
-                leg = int(leg) if leg not in (None, "", "nan") else None
-            except:
-                leg = None
-
-            try:
-                dist = int(float(dist)) if dist not in (None, "", "nan") else None
-            except:
-                dist = None
-
-            try:
-                dur = int(float(dur)) if dur not in (None, "", "nan") else None
-            except:
-                dur = None
-
-            legs.append({
-                "date": date,
-                "route_id": route_id,
-                "leg": leg,
-                "bus_name": bus,
-                "from_address": from_addr,
-                "to_address": to_addr,
-                "distance_m": dist,
-                "duration_s": dur,
-            })
+    for chunk in read_leg_chunks(path):
+        legs += chunk
     return legs
 
+def read_leg_chunks(path: Path, chunk_rows: int = CHUNK_ROWS):
+    """Legs per blok van chunk_rows uit een CSV- of Parquet-bestand (nooit het hele bestand tegelijk)."""
+    if path.suffix == ".parquet":
+        import pyarrow.parquet as pq  # alleen nodig voor Parquet-partities
+        columns = ["date", "route_id", "leg", "bus_name", "from_address", "to_address", "distance_m", "duration_s"]
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows, columns=columns):
+            yield [parse_leg({k: (None if v is None else str(v)) for k, v in row.items()}) for row in batch.to_pylist()]
+        return
+
+    with path.open("r", encoding="utf-8", newline="") as f:
+        rows = csv.DictReader(f)
+        while True:
+            chunk = [parse_leg(row) for row in itertools.islice(rows, chunk_rows)]
+            if not chunk:
+                return
+            yield chunk
+
+def input_files():
+    parts = sorted(p for p in MATCHED_DIR.glob("*/*") if p.suffix in (".csv", ".parquet"))
+    if parts:
+        return parts
+    return [INPUT_CSV] if INPUT_CSV.exists() else []
+
+def build_route(rid, items):
+    """1 route uit de legs van 1 route_id; None als er te weinig nuttige stops zijn."""
+    # sorteer op leg-nummer
+    items = sorted(items, key=lambda x: (x["date"], x["leg"] if x["leg"] is not None else 999999))
+
+    if not items:
+        return None
+
+    date = items[0]["date"]
+    bus = items[0]["bus_name"]
+
+    # reconstructie van stops: start = eerste from_address
+    stops = []
+    # eerste stop
+    first_from = items[0]["from_address"]
+    if first_from:
+        stops.append({
+            "index": 0,
+            "address": first_from,
+            "from_leg": None,
+            "to_leg": items[0]["leg"],
+            "distance_from_prev": None,
+            "duration_from_prev": None,
+        })
+
+    # volgende stops komen van to_address van elke leg
+    idx = 1
+    prev_addr = first_from
+    for leg in items:
+        addr = leg["to_address"]
+        if not addr:
+            continue
+        # als dezelfde als vorige, sla over
+        if addr == prev_addr:
+            continue
+        stops.append({
+            "index": idx,
+            "address": addr,
+            "from_leg": leg["leg"],
+            "to_leg": None,
+            "distance_from_prev": leg["distance_m"],
+            "duration_from_prev": leg["duration_s"],
+        })
+        prev_addr = addr
+        idx += 1
+
+    if len(stops) < 2:
+        # te weinig nuttige stops, overslaan
+        return None
+
+    return {
+        "date": date,
+        "route_id": rid,
+        "bus_name": bus,
+        "num_stops": len(stops),
+        "stops": stops,
+    }
+
 def build_routes(legs):
-    # groepeer per route_id
+    # groepeer per route_id (alles in het geheugen; zie stream_routes voor grote inputs)
     per_route = defaultdict(list)
     for leg in legs:
         rid = leg["route_id"]
@@ -60,82 +142,119 @@ def build_routes(legs):
 
     routes = []
     for rid, items in per_route.items():
-        # sorteer op leg-nummer
-        items = sorted(items, key=lambda x: (x["date"], x["leg"] if x["leg"] is not None else 999999))
+        route = build_route(rid, items)
+        if route:
+            routes.append(route)
+    return routes
 
-        if not items:
-            continue
+def stream_routes(files, chunk_rows: int = CHUNK_ROWS):
+    """
+    Routes 1 voor 1, in invoervolgorde. De invoer moet gegroepeerd zijn op route_id (zo schrijft
+    route_merge de partities: gesorteerd op datum, bus, leg); een route wordt uitgegeven zodra
+    er een leg van een andere route_id langskomt. Geheugen: 1 open route + de set afgesloten ids.
+    """
+    current, items, closed = None, [], set()
+    for path in files:
+        for chunk in read_leg_chunks(path, chunk_rows):
+            for leg in chunk:
+                rid = leg["route_id"]
+                if not rid:
+                    continue
+                if rid != current:
+                    if current is not None:
+                        route = build_route(current, items)
+                        if route:
+                            yield route
+                        closed.add(current)
+                    if rid in closed:
+                        raise ValueError(f"Invoer niet gegroepeerd op route_id: {rid} komt opnieuw voor in {path.name}")
+                    current, items = rid, []
+                items.append(leg)
+    if current is not None:
+        route = build_route(current, items)
+        if route:
+            yield route
 
-        date = items[0]["date"]
-        bus = items[0]["bus_name"]
-
-        # reconstructie van stops: start = eerste from_address
-        stops = []
-        # eerste stop
-        first_from = items[0]["from_address"]
-        if first_from:
-            stops.append({
-                "index": 0,
-                "address": first_from,
-                "from_leg": None,
-                "to_leg": items[0]["leg"],
-                "distance_from_prev": None,
-                "duration_from_prev": None,
-            })
-
-        # volgende stops komen van to_address van elke leg
-        idx = 1
-        prev_addr = first_from
-        for leg in items:
-            addr = leg["to_address"]
-            if not addr:
-                continue
-            # als dezelfde als vorige, sla over
-            if addr == prev_addr:
-                continue
-            stops.append({
-                "index": idx,
-                "address": addr,
-                "from_leg": leg["leg"],
-                "to_leg": None,
-                "distance_from_prev": leg["distance_m"],
-                "duration_from_prev": leg["duration_s"],
-            })
-            prev_addr = addr
-            idx += 1
-
-        if len(stops) < 2:
-            # te weinig nuttige stops, overslaan
-            continue
+class JsonArrayWriter:
+    """Schrijft routes 1 voor 1 als JSON-array, byte-gelijk aan json.dump(routes, f, indent=2)."""
 
-        routes.append({
-            "date": date,
-            "route_id": rid,
-            "bus_name": bus,
-            "num_stops": len(stops),
-            "stops": stops,
-        })
+    def __init__(self, f):
+        self.f = f
+        self.count = 0
 
-    return routes
+    def add(self, route):
+        body = json.dumps(route, ensure_ascii=False, indent=2).replace("\n", "\n  ")
+        self.f.write(("[\n  " if self.count == 0 else ",\n  ") + body)
+        self.count += 1
+
+    def finish(self):
+        self.f.write("\n]" if self.count else "[]")
+
+def _tmp(path: Path) -> Path:
+    return path.with_name(path.name + ".tmp")
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Bouw trainingsroutes uit data/matched (streaming)")
+    ap.add_argument("--formats", default=",".join(FORMATS), help=f"komma-gescheiden, uit {FORMATS}")
+    ap.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    args = ap.parse_args(argv)
+    formats = [f.strip() for f in args.formats.split(",") if f.strip()]
+    unknown = [f for f in formats if f not in FORMATS]
+    if unknown:
+        print(f"Onbekend formaat: {unknown}")
+        return 1
 
-def main():
-    if not INPUT_CSV.exists():
-        print(f"Input CSV niet gevonden: {INPUT_CSV}")
+    files = input_files()
+    if not files:
+        print(f"Geen legs gevonden in: {MATCHED_DIR}")
         return
 
-    print(f"Lees legs uit: {INPUT_CSV}")
-    legs = load_legs(INPUT_CSV)
-    print(f"Aantal legs: {len(legs)}")
+    print(f"Lees legs uit: {MATCHED_DIR} ({len(files)} bestanden, blokken van {args.chunk_rows} rijen)")
+    # Naar *.tmp schrijven en pas na een volledige run vervangen (zoals route_merge.write_partition):
+    # de server laadt deze bestanden, een afgebroken run mag geen ingekorte trainingsset achterlaten
+    outputs = []  # (open bestand, doelpad)
+    jsonl = array = None
+    if "jsonl" in formats:
+        jsonl = _tmp(OUTPUT_JSONL).open("w", encoding="utf-8")
+        outputs.append((jsonl, OUTPUT_JSONL))
+    if "json" in formats:
+        array = JsonArrayWriter(_tmp(OUTPUT_JSON).open("w", encoding="utf-8"))
+        outputs.append((array.f, OUTPUT_JSON))
+    store = StoreWriter() if "store" in formats else None
 
-    print("Bouw routes...")
-    routes = build_routes(legs)
-    print(f"Aantal routes: {len(routes)}")
+    n = 0
+    try:
+        for route in stream_routes(files, args.chunk_rows):
+            if jsonl:
+                jsonl.write(json.dumps(route, ensure_ascii=False) + "\n")
+            if array:
+                array.add(route)
+            if store:
+                store.add(route)
+            n += 1
+        if array:
+            array.finish()
+    except BaseException:
+        # Ook bij Ctrl-C: tijdelijke bestanden weg, de vorige trainingsdata blijft staan
+        for f, target in outputs:
+            f.close()
+            _tmp(target).unlink(missing_ok=True)
+        raise
+    for f, target in outputs:
+        f.close()
+        os.replace(_tmp(target), target)
+    print(f"Aantal routes: {n}")
 
-    print(f"Schrijf naar: {OUTPUT_JSON}")
-    with OUTPUT_JSON.open("w", encoding="utf-8") as f:
-        json.dump(routes, f, ensure_ascii=False, indent=2)
+    if jsonl:
+        print(f"JSON Lines: {OUTPUT_JSONL}")
+    if array:
+        print(f"JSON: {OUTPUT_JSON}")
+    if store:
+        # Compacte memory-mapped variant voor de server (zie route_store.py)
+        meta = store.finish(STORE_DIR)
+        print(f"Route-store: {meta['routes']} routes, {meta['stops']} stops, {meta['strings']} strings ({STORE_DIR})")
 
     print("Klaar.")
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,212 @@
+# distance_matrix.py
+# NumPy-coördinatentabel + vooraf berekende haversine-afstandsmatrix voor alle bekende adressen
+# (route_merge.get_geo_cache() + route_merge.get_customer_coords()). Opslag als .npy zodat workers
+# de matrix alleen memory-mappen en nooit opnieuw hoeven te rekenen.
+#
+# Bouwen:  python distance_matrix.py
+# Gebruik: from distance_matrix import get_matrix; m = get_matrix(); m.submatrix([...])
+
+import json
+from pathlib import Path
+import numpy as np
+
+BASE = Path(__file__).parent
+MATRIX_DIR = BASE / "data" / "matrix"
+ADDRESSES_JSON = MATRIX_DIR / "addresses.json"
+COORDS_NPY = MATRIX_DIR / "coords.npy"
+DIST_NPY = MATRIX_DIR / "dist_km.npy"
+GEOCODE_JSON = BASE / "data" / "geocode_cache.json"
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Gemiddelde snelheid (km/u) voor reistijd-schatting uit hemelsbrede afstand
+AVG_SPEED_KMH = 30.0
+
+# Aantal rijen per batch bij het bouwen (begrenst geheugen bij grote adressenlijsten)
+BATCH_ROWS = 512
+
+# GLOBALE CACHE: 1 matrix per worker
+_MATRIX = None
+
+
+# -------------------------------------------------
+# Haversine (gevectoriseerd)
+# -------------------------------------------------
+def haversine_matrix(a, b):
+    """
+    a: (n, 2) en b: (m, 2) arrays met [lat, lon] in graden -> (n, m) afstanden in km.
+    """
+    a = np.radians(np.asarray(a, dtype=np.float64))
+    b = np.radians(np.asarray(b, dtype=np.float64))
+    dlat = a[:, 0:1] - b[None, :, 0]
+    dlon = a[:, 1:2] - b[None, :, 1]
+    h = np.sin(dlat / 2.0) ** 2 + np.cos(a[:, 0:1]) * np.cos(b[None, :, 0]) * np.sin(dlon / 2.0) ** 2
+    return 2.0 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(h, 0.0, 1.0)))
+
+
+# -------------------------------------------------
+# Bronnen verzamelen
+# -------------------------------------------------
+def _valid(lat, lon):
+    try:
+        return lat is not None and lon is not None and np.isfinite(float(lat)) and np.isfinite(float(lon))
+    except (TypeError, ValueError):
+        return False
+
+
+def collect_coords(geo_cache=None, customer_coords=None):
+    """Adres -> (lat, lon) uit geocode-cache en klantbestand (klantbestand wint bij dubbel)."""
+    out = {}
+    for addr, g in (geo_cache or {}).items():
+        if isinstance(g, dict) and _valid(g.get("lat"), g.get("lon")):
+            out[addr] = (float(g["lat"]), float(g["lon"]))
+    for addr, ll in (customer_coords or {}).items():
+        if ll and _valid(ll[0], ll[1]):
+            out[addr] = (float(ll[0]), float(ll[1]))
+    return out
+
+
+def _sources_from_route_merge():
+    # route_merge heeft pandas nodig; alleen importeren bij een offline build
+    import route_merge
+    return route_merge.get_geo_cache(), route_merge.get_customer_coords()
+
+
+# -------------------------------------------------
+# Matrix-service
+# -------------------------------------------------
+class DistanceMatrix:
+    """
+    addresses: lijst adressen (positie = integer index)
+    coords:    (n, 2) float64 [lat, lon]
+    dist_km:   (n, n) float32, mag een np.memmap zijn
+    """
+
+    def __init__(self, addresses, coords, dist_km):
+        self.addresses = list(addresses)
+        self.index = {a: i for i, a in enumerate(self.addresses)}
+        self.coords = coords
+        self.dist_km = dist_km
+
+    def __len__(self):
+        return len(self.addresses)
+
+    def __contains__(self, address):
+        return address in self.index
+
+    def index_of(self, address):
+        return self.index.get(address)
+
+    def indices(self, addresses):
+        """Integer-indexen; -1 voor onbekende adressen."""
+        return np.array([self.index.get(a, -1) for a in addresses], dtype=np.int64)
+
+    def coords_dict(self):
+        return {a: (float(self.coords[i, 0]), float(self.coords[i, 1])) for i, a in enumerate(self.addresses)}
+
+    def distance(self, a, b):
+        i, j = self.index.get(a), self.index.get(b)
+        if i is None or j is None:
+            return None
+        return float(self.dist_km[i, j])
+
+    def submatrix(self, addresses, fallback_coords=None):
+        """
+        (k, k) afstandsmatrix in km voor de gegeven adressen, in dezelfde volgorde.
+        Bekende adressen komen uit de voorberekende matrix; onbekende adressen worden
+        met haversine berekend op basis van fallback_coords (adres -> (lat, lon)).
+        """
+        idx = self.indices(addresses)
+        known = idx >= 0
+        if known.all():
+            return np.asarray(self.dist_km[np.ix_(idx, idx)], dtype=np.float64)
+
+        pts = np.empty((len(addresses), 2), dtype=np.float64)
+        if known.any():
+            pts[known] = self.coords[idx[known]]
+        for k in np.flatnonzero(~known):
+            ll = (fallback_coords or {}).get(addresses[k])
+            if ll is None:
+                raise KeyError(f"Geen coördinaten voor adres: {addresses[k]}")
+            pts[k] = ll
+        out = haversine_matrix(pts, pts)
+        if known.any():
+            kk = np.flatnonzero(known)
+            out[np.ix_(kk, kk)] = self.dist_km[np.ix_(idx[known], idx[known])]
+        return out
+
+    def duration_matrix(self, addresses, fallback_coords=None, speed_kmh=AVG_SPEED_KMH):
+        """Geschatte reistijd in seconden (afstand / gemiddelde snelheid)."""
+        return self.submatrix(addresses, fallback_coords) / speed_kmh * 3600.0
+
+
+# -------------------------------------------------
+# Bouwen + opslaan
+# -------------------------------------------------
+def build_matrix(coords_by_addr, out_dir: Path = None, batch_rows: int = BATCH_ROWS):
+    """
+    Bouw de matrix in batches van batch_rows rijen. Met out_dir wordt direct naar een
+    .npy-memmap geschreven (geheugen blijft begrensd), anders in het geheugen.
+    """
+    addresses = sorted(coords_by_addr)
+    n = len(addresses)
+    coords = np.array([coords_by_addr[a] for a in addresses], dtype=np.float64).reshape(n, 2)
+
+    if out_dir is not None:
+        out_dir.mkdir(parents=True, exist_ok=True)
+        dist = np.lib.format.open_memmap(out_dir / DIST_NPY.name, mode="w+", dtype=np.float32, shape=(n, n))
+    else:
+        dist = np.empty((n, n), dtype=np.float32)
+
+    for start in range(0, n, batch_rows):
+        stop = min(start + batch_rows, n)
+        dist[start:stop] = haversine_matrix(coords[start:stop], coords)
+
+    if out_dir is not None:
+        dist.flush()
+        np.save(out_dir / COORDS_NPY.name, coords)
+        (out_dir / ADDRESSES_JSON.name).write_text(json.dumps(addresses, ensure_ascii=False), encoding="utf-8")
+
+    return DistanceMatrix(addresses, coords, dist)
+
+
+def load_matrix(matrix_dir: Path = MATRIX_DIR):
+    """Laad een eerder gebouwde matrix; de afstanden worden read-only gememory-mapt."""
+    addresses = json.loads((matrix_dir / ADDRESSES_JSON.name).read_text(encoding="utf-8"))
+    coords = np.load(matrix_dir / COORDS_NPY.name)
+    dist = np.load(matrix_dir / DIST_NPY.name, mmap_mode="r")
+    return DistanceMatrix(addresses, coords, dist)
+
+
+def get_matrix():
+    """
+    Matrix voor de request-path. Laadt de .npy-bestanden als ze er zijn; anders wordt een
+    (kleine) matrix in het geheugen gebouwd uit alleen geocode_cache.json (zonder pandas).
+    """
+    global _MATRIX
+    if _MATRIX is not None:
+        return _MATRIX
+
+    if DIST_NPY.exists() and ADDRESSES_JSON.exists() and COORDS_NPY.exists():
+        _MATRIX = load_matrix(MATRIX_DIR)
+    else:
+        geo = {}
+        if GEOCODE_JSON.exists():
+            try:
+                geo = json.loads(GEOCODE_JSON.read_text(encoding="utf-8"))
+            except Exception:
+                geo = {}
+        _MATRIX = build_matrix(collect_coords(geo))
+    return _MATRIX
+
+
+def main():
+    geo_cache, customer_coords = _sources_from_route_merge()
+    coords = collect_coords(geo_cache, customer_coords)
+    print(f"Adressen met coördinaten: {len(coords)}")
+    m = build_matrix(coords, out_dir=MATRIX_DIR)
+    print(f"Matrix {len(m)}x{len(m)} geschreven naar: {MATRIX_DIR}")
+
+
+if __name__ == "__main__":
+    main()
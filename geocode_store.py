@@ -0,0 +1,204 @@
+# geocode_store.py
+# Geocode-cache in SQLite (vervangt het herschrijven van geocode_cache.json na elke miss).
+# - geïndexeerde lookups (address is PRIMARY KEY)
+# - schrijven wordt gebufferd en per batch in 1 transactie gecommit (crash = hooguit de laatste batch kwijt)
+# - WAL-modus: meerdere lezers (workers, distance_matrix) tegelijk met 1 schrijver
+#
+# geocode_cache.json blijft het uitwisselformaat: import_json() / export_json() (atomisch weggeschreven).
+#
+#   python geocode_store.py import            JSON -> SQLite
+#   python geocode_store.py export [pad]      SQLite -> JSON
+
+import os
+import sys
+import json
+import time
+import sqlite3
+import threading
+from pathlib import Path
+
+BASE = Path(__file__).parent
+GEOCODE_JSON = BASE / "data" / "geocode_cache.json"
+GEOCODE_DB = Path(os.environ.get("GEOCODE_DB_PATH") or BASE / "data" / "geocode_cache.sqlite")
+COMMIT_EVERY = int(os.environ.get("GEOCODE_COMMIT_EVERY", "100"))
+
+# GLOBALE STORE: 1 per proces
+_STORE = None
+_STORE_LOCK = threading.Lock()
+
+
+def _num(v):
+    try:
+        return None if v is None else float(v)
+    except (TypeError, ValueError):
+        return None
+
+
+class GeocodeStore:
+    """
+    Adres -> (lat, lon). Een rij met lat/lon = None betekent "geprobeerd, niet gevonden"
+    (zelfde betekenis als {"lat": null, "lon": null} in de JSON).
+    """
+
+    def __init__(self, path=GEOCODE_DB, commit_every: int = COMMIT_EVERY):
+        self.path = str(path)
+        self.commit_every = commit_every
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._pending = {}  # address -> (lat, lon, updated), nog niet gecommit
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        with self._conn() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS geocode ("
+                " address TEXT PRIMARY KEY, lat REAL, lon REAL, updated REAL NOT NULL)"
+            )
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # --- lezen ---
+    def get(self, address):
+        """(lat, lon) of None als het adres nog nooit opgezocht is."""
+        with self._lock:
+            p = self._pending.get(address)
+        if p is not None:
+            return p[0], p[1]
+        row = self._conn().execute("SELECT lat, lon FROM geocode WHERE address = ?", (address,)).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def get_many(self, addresses):
+        """Adres -> (lat, lon) voor de adressen die in de store staan (in blokken van 500)."""
+        addresses = list(dict.fromkeys(a for a in addresses if a))
+        out = {}
+        conn = self._conn()
+        for i in range(0, len(addresses), 500):
+            chunk = addresses[i:i + 500]
+            q = "SELECT address, lat, lon FROM geocode WHERE address IN (%s)" % ",".join("?" * len(chunk))
+            for addr, lat, lon in conn.execute(q, chunk):
+                out[addr] = (lat, lon)
+        with self._lock:
+            for addr in addresses:
+                p = self._pending.get(addr)
+                if p is not None:
+                    out[addr] = (p[0], p[1])
+        return out
+
+    def __contains__(self, address):
+        return self.get(address) is not None
+
+    def __len__(self):
+        self.flush()
+        return self._conn().execute("SELECT COUNT(*) FROM geocode").fetchone()[0]
+
+    def items(self):
+        self.flush()
+        for addr, lat, lon in self._conn().execute("SELECT address, lat, lon FROM geocode ORDER BY rowid"):
+            yield addr, (lat, lon)
+
+    def as_dict(self):
+        """Zelfde vorm als geocode_cache.json: {adres: {"lat": .., "lon": ..}}."""
+        return {addr: {"lat": lat, "lon": lon} for addr, (lat, lon) in self.items()}
+
+    # --- schrijven ---
+    def put(self, address, lat, lon):
+        with self._lock:
+            self._pending[address] = (_num(lat), _num(lon), time.time())
+            full = len(self._pending) >= self.commit_every
+        if full:
+            self.flush()
+
+    def put_many(self, items):
+        """items: iterable van (adres, lat, lon); wordt in 1 transactie geschreven."""
+        with self._lock:
+            for address, lat, lon in items:
+                self._pending[address] = (_num(lat), _num(lon), time.time())
+        self.flush()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        with self._conn() as conn:  # 1 transactie; rollback bij een fout
+            conn.executemany(
+                "INSERT OR REPLACE INTO geocode (address, lat, lon, updated) VALUES (?, ?, ?, ?)",
+                [(a, lat, lon, ts) for a, (lat, lon, ts) in pending.items()],
+            )
+        return len(pending)
+
+    def close(self):
+        self.flush()
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # --- JSON import/export ---
+    def import_json(self, path: Path = GEOCODE_JSON, overwrite: bool = False):
+        """Entries uit geocode_cache.json overnemen. Zonder overwrite wint wat al in de store staat."""
+        path = Path(path)
+        if not path.exists():
+            return 0
+        data = json.loads(path.read_text(encoding="utf-8"))
+        known = set() if overwrite else set(self.get_many(data.keys()))
+        rows = [
+            (addr, (g or {}).get("lat"), (g or {}).get("lon"))
+            for addr, g in data.items()
+            if addr not in known and isinstance(g, (dict, type(None)))
+        ]
+        self.put_many(rows)
+        return len(rows)
+
+    def export_json(self, path: Path = GEOCODE_JSON):
+        """Store -> JSON (zelfde opmaak als voorheen), via tijdelijk bestand + rename."""
+        path = Path(path)
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        tmp.write_text(json.dumps(self.as_dict(), ensure_ascii=False, indent=2), encoding="utf-8")
+        os.replace(tmp, path)
+        return path
+
+
+def get_geocode_store():
+    """Procesbrede store; een lege database wordt 1x gevuld vanuit geocode_cache.json."""
+    global _STORE
+    if _STORE is None:
+        with _STORE_LOCK:
+            if _STORE is None:
+                store = GeocodeStore(GEOCODE_DB)
+                if len(store) == 0 and GEOCODE_JSON.exists():
+                    n = store.import_json(GEOCODE_JSON)
+                    print(f"Geocode-store: {n} adressen geïmporteerd uit {GEOCODE_JSON.name}")
+                _STORE = store
+    return _STORE
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    cmd = argv[0] if argv else "import"
+    store = get_geocode_store()
+    if cmd == "import":
+        n = store.import_json(Path(argv[1]) if len(argv) > 1 else GEOCODE_JSON)
+        print(f"{n} nieuwe adressen geïmporteerd; store bevat er {len(store)} ({GEOCODE_DB})")
+    elif cmd == "export":
+        out = store.export_json(Path(argv[1]) if len(argv) > 1 else GEOCODE_JSON)
+        print(f"{len(store)} adressen geëxporteerd naar {out}")
+    else:
+        print("Gebruik: python geocode_store.py [import|export] [pad]")
+        return 1
+    store.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
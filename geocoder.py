@@ -0,0 +1,239 @@
+# geocoder.py
+# Batch-geocoder: verzamelt unieke adressen, slaat cache-hits over en lost de rest parallel op
+# via een verwisselbare backend, met token-bucket rate limit, begrensde thread-pool en retry/backoff.
+# Resultaten (ook "niet gevonden") gaan naar de geocode-store (geocode_store.py).
+#
+# Configuratie via environment:
+#   GEOCODER_URL      Nominatim-compatibele /search endpoint (standaard de publieke Nominatim)
+#   GEOCODE_RATE      max. requests per seconde (publieke Nominatim: 1)
+#   GEOCODE_WORKERS   aantal gelijktijdige requests
+#
+# Adressen die eerder "niet gevonden" gaven (lat/lon NULL in de store) worden niet opnieuw
+# opgezocht; python geocoder.py --retry-missing probeert ze wel opnieuw.
+#
+# Lokaal testen zonder netwerk: python mock_nominatim.py --port 8766
+#   GEOCODER_URL=http://127.0.0.1:8766/search GEOCODE_RATE=200 python geocoder.py
+
+import os
+import sys
+import time
+import argparse
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from geocode_store import get_geocode_store
+
+NOMINATIM_URL = "https://nominatim.openstreetmap.org/search"
+USER_AGENT = "koopjesbus-route-bot/1.0 (contact: ops@example.com)"
+
+GEOCODER_URL = os.environ.get("GEOCODER_URL") or NOMINATIM_URL
+GEOCODE_RATE = float(os.environ.get("GEOCODE_RATE", "1"))
+GEOCODE_WORKERS = int(os.environ.get("GEOCODE_WORKERS", "4"))
+GEOCODE_MAX_RETRIES = int(os.environ.get("GEOCODE_MAX_RETRIES", "3"))
+GEOCODE_BACKOFF_BASE_S = float(os.environ.get("GEOCODE_BACKOFF_BASE", "0.5"))
+GEOCODE_BACKOFF_MAX_S = float(os.environ.get("GEOCODE_BACKOFF_MAX", "8"))
+
+
+class GeocodeTransientError(RuntimeError):
+    """Tijdelijke fout (netwerk, timeout, 429, 5xx): opnieuw proberen heeft zin."""
+
+
+class GeocodeError(RuntimeError):
+    """Fout voor dit ene adres (bv. HTTP 400/403): niet opnieuw proberen, de batch gaat door."""
+
+
+class TokenBucket:
+    """
+    `rate` tokens per seconde, maximaal `burst` op voorraad. acquire() blokkeert tot er een
+    token is; thread-safe, dus 1 bucket begrenst alle workers samen.
+    """
+
+    def __init__(self, rate: float, burst: int = 1, clock=time.monotonic, sleep=time.sleep):
+        self.rate = float(rate)
+        self.burst = max(1, int(burst))
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = float(self.burst)
+        self._last = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return
+                wait = (1.0 - self._tokens) / self.rate
+            self._sleep(wait)
+
+
+# -------------------------------------------------
+# Backends: alles met geocode(address) -> (lat, lon) | (None, None)
+# -------------------------------------------------
+class NominatimBackend:
+    """Nominatim /search (publiek, zelf gehost of mock_nominatim.py); 1 HTTP-sessie per thread."""
+
+    def __init__(self, url: str = GEOCODER_URL, user_agent: str = USER_AGENT, timeout: float = 10.0):
+        import requests  # optioneel: alleen nodig als er echt online gegeocodeerd wordt
+        self._requests = requests
+        self.url = url
+        self.timeout = timeout
+        self.headers = {"User-Agent": user_agent}
+        self._local = threading.local()
+
+    def _session(self):
+        s = getattr(self._local, "session", None)
+        if s is None:
+            s = self._local.session = self._requests.Session()
+            s.headers.update(self.headers)
+        return s
+
+    def geocode(self, address):
+        params = {"q": address, "format": "json", "limit": 1, "addressdetails": 0}
+        try:
+            r = self._session().get(self.url, params=params, timeout=self.timeout)
+        except self._requests.RequestException as e:
+            raise GeocodeTransientError(str(e)) from e
+        if r.status_code == 429 or r.status_code >= 500:
+            raise GeocodeTransientError(f"HTTP {r.status_code}")
+        if r.status_code >= 400:
+            raise GeocodeError(f"HTTP {r.status_code}")
+        try:
+            data = r.json()
+        except ValueError as e:
+            # HTML-foutpagina of proxy-antwoord i.p.v. JSON: meestal tijdelijk
+            raise GeocodeTransientError(f"Geen JSON in het antwoord: {e}") from e
+        if not data:
+            return None, None
+        try:
+            return float(data[0]["lat"]), float(data[0]["lon"])
+        except (ValueError, KeyError, IndexError, TypeError) as e:
+            raise GeocodeError(f"Onverwacht antwoord: {data!r:.200}") from e
+
+
+class FunctionBackend:
+    """Wikkelt een gewone functie address -> (lat, lon) (bv. route_merge.geocode_online)."""
+
+    def __init__(self, fn):
+        self.fn = fn
+
+    def geocode(self, address):
+        return self.fn(address)
+
+
+# -------------------------------------------------
+# Batch
+# -------------------------------------------------
+class BatchGeocoder:
+    def __init__(self, backend=None, store=None, rate: float = GEOCODE_RATE, burst: int = 1,
+                 workers: int = GEOCODE_WORKERS, max_retries: int = GEOCODE_MAX_RETRIES,
+                 backoff_base: float = GEOCODE_BACKOFF_BASE_S, backoff_max: float = GEOCODE_BACKOFF_MAX_S):
+        self.backend = backend or NominatimBackend()
+        self.store = store if store is not None else get_geocode_store()
+        self.bucket = TokenBucket(rate, burst)
+        self.workers = max(1, workers)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.retries = 0
+
+    def _backoff(self, attempt):
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        return delay * (0.5 + random.random() / 2)  # jitter
+
+    def _resolve(self, address):
+        """(lat, lon) of (None, None) bij niet gevonden; None als alle pogingen mislukten."""
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            with self._lock:
+                self.requests += 1
+            try:
+                return self.backend.geocode(address)
+            except GeocodeTransientError:
+                if attempt < self.max_retries:
+                    with self._lock:
+                        self.retries += 1
+                    time.sleep(self._backoff(attempt))
+            except GeocodeError as e:
+                print(f"Geocoding mislukt voor {address!r}: {e}")
+                return None
+        return None
+
+    def pending(self, addresses, retry_missing: bool = False):
+        """
+        Unieke adressen die nog opgezocht moeten worden (volgorde behouden): nooit opgezocht, of
+        met retry_missing ook de eerdere "niet gevonden" (lat/lon NULL in de store).
+        """
+        unique = list(dict.fromkeys(a for a in addresses if a))
+        known = self.store.get_many(unique)
+        if retry_missing:
+            todo = [a for a in unique if not (known.get(a) and known[a][0] is not None and known[a][1] is not None)]
+        else:
+            todo = [a for a in unique if a not in known]
+        return unique, todo
+
+    def geocode_many(self, addresses, progress=None, retry_missing: bool = False):
+        """
+        Lost alle adressen op die nog niet in de store staan (zie pending). Geeft een rapport
+        terug; de coördinaten zelf staan daarna in de store.
+        """
+        t0 = time.perf_counter()
+        unique, todo = self.pending(addresses, retry_missing=retry_missing)
+        found = not_found = failed = 0
+
+        def work(address):
+            return address, self._resolve(address)
+
+        with ThreadPoolExecutor(max_workers=self.workers) as ex:
+            for i, (address, result) in enumerate(ex.map(work, todo), 1):
+                if result is None:
+                    failed += 1  # niet opslaan: volgende run opnieuw proberen
+                    continue
+                lat, lon = result
+                self.store.put(address, lat, lon)
+                if lat is not None and lon is not None:
+                    found += 1
+                else:
+                    not_found += 1
+                if progress and i % 100 == 0:
+                    progress(i, len(todo))
+        self.store.flush()
+
+        return {
+            "unique": len(unique),
+            "cache_hits": len(unique) - len(todo),
+            "looked_up": len(todo),
+            "found": found,
+            "not_found": not_found,
+            "failed": failed,
+            "requests": self.requests,
+            "retries": self.retries,
+            "elapsed_s": round(time.perf_counter() - t0, 3),
+        }
+
+
+def main(argv=None):
+    # Alle adressen uit de FleetGO-exports + klantbestand geocoderen
+    ap = argparse.ArgumentParser(description="Batch-geocoding van alle adressen zonder coördinaten")
+    ap.add_argument("--retry-missing", action="store_true",
+                    help='eerder "niet gevonden" adressen opnieuw opzoeken')
+    args = ap.parse_args(argv)
+
+    import route_merge
+    addresses = route_merge.collect_addresses()
+    geocoder = BatchGeocoder()
+    print(f"{len(set(addresses))} unieke adressen, geocoder={geocoder.backend.url} rate={GEOCODE_RATE}/s "
+          f"workers={geocoder.workers}")
+    report = geocoder.geocode_many(addresses, progress=lambda i, n: print(f"  {i}/{n}"),
+                                   retry_missing=args.retry_missing)
+    print(report)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
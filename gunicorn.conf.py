@@ -0,0 +1,28 @@
+# gunicorn.conf.py
+# Wordt automatisch gelezen door gunicorn (vanuit de werkdirectory /app).
+#
+# Configuratie via environment (Railway Variables):
+#   WEB_CONCURRENCY   aantal sync workers (standaard 1; gunicorn leest deze variabele zelf);
+#                     bij > 1 ook JOB_STORE_PATH zetten, zodat job-status in elke worker op te vragen is
+#   WARM_STARTUP      1 = server.py 1x in de master laden (preload) en opwarmen (when_ready), vóór de fork
+#
+# Met preload delen de workers de trainingsdata, index, matrix en reistijden copy-on-write.
+# `python bench.py workers` meet opstarttijd en geheugen per worker bij 1, 2 en 4 workers.
+
+import gc
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get("WEB_CONCURRENCY", "1"))
+timeout = 120
+preload_app = os.environ.get("WARM_STARTUP", "1") == "1"
+
+
+def when_ready(server):
+    # Master, na het laden van de app (preload) en vóór de fork: hier opwarmen, niet bij `import server`
+    if preload_app:
+        from warmup import warm_up
+        warm_up()
+    # Alles wat de master tot nu toe geladen heeft uit de cyclische GC halen: anders schrijft
+    # de eerste GC-ronde in elke worker in die objecten (gc-headers) en worden de pages gekopieerd
+    gc.freeze()
@@ -0,0 +1,338 @@
+# llm_client.py
+# Procesbrede OpenAI-client: 1 client (keep-alive connection pool) per worker, vaste connect/read
+# timeouts, retries met exponentiële backoff op tijdelijke fouten en een circuit breaker die
+# na herhaalde fouten direct "LLM niet beschikbaar" meldt zodat de aanroeper lokaal kan terugvallen.
+#
+# Lokaal testen tegen een stand-in: OPENAI_BASE_URL=http://127.0.0.1:8765/v1 (zie mock_llm.py)
+
+import os
+import time
+import asyncio
+import random
+import threading
+
+import openai
+from openai import OpenAI, AsyncOpenAI
+
+# Configuratie via environment (Railway Variables)
+LLM_MODEL = os.environ.get("LLM_MODEL", "gpt-4o-mini")
+LLM_CONNECT_TIMEOUT_S = float(os.environ.get("LLM_CONNECT_TIMEOUT", "5"))
+LLM_READ_TIMEOUT_S = float(os.environ.get("LLM_READ_TIMEOUT", "30"))
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", "2"))
+LLM_BACKOFF_BASE_S = float(os.environ.get("LLM_BACKOFF_BASE", "0.5"))
+LLM_BACKOFF_MAX_S = float(os.environ.get("LLM_BACKOFF_MAX", "8"))
+LLM_BREAKER_THRESHOLD = int(os.environ.get("LLM_BREAKER_THRESHOLD", "5"))
+LLM_BREAKER_RESET_S = float(os.environ.get("LLM_BREAKER_RESET", "30"))
+
+# Fouten waarbij een nieuwe poging zin heeft (netwerk, timeout, rate limit, 5xx)
+TRANSIENT_ERRORS = (
+    openai.APIConnectionError,  # incl. APITimeoutError
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+
+
+
+def worst_case_seconds(max_retries: int = LLM_MAX_RETRIES, connect_timeout: float = LLM_CONNECT_TIMEOUT_S,
+                       read_timeout: float = LLM_READ_TIMEOUT_S, backoff_base: float = LLM_BACKOFF_BASE_S,
+                       backoff_max: float = LLM_BACKOFF_MAX_S) -> float:
+    """Bovengrens voor 1 chat_completion: alle pogingen tot de timeouts plus de maximale backoff ertussen."""
+    backoff = sum(min(backoff_max, backoff_base * (2 ** attempt)) for attempt in range(max_retries))
+    return (max_retries + 1) * (connect_timeout + read_timeout) + backoff
+
+
+# Key ontbreekt/ongeldig of geen rechten: configuratie, geen reden voor retries of breaker
+AUTH_ERRORS = (
+    openai.AuthenticationError,
+    openai.PermissionDeniedError,
+)
+
+# Met de standaardinstellingen: 3 x (5 + 30) s + 0.5 + 1.0 s backoff = 106.5 s
+LLM_WORST_CASE_S = worst_case_seconds()
+
+# GLOBALE CACHE: 1 manager (en dus 1 connection pool) per worker
+_MANAGER = None
+_MANAGER_LOCK = threading.Lock()
+
+
+class LLMUnavailableError(RuntimeError):
+    """LLM niet bereikbaar (retries op of circuit breaker open); val terug op de lokale solver."""
+
+
+class LLMConfigError(ValueError):
+    """LLM niet (goed) geconfigureerd: API key ontbreekt of wordt geweigerd. Geen tijdelijke fout."""
+
+
+class CircuitBreaker:
+    """
+    closed    -> alles gaat door; na `threshold` opeenvolgende fouten -> open
+    open      -> alles wordt direct geweigerd tot `reset_timeout` verstreken is -> half-open
+    half-open -> 1 proefaanroep; succes -> closed, fout -> weer open
+    """
+
+    def __init__(self, threshold: int = LLM_BREAKER_THRESHOLD, reset_timeout: float = LLM_BREAKER_RESET_S,
+                 clock=time.monotonic):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+        self.opened_count = 0
+        self.rejected_count = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self._opened_at is None:
+            return "closed"
+        if self._clock() - self._opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self):
+        """True (closed), "probe" (de ene proefaanroep in half-open) of False (geweigerd)."""
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._probing:
+                self._probing = True
+                return "probe"
+            self.rejected_count += 1
+            return False
+
+    def release_probe(self):
+        """Proefaanroep zonder uitkomst (bv. geannuleerd): slot vrijgeven, de breaker blijft half-open."""
+        with self._lock:
+            self._probing = False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.threshold:
+                if self._opened_at is None or self._probing:
+                    self.opened_count += 1
+                self._opened_at = self._clock()
+                self._probing = False
+
+
+class LLMClientManager:
+    """Beheert de gedeelde OpenAI-client en voert chat-completions uit met retries + breaker."""
+
+    def __init__(self, api_key=None, base_url=None, connect_timeout=LLM_CONNECT_TIMEOUT_S,
+                 read_timeout=LLM_READ_TIMEOUT_S, max_retries=LLM_MAX_RETRIES,
+                 backoff_base=LLM_BACKOFF_BASE_S, backoff_max=LLM_BACKOFF_MAX_S, breaker=None):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.timeout = openai.Timeout(read_timeout, connect=connect_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+        self._client = None
+        self._async_client = None
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+        self._usage_lock = threading.Lock()
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.completions_with_usage = 0
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    # max_retries=0: retries doen we zelf, zodat de breaker elke poging ziet
+                    self._client = OpenAI(
+                        api_key=self.api_key,
+                        base_url=self.base_url,
+                        timeout=self.timeout,
+                        max_retries=0,
+                    )
+        return self._client
+
+    @property
+    def async_client(self):
+        """AsyncOpenAI met dezelfde instellingen, voor server_async (1 event loop per proces)."""
+        if self._async_client is None:
+            with self._lock:
+                if self._async_client is None:
+                    self._async_client = AsyncOpenAI(
+                        api_key=self.api_key,
+                        base_url=self.base_url,
+                        timeout=self.timeout,
+                        max_retries=0,
+                    )
+        return self._async_client
+
+    def _record_usage(self, completion):
+        """Token-boekhouding per completion (usage uit het API-antwoord)."""
+        usage = getattr(completion, "usage", None)
+        if usage is None:
+            return
+        with self._usage_lock:
+            self.prompt_tokens += getattr(usage, "prompt_tokens", 0) or 0
+            self.completion_tokens += getattr(usage, "completion_tokens", 0) or 0
+            self.completions_with_usage += 1
+
+    def _count(self, name):
+        # calls/retries/failures: ook vanuit de speculatieve threads, dus onder dezelfde lock als de tokens
+        with self._usage_lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def available(self):
+        return self.breaker.state != "open"
+
+    def _backoff(self, attempt):
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        return delay * (0.5 + random.random() / 2)  # jitter
+
+    def chat_completion(self, messages, model=LLM_MODEL, **kwargs):
+        """Geeft het completion-object terug of gooit LLMUnavailableError."""
+        allowed = self.breaker.allow()
+        if not allowed:
+            raise LLMUnavailableError("Circuit breaker open: LLM tijdelijk overgeslagen")
+
+        self._count("calls")
+        last_error = None
+        try:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    completion = self.client.chat.completions.create(model=model, messages=messages, **kwargs)
+                    self.breaker.record_success()
+                    self._record_usage(completion)
+                    return completion
+                except TRANSIENT_ERRORS as e:
+                    last_error = e
+                    if attempt < self.max_retries:
+                        self._count("retries")
+                        time.sleep(self._backoff(attempt))
+                except AUTH_ERRORS as e:
+                    self.breaker.record_success()
+                    raise LLMConfigError(f"OpenAI weigert de API key: {e}") from e
+                except Exception:
+                    # Upstream bereikbaar maar weigert het verzoek (bv. 400): geen breaker-fout
+                    self.breaker.record_success()
+                    raise
+
+            self._count("failures")
+            self.breaker.record_failure()
+            raise LLMUnavailableError(f"LLM niet bereikbaar na {self.max_retries + 1} pogingen: {last_error}")
+        finally:
+            if allowed == "probe":
+                # Afgebroken zonder uitkomst (KeyboardInterrupt e.d.): anders blijft de breaker dicht
+                self.breaker.release_probe()
+
+    async def chat_completion_async(self, messages, model=LLM_MODEL, **kwargs):
+        """Async variant van chat_completion; deelt breaker en tellers met de sync client."""
+        allowed = self.breaker.allow()
+        if not allowed:
+            raise LLMUnavailableError("Circuit breaker open: LLM tijdelijk overgeslagen")
+
+        self._count("calls")
+        last_error = None
+        try:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    completion = await self.async_client.chat.completions.create(
+                        model=model, messages=messages, **kwargs
+                    )
+                    self.breaker.record_success()
+                    self._record_usage(completion)
+                    return completion
+                except TRANSIENT_ERRORS as e:
+                    last_error = e
+                    if attempt < self.max_retries:
+                        self._count("retries")
+                        await asyncio.sleep(self._backoff(attempt))
+                except AUTH_ERRORS as e:
+                    self.breaker.record_success()
+                    raise LLMConfigError(f"OpenAI weigert de API key: {e}") from e
+                except Exception:
+                    self.breaker.record_success()
+                    raise
+
+            self._count("failures")
+            self.breaker.record_failure()
+            raise LLMUnavailableError(f"LLM niet bereikbaar na {self.max_retries + 1} pogingen: {last_error}")
+        finally:
+            if allowed == "probe":
+                # CancelledError (verliezende speculatieve kandidaat, deadline) is geen Exception:
+                # zonder dit blijft _probing True en weigert allow() tot een herstart
+                self.breaker.release_probe()
+
+    def close(self):
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+
+    async def aclose(self):
+        """De AsyncOpenAI-client (server_async) sluiten; close() doet alleen de sync client."""
+        with self._lock:
+            client, self._async_client = self._async_client, None
+        if client is not None:
+            await client.close()
+
+    def token_usage(self):
+        with self._usage_lock:
+            n = self.completions_with_usage
+            return {
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "total_tokens": self.prompt_tokens + self.completion_tokens,
+                "completions": n,
+                "avg_prompt_tokens": (self.prompt_tokens / n) if n else 0.0,
+                "avg_completion_tokens": (self.completion_tokens / n) if n else 0.0,
+            }
+
+    def stats(self):
+        return {
+            "tokens": self.token_usage(),
+            "calls": self.calls,
+            "retries": self.retries,
+            "failures": self.failures,
+            "breaker_state": self.breaker.state,
+            "breaker_opened": self.breaker.opened_count,
+            "breaker_rejected": self.breaker.rejected_count,
+        }
+
+
+def get_llm_client():
+    """Procesbrede manager; de API key wordt bij de eerste aanroep uit de omgeving gelezen."""
+    global _MANAGER
+    if _MANAGER is None:
+        with _MANAGER_LOCK:
+            if _MANAGER is None:
+                api_key = os.environ.get("OPENAI_API_KEY")
+                if not api_key:
+                    raise LLMConfigError("OpenAI API key ontbreekt. Check Railway Variables.")
+                _MANAGER = LLMClientManager(api_key=api_key, base_url=os.environ.get("OPENAI_BASE_URL") or None)
+    return _MANAGER
+
+
+async def aclose_llm_client():
+    """Bij het afsluiten van server_async: HTTP-pools van de gedeelde manager sluiten (als die bestaat)."""
+    if _MANAGER is not None:
+        _MANAGER.close()
+        await _MANAGER.aclose()
+
+
+def check_config():
+    """Bij het opstarten (warmup.py) als de standaard-engine "llm" is: faalt luid zonder API key."""
+    if not os.environ.get("OPENAI_API_KEY"):
+        raise LLMConfigError("OpenAI API key ontbreekt (ROUTE_ENGINE=llm). Check Railway Variables.")
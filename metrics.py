@@ -0,0 +1,226 @@
+# metrics.py
+# Latency-spans, tellers en histogrammen voor route-bot, met export in het Prometheus-tekstformaat
+# (GET /metrics in server.py en server_async.py). Geen extra dependency: alles in-process, thread-safe.
+#
+#   with span("prompt_build"):          tijd van een stap -> routebot_stage_seconds{stage="prompt_build"}
+#   FALLBACKS.inc(engine="llm", reason="missing_stops")
+#
+# Volledige payloads (request, prompt, resultaat) loggen is opt-in en gesampled:
+#   LOG_PAYLOADS=1              payload-logging aan (standaard uit)
+#   LOG_PAYLOAD_SAMPLE=0.05     fractie van de requests die gelogd wordt
+
+import os
+import time
+import random
+import threading
+import contextlib
+import contextvars
+from bisect import bisect_left
+
+LOG_PAYLOADS = os.environ.get("LOG_PAYLOADS", "0") == "1"
+LOG_PAYLOAD_SAMPLE = float(os.environ.get("LOG_PAYLOAD_SAMPLE", "0.05"))
+
+# Seconden; van cache-hit (ms) tot een trage LLM-call (tientallen seconden)
+LATENCY_BUCKETS_S = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Spans van de lopende request (zie collect_spans); None buiten een request. Threads die voor
+# de request werken (speculatieve kandidaten) krijgen een kopie van de context en schrijven in
+# dezelfde dict, vandaar de lock.
+_CURRENT_SPANS = contextvars.ContextVar("routebot_spans", default=None)
+_SPANS_LOCK = threading.Lock()
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _num(v):
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+        REGISTRY.append(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name}: labels {sorted(labels)} != {list(self.labelnames)}")
+        return tuple(str(labels[k]) for k in self.labelnames)
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+            lines += [line for key, value in items for line in self._render_one(key, value)]
+        return lines
+
+
+class CounterMetric(_Metric):
+    """Teller; de naam krijgt "_total", zodat # HELP/# TYPE en de samples dezelfde naam hebben."""
+    kind = "counter"
+
+    def __init__(self, name, help_text, labelnames=()):
+        super().__init__(name if name.endswith("_total") else f"{name}_total", help_text, labelnames)
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def values(self):
+        """{label-tuple: waarde}."""
+        with self._lock:
+            return dict(self._values)
+
+    def _render_one(self, key, value):
+        yield f"{self.name}{_labels(self.labelnames, key)} {_num(value)}"
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS_S):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            h = self._values.get(key)
+            if h is None:
+                h = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            h[0][i] += 1
+            h[1] += value
+            h[2] += 1
+
+    def summary(self, **labels):
+        """{"count", "sum"} voor 1 label-combinatie (0 als er nog niets gemeten is)."""
+        with self._lock:
+            h = self._values.get(self._key(labels))
+            return {"count": h[2], "sum": h[1]} if h else {"count": 0, "sum": 0.0}
+
+    def _render_one(self, key, value):
+        counts, total, n = value
+        cumulative = 0
+        for le, c in zip(self.buckets + (float("inf"),), counts):
+            cumulative += c
+            yield f"{self.name}_bucket{_labels(self.labelnames, key, [('le', _num(le))])} {cumulative}"
+        yield f"{self.name}_sum{_labels(self.labelnames, key)} {_num(total)}"
+        yield f"{self.name}_count{_labels(self.labelnames, key)} {n}"
+
+
+REGISTRY = []
+
+STAGE_SECONDS = Histogram(
+    "routebot_stage_seconds", "Duur per stap van optimize_route (training laden, prompt, LLM-call, ...)", ["stage"])
+REQUEST_SECONDS = Histogram(
+    "routebot_request_seconds", "Duur per HTTP-request", ["endpoint", "status"])
+VALIDATIONS = CounterMetric(
+    "routebot_validations", "Aantal verdelingen door validate_and_fix", ["engine"])
+FALLBACKS = CounterMetric(
+    "routebot_fallbacks", "Fallbacks en geforceerde enkele routes per reden", ["engine", "reason"])
+JOBS = CounterMetric(
+    "routebot_jobs", "Jobs per uitkomst (queued, done, error, rejected)", ["status"])
+JOB_SECONDS = Histogram(
+    "routebot_job_seconds", "Wachttijd in de job-rij (queue) en rekentijd (run) per job", ["phase"])
+COALESCED = CounterMetric(
+    "routebot_coalesced", "Aanvragen die op een identieke lopende aanvraag wachtten (single-flight)", ["engine"])
+
+
+# -------------------------------------------------
+# Spans
+# -------------------------------------------------
+@contextlib.contextmanager
+def span(stage):
+    """Meet de duur van een stap; ook zichtbaar in collect_spans() van de lopende request."""
+    t = time.perf_counter()
+    try:
+        yield
+    finally:
+        dt = time.perf_counter() - t
+        STAGE_SECONDS.observe(dt, stage=stage)
+        spans = _CURRENT_SPANS.get()
+        if spans is not None:
+            with _SPANS_LOCK:
+                spans[stage] = spans.get(stage, 0.0) + dt
+
+
+@contextlib.contextmanager
+def collect_spans():
+    """Verzamelt de spans binnen dit blok in een dict stage -> seconden (opgeteld bij herhaling)."""
+    spans = {}
+    token = _CURRENT_SPANS.set(spans)
+    try:
+        yield spans
+    finally:
+        _CURRENT_SPANS.reset(token)
+
+
+# -------------------------------------------------
+# Export
+# -------------------------------------------------
+def _flatten(prefix, obj):
+    if isinstance(obj, bool):
+        yield prefix, int(obj)
+    elif isinstance(obj, (int, float)):
+        yield prefix, obj
+    elif isinstance(obj, dict):
+        for k, v in obj.items():
+            yield from _flatten(f"{prefix}_{k}", v)
+
+
+def render(extra_gauges=None):
+    """
+    Alle metrics in het Prometheus-tekstformaat. extra_gauges: geneste dict met getallen
+    (bv. service_stats()) die als gauges routebot_<pad> meegaan.
+    """
+    lines = []
+    for metric in REGISTRY:
+        lines += metric.render()
+    for name, value in _flatten("routebot", extra_gauges or {}):
+        name = "".join(c if c.isalnum() or c == "_" else "_" for c in name)
+        lines += [f"# TYPE {name} gauge", f"{name} {_num(value)}"]
+    return "\n".join(lines) + "\n"
+
+
+# -------------------------------------------------
+# Payload-logging (opt-in, gesampled)
+# -------------------------------------------------
+def payload_sampled():
+    """1x per request beslissen, zodat in- en uitgaande payload samen gelogd worden."""
+    return LOG_PAYLOADS and random.random() < LOG_PAYLOAD_SAMPLE
+
+
+def log_payload(title, payload, sampled=None):
+    if sampled is None:
+        sampled = payload_sampled()
+    if not sampled:
+        return
+    print(f"=== {title} ===")
+    print(payload)
+    print(f"=== EINDE {title} ===")
@@ -0,0 +1,180 @@
+# mock_llm.py
+# Lokale OpenAI-compatibele stand-in voor /v1/chat/completions (geen netwerk of API key nodig).
+# Leest de adressen uit de prompt en antwoordt met een geldige verdeling van route_solver,
+# met instelbare latency, foutpercentage (HTTP 500) en percentage ongeldige antwoorden.
+#
+# Draaien:  python mock_llm.py --port 8765 --latency 2 --failure-rate 0.1
+# Gebruik:  OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=test python route_brain.py
+
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from route_solver import solve
+
+
+def parse_prompt(prompt):
+    """
+    Haal datum, bussen, max stops en adressen uit een prompt van build_prompt of
+    build_prompt_compact. Bij de compacte prompt is legend = {nummer: adres}, anders None.
+    """
+    date = re.search(r"^Datum: (\d{4}-\d{2}-\d{2})", prompt, flags=re.M)
+    buses = re.search(r"^Bussen: (.+)$", prompt, flags=re.M)
+    max_stops = re.search(r"^Max stops per bus: (\d+)", prompt, flags=re.M)
+    stops = []
+    legend = None
+    tail = prompt.split("\nAdressen:", 1)
+    if len(tail) == 2:
+        for line in tail[1].splitlines():
+            m = re.match(r"^- (.+?)(?: \(colli: [^)]*\))?$", line)
+            c = re.match(r"^(\d+) (.+?)(?: \(colli [^)]*\))?$", line)
+            if c:
+                legend = legend or {}
+                legend[c.group(2)] = int(c.group(1))
+                stops.append({"address": c.group(2)})
+            elif m:
+                stops.append({"address": m.group(1)})
+            elif stops and line.strip():
+                break
+    return {
+        "date": date.group(1) if date else "2025-01-07",
+        "buses": [b.strip() for b in buses.group(1).split(",")] if buses else ["Ocho", "Rebel"],
+        "max_stops_per_bus": int(max_stops.group(1)) if max_stops else 18,
+        "stops": stops,
+    }, legend
+
+
+class MockLLMConfig:
+    def __init__(self, latency_s=0.0, jitter_s=0.0, failure_rate=0.0, invalid_rate=0.0, seed=None):
+        self.latency_s = latency_s
+        self.jitter_s = jitter_s
+        self.failure_rate = failure_rate
+        self.invalid_rate = invalid_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.failures = 0
+        self.invalid = 0
+
+    def roll(self):
+        with self.lock:
+            self.requests += 1
+            delay = self.latency_s + (self.rng.random() * self.jitter_s if self.jitter_s else 0.0)
+            fail = self.rng.random() < self.failure_rate
+            invalid = self.rng.random() < self.invalid_rate
+            if fail:
+                self.failures += 1
+            elif invalid:
+                self.invalid += 1
+            return delay, fail, invalid
+
+
+def make_completion(content, prompt):
+    prompt_tokens = max(1, len(prompt) // 4)
+    completion_tokens = max(1, len(content) // 4)
+    return {
+        "id": f"chatcmpl-mock-{int(time.time() * 1000)}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": "mock-gpt-4o-mini",
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop",
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+
+def answer(prompt, invalid=False):
+    req, legend = parse_prompt(prompt)
+    plan = solve(req) if req["stops"] else {"bus_routes": {b: [] for b in req["buses"]}}
+    if legend:
+        plan["bus_routes"] = {bus: [legend[a] for a in arr] for bus, arr in plan["bus_routes"].items()}
+    if invalid:
+        # Typische LLM-fout: 1 stop vergeten
+        for arr in plan["bus_routes"].values():
+            if arr:
+                arr.pop()
+                break
+    return json.dumps(plan, ensure_ascii=False)
+
+
+def make_handler(config):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, zoals de echte API
+
+        def log_message(self, fmt, *args):
+            pass
+
+        def _send(self, status, payload):
+            body = json.dumps(payload).encode("utf-8")
+            try:
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            except (BrokenPipeError, ConnectionResetError):
+                # Client heeft de call geannuleerd (bv. verliezende speculatieve kandidaat)
+                self.close_connection = True
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            body = json.loads(self.rfile.read(length) or b"{}")
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                return self._send(404, {"error": {"message": "not found"}})
+
+            delay, fail, invalid = config.roll()
+            if delay:
+                time.sleep(delay)
+            if fail:
+                return self._send(500, {"error": {"message": "mock upstream failure", "type": "server_error"}})
+
+            prompt = (body.get("messages") or [{}])[-1].get("content", "")
+            self._send(200, make_completion(answer(prompt, invalid), prompt))
+
+    return Handler
+
+
+def start_mock_llm(host="127.0.0.1", port=0, **config_kwargs):
+    """Start de stand-in in een achtergrondthread. Geeft (server, base_url, config) terug."""
+    config = MockLLMConfig(**config_kwargs)
+    server = ThreadingHTTPServer((host, port), make_handler(config))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://{host}:{server.server_address[1]}/v1"
+    return server, base_url, config
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Lokale OpenAI-compatibele mock voor route-bot")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--latency", type=float, default=0.0, help="vaste latency per call (s)")
+    ap.add_argument("--jitter", type=float, default=0.0, help="extra willekeurige latency (s)")
+    ap.add_argument("--failure-rate", type=float, default=0.0, help="kans op HTTP 500")
+    ap.add_argument("--invalid-rate", type=float, default=0.0, help="kans op een ongeldige verdeling")
+    ap.add_argument("--seed", type=int, default=None)
+    args = ap.parse_args(argv)
+
+    config = MockLLMConfig(args.latency, args.jitter, args.failure_rate, args.invalid_rate, args.seed)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(config))
+    print(f"Mock LLM op http://{args.host}:{args.port}/v1 (latency={args.latency}s, failure_rate={args.failure_rate})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,133 @@
+# mock_nominatim.py
+# Lokale Nominatim-compatibele stand-in voor /search (geen netwerk nodig).
+# Antwoordt met deterministische coördinaten rond Amsterdam per adres, met instelbare latency,
+# foutpercentage (HTTP 503), percentage "niet gevonden" en optioneel een rate limit (HTTP 429).
+#
+# Draaien:  python mock_nominatim.py --port 8766 --latency 0.2 --max-rps 50
+# Gebruik:  GEOCODER_URL=http://127.0.0.1:8766/search GEOCODE_RATE=40 python geocoder.py
+
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def fake_coords(address):
+    """Stabiel (over processen heen) punt binnen ca. 10 km van de Dam."""
+    h = hashlib.md5(address.encode("utf-8")).digest()
+    lat = 52.30 + int.from_bytes(h[:4], "big") / 2**32 * 0.14
+    lon = 4.78 + int.from_bytes(h[4:8], "big") / 2**32 * 0.22
+    return round(lat, 7), round(lon, 7)
+
+
+class MockNominatimConfig:
+    def __init__(self, latency_s=0.0, failure_rate=0.0, not_found_rate=0.0, max_rps=0.0, seed=None):
+        self.latency_s = latency_s
+        self.failure_rate = failure_rate
+        self.not_found_rate = not_found_rate
+        self.max_rps = max_rps
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.failures = 0
+        self.rate_limited = 0
+        self._window = []  # tijdstippen van requests in de laatste seconde
+
+    def roll(self):
+        with self.lock:
+            self.requests += 1
+            now = time.monotonic()
+            if self.max_rps:
+                self._window = [t for t in self._window if now - t < 1.0]
+                if len(self._window) >= self.max_rps:
+                    self.rate_limited += 1
+                    return "rate_limited"
+                self._window.append(now)
+            if self.rng.random() < self.failure_rate:
+                self.failures += 1
+                return "fail"
+            return "ok"
+
+    def not_found(self, address):
+        # Deterministisch per adres, zodat een retry hetzelfde antwoord geeft
+        h = hashlib.md5(("nf:" + address).encode("utf-8")).digest()
+        return int.from_bytes(h[:4], "big") / 2**32 < self.not_found_rate
+
+
+def make_handler(config):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, fmt, *args):
+            pass
+
+        def _send(self, status, payload):
+            body = json.dumps(payload).encode("utf-8")
+            try:
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            except (BrokenPipeError, ConnectionResetError):
+                self.close_connection = True
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path.rstrip("/") != "/search":
+                return self._send(404, {"error": "not found"})
+
+            outcome = config.roll()
+            if outcome == "rate_limited":
+                return self._send(429, {"error": "Too Many Requests"})
+            if config.latency_s:
+                time.sleep(config.latency_s)
+            if outcome == "fail":
+                return self._send(503, {"error": "Service Unavailable"})
+
+            q = (parse_qs(url.query).get("q") or [""])[0]
+            if not q or config.not_found(q):
+                return self._send(200, [])
+            lat, lon = fake_coords(q)
+            self._send(200, [{"lat": str(lat), "lon": str(lon), "display_name": q}])
+
+    return Handler
+
+
+def start_mock_nominatim(host="127.0.0.1", port=0, **config_kwargs):
+    """Start de stand-in in een achtergrondthread. Geeft (server, search_url, config) terug."""
+    config = MockNominatimConfig(**config_kwargs)
+    server = ThreadingHTTPServer((host, port), make_handler(config))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/search", config
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Lokale Nominatim-compatibele mock voor route-bot")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8766)
+    ap.add_argument("--latency", type=float, default=0.0, help="latency per request (s)")
+    ap.add_argument("--failure-rate", type=float, default=0.0, help="kans op HTTP 503")
+    ap.add_argument("--not-found-rate", type=float, default=0.0, help="deel van de adressen zonder resultaat")
+    ap.add_argument("--max-rps", type=float, default=0.0, help="boven dit aantal req/s: HTTP 429 (0 = geen limiet)")
+    ap.add_argument("--seed", type=int, default=None)
+    args = ap.parse_args(argv)
+
+    config = MockNominatimConfig(args.latency, args.failure_rate, args.not_found_rate, args.max_rps, args.seed)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(config))
+    print(f"Mock Nominatim op http://{args.host}:{args.port}/search (latency={args.latency}s, "
+          f"failure_rate={args.failure_rate}, max_rps={args.max_rps or '-'})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,21 +2,48 @@ import os
 import json
 import random
 import re
+import time
+import asyncio
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeout
+from collections import Counter, defaultdict
 from pathlib import Path
-from openai import OpenAI
-import datetime
+from llm_client import get_llm_client, LLMUnavailableError, LLMConfigError, LLM_WORST_CASE_S
+from route_solver import solve as solve_local, get_weekday
+from route_cache import canonical_key, get_result_cache, get_single_flight, COALESCE_REQUESTS
+from route_sequencer import sequence_result
+from travel_times import parse_hhmm
+from metrics import span, log_payload, FALLBACKS, VALIDATIONS, COALESCED
+from route_store import RouteStore, JsonlRoutes, STORE_DIR
+from route_jobs import job_stats
 
 BASE = Path(__file__).parent
 TRAINING_JSON = BASE / "data" / "routes_training.json"
+# 1 route per regel (build_training_routes); random-access zonder de hele array te parsen
+TRAINING_JSONL = BASE / "data" / "routes_training.jsonl"
+# Compacte, memory-mapped versie van dezelfde routes (zie route_store.py); heeft voorrang op de JSON
+TRAINING_STORE = Path(os.environ.get("TRAINING_STORE", STORE_DIR))
+
+# Engine: "local" (route_solver, standaard) of "llm" (gpt-4o-mini). Per request te overschrijven met "engine".
+DEFAULT_ENGINE = os.environ.get("ROUTE_ENGINE", "local")
+ENGINES = ("local", "llm")
+
+# Max aantal dagen dat optimize_routes tegelijk uitrekent (LLM-latency overlapt)
+BATCH_MAX_WORKERS = int(os.environ.get("BATCH_MAX_WORKERS", "6"))
+# Max aantal dagen per batch; daarboven weigeren de endpoints de batch (HTTP 413)
+BATCH_MAX_REQUESTS = int(os.environ.get("BATCH_MAX_REQUESTS", "31"))
 
 # GLOBALE CACHE: Deze variabele voorkomt dat de grote JSON bij elke aanroep van de functie opnieuw wordt ingeladen.
 _TRAINING_CACHE = None 
+# Inverted index (adres -> routes, weekdag -> routes), 1x gebouwd bij het laden
+_EXAMPLE_INDEX = None
 # De client initialisatie is al correct verwijderd (Lazy Load)
 
 # -------------------------------------------------
 # 1. Training-routes laden (LAZY LOAD FIX)
 # -------------------------------------------------
-def load_training_routes(path: Path, max_routes: int = 50):
+def load_training_routes(path: Path, max_routes: int = None):
     global _TRAINING_CACHE 
     
     # Controleer of de data al in het geheugen zit
@@ -25,34 +52,116 @@ def load_training_routes(path: Path, max_routes: int = 50):
         return _TRAINING_CACHE 
 
     # Laad de data vanaf disk (gebeurt maar 1 keer per worker, EN ALLEEN na het eerste API-verzoek)
-    print(f"Laden van grote JSON: {path}...")
-    with path.open("r", encoding="utf-8") as f:
-        routes = json.load(f)
+    if path == TRAINING_JSON and RouteStore.exists(TRAINING_STORE):
+        # Memory-mapped: geen JSON-parse, pages worden gedeeld tussen geforkte workers
+        print(f"Laden van route-store (mmap): {TRAINING_STORE}...")
+        routes = RouteStore(TRAINING_STORE)
+    elif path == TRAINING_JSON and TRAINING_JSONL.exists():
+        # Alleen regel-offsets; routes worden pas bij gebruik geparsed
+        print(f"Laden van JSON Lines (random access): {TRAINING_JSONL}...")
+        routes = JsonlRoutes(TRAINING_JSONL)
+    else:
+        print(f"Laden van grote JSON: {path}...")
+        with path.open("r", encoding="utf-8") as f:
+            routes = json.load(f)
     
-    # Knip de routes af en sla op in de cache
-    if len(routes) > max_routes:
-        routes = random.sample(routes, max_routes)
+    # Optioneel afknippen; standaard houden we alle routes zodat de index alles kan doorzoeken
+    if max_routes is not None and len(routes) > max_routes:
+        routes = [routes[i] for i in sorted(random.sample(range(len(routes)), max_routes))]
         
     _TRAINING_CACHE = routes # Opslaan in de cache
     return routes
 
+
+def route_addresses(route):
+    """Adressen van een trainingsroute in rijvolgorde."""
+    if "stops" in route:
+        return [s["address"] for s in route["stops"] if s.get("address")]
+    return list(route.get("address_sequence", []))
+
+
+def build_example_index(training_routes):
+    """
+    Inverted index over de trainingsroutes:
+      by_address: adres  -> set met route-posities
+      by_weekday: 0..6   -> lijst met route-posities
+    """
+    by_address = defaultdict(set)
+    by_weekday = defaultdict(list)
+    dates = []
+    if isinstance(training_routes, RouteStore):
+        # Direct uit de arrays, zonder route-dicts te bouwen
+        by_address.update(training_routes.address_index())
+        dates = [training_routes.date_of(i) for i in range(len(training_routes))]
+    else:
+        for i, r in enumerate(training_routes):
+            for addr in route_addresses(r):
+                by_address[addr].add(i)
+            dates.append(r.get("date", ""))
+    for i, date in enumerate(dates):
+        try:
+            by_weekday[get_weekday(date)].append(i)
+        except Exception:
+            pass
+    return {
+        "routes": training_routes,
+        "by_address": dict(by_address),
+        "by_weekday": dict(by_weekday),
+        "dates": dates,
+    }
+
+
+def get_example_index(path: Path = TRAINING_JSON):
+    global _EXAMPLE_INDEX
+    if _EXAMPLE_INDEX is None:
+        with span("training_load"):
+            routes = load_training_routes(path)
+        with span("example_index"):
+            _EXAMPLE_INDEX = build_example_index(routes)
+    return _EXAMPLE_INDEX
+
+
+def select_examples(index, new_request, k: int = 3):
+    """
+    Top-k historische routes: meeste overlap in stops met de aanvraag, bij gelijke overlap
+    eerst dezelfde weekdag, daarna de meest recente datum. Routes zonder overlap vullen
+    alleen aan als ze op dezelfde weekdag vallen.
+    """
+    routes, dates = index["routes"], index["dates"]
+    try:
+        weekday = get_weekday(new_request["date"])
+    except Exception:
+        weekday = None
+    same_day = set(index["by_weekday"].get(weekday, ()))
+
+    overlap = Counter()
+    for addr in {s["address"] for s in new_request.get("stops", [])}:
+        for i in index["by_address"].get(addr, ()):
+            overlap[i] += 1
+
+    candidates = set(overlap) | same_day
+    ranked = sorted(
+        candidates,
+        key=lambda i: (overlap[i], i in same_day, dates[i]),
+        reverse=True,
+    )
+    return [routes[i] for i in ranked[:k]]
+
 # -------------------------------------------------
 # Utility Functies (Onveranderd)
 # -------------------------------------------------
-def validate_and_fix(new_request, llm_result):
+def check_llm_result(new_request, llm_result):
     """
-    new_request: originele input van de app
-    llm_result: JSON dat LLM teruggeeft
+    None als de LLM-verdeling bruikbaar is, anders de reden waarom validate_and_fix
+    terugvalt op fallback(): no_bus_routes, duplicates, missing_stops of over_capacity.
     """
-
     required_stops = [s["address"] for s in new_request["stops"]]
-    buses = new_request.get("buses", [])
     max_stops = new_request.get("max_stops_per_bus", 18)
 
-    result = llm_result.get("bus_routes", {})
+    result = llm_result.get("bus_routes", {}) if isinstance(llm_result, dict) else None
 
     if not isinstance(result, dict):
-        return fallback(new_request)
+        return "no_bus_routes"
 
     planned = []
     for bus, arr in result.items():
@@ -60,30 +169,77 @@ def validate_and_fix(new_request, llm_result):
             planned.extend(arr)
 
     if len(planned) != len(set(planned)):
-        return fallback(new_request)
+        return "duplicates"
 
     if set(planned) != set(required_stops):
-        return fallback(new_request)
+        return "missing_stops"
 
     for bus, arr in result.items():
         if len(arr) > max_stops:
-            return fallback(new_request)
+            return "over_capacity"
+
+    return None
+
+
+def validate_and_fix(new_request, llm_result):
+    """
+    new_request: originele input van de app
+    llm_result: JSON dat LLM teruggeeft
+    """
+    return _validate_and_count(new_request, llm_result)[0]
+
+
+# Redenen uit check_llm_result: de verdeling is vervangen door fallback(). Zo'n resultaat (ook na
+# een API- of parse-fout, die geen geldige verdeling opleveren) wordt niet gecachet.
+DEGRADED_REASONS = ("no_bus_routes", "duplicates", "missing_stops", "over_capacity")
+
+
+def _validate_and_count(new_request, llm_result):
+    """validate_and_fix, maar geeft (resultaat, reden) terug."""
+    with span("validation"):
+        result, reason = _validate_and_fix(new_request, llm_result)
+
+    # Tellers voor /metrics: fallback-rate per engine en per reden
+    try:
+        engine = _resolve_engine(new_request)
+    except ValueError:
+        engine = "unknown"
+    VALIDATIONS.inc(engine=engine)
+    if reason is not None:
+        FALLBACKS.inc(engine=engine, reason=reason)
+    return result, reason
+
+
+def _validated(new_request, raw, cacheable=True):
+    """(resultaat, cachebaar): niet cachebaar na een fallback, zodat 1 storing niet een uur blijft hangen."""
+    result, reason = _validate_and_count(new_request, raw)
+    return result, cacheable and reason not in DEGRADED_REASONS
+
+
+def _validate_and_fix(new_request, llm_result):
+    """(resultaat, reden) met reden None als de verdeling ongewijzigd door kan."""
+    reason = check_llm_result(new_request, llm_result)
+    if reason is not None:
+        return fallback(new_request), reason
+
+    required_stops = [s["address"] for s in new_request["stops"]]
+    result = llm_result["bus_routes"]
 
     weekday = get_weekday(new_request["date"])
     if weekday == 0:
-        return force_single_route(new_request)
+        return force_single_route(new_request), "single_route_monday"
 
     if len(required_stops) < 16:
-        return force_single_route(new_request)
+        return force_single_route(new_request), "single_route_few_stops"
 
     filled_buses = {bus: arr for bus, arr in result.items() if len(arr) > 0}
     if len(filled_buses) == 2:
         arr1 = list(filled_buses.values())[0]
         arr2 = list(filled_buses.values())[1]
         if len(arr1) < 8 or len(arr2) < 8:
-            return force_single_route(new_request)
+            return force_single_route(new_request), "single_route_min_per_bus"
 
-    return llm_result
+    return llm_result, None
 
 
 def fallback(new_request):
@@ -108,27 +264,22 @@ def force_single_route(new_request):
     }
 
 
-def get_weekday(date_str):
-    y, m, d = map(int, date_str.split("-"))
-    return datetime.date(y, m, d).weekday()
-
-
 # -------------------------------------------------
-# 2. Voorbeelden uit trainingsdata bouwen (Onveranderd)
+# 2. Voorbeelden uit trainingsdata bouwen
 # -------------------------------------------------
 def build_examples(training_routes, num_examples: int = 3):
     """
-    training_routes: lijst dicts met o.a.
+    training_routes: lijst dicts (bij voorkeur al gekozen met select_examples) met o.a.
       - date
       - bus_name
-      - address_sequence (lijst met adressen in volgorde)
+      - stops (lijst met {"address": ...} in volgorde)
     """
     examples = []
     for r in training_routes[:num_examples]:
         examples.append({
             "date": r.get("date", "onbekend"),
             "bus_name": r.get("bus_name", "onbekend"),
-            "historical_stops": r.get("address_sequence", []),
+            "historical_stops": route_addresses(r),
         })
     return examples
 
@@ -224,47 +375,136 @@ def build_prompt(examples, new_request):
 
 
 # -------------------------------------------------
-# 4. LLM-call (GECORRIGEERDE FUNCTIE)
+# 3b. Compacte prompt (adres-ID's i.p.v. volledige adressen)
 # -------------------------------------------------
-def call_llm(prompt: str) -> dict:
-    print("=== PROMPT AAN LLM ===")
-    print(prompt)
-    print("=== EINDE PROMPT ===")
-
-    # 1. API Key Check & Lazy Initialisatie
-    api_key = os.environ.get("OPENAI_API_KEY")
-    if not api_key:
-        print("ERROR: OPENAI_API_KEY is niet ingesteld in de omgeving.")
-        raise ValueError("OpenAI API key ontbreekt. Check Railway Variables.")
-    
-    client = OpenAI(api_key=api_key)
+# "compact": korte regels + legenda met nummers, het model antwoordt met nummers.
+# "full": de oorspronkelijke build_prompt.
+PROMPT_ENCODING = os.environ.get("PROMPT_ENCODING", "compact")
+
+WEEKDAYS_SHORT_NL = ["ma", "di", "wo", "do", "vr", "za", "zo"]
+
+COMPACT_RULES = (
+    "Verdeel bezorgadressen (nummers) over bussen. Regels:\n"
+    "- Elk nummer precies 1x; niets weglaten, verdubbelen of verzinnen.\n"
+    "- Max {max} stops per bus; bij 2 bussen min. 8 per bus als het totaal dat toelaat.\n"
+    "- Zo min mogelijk bussen; meer dan {max} stops => 2 bussen. Cluster geografisch.\n"
+    "- ma: 1 bus (alles). di/wo: 2 bussen Amsterdam. "
+    "do: Amsterdam | Randstad (Rotterdam, Den Haag, Leiden, Schiedam e.a.). "
+    "vr: Amsterdam | Utrecht e.o.\n"
+    "- Adressen buiten Amsterdam nooit in dezelfde bus als Amsterdam.\n"
+    'Antwoord alleen JSON: {{"bus_routes":{{"<bus>":[nummer,...]}}}}\n'
+)
 
-    # 2. Moderne OpenAI Call
+
+def _short_address(address):
+    # ", NL" aan het eind zegt het model niets en kost tokens
+    return re.sub(r",\s*NL$", "", address)
+
+
+def _weekday_short(date_str):
     try:
-        completion = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7,
-            response_format={"type": "json_object"}
-        )
-        raw = completion.choices[0].message.content
+        return WEEKDAYS_SHORT_NL[get_weekday(date_str)]
+    except Exception:
+        return "?"
 
-    except Exception as e:
-        print(f"LLM API Call Error: {e}")
-        return {
-            "bus_routes": {
-                "Ocho": ["API Error Fallback"],
-                "Rebel": []
-            }
+
+def build_prompt_compact(examples, new_request):
+    """
+    Geeft (prompt, legend) terug; legend = {nummer: adres}. Voorbeelden tonen alleen de
+    nummers van adressen uit deze aanvraag (in historische volgorde) + het aantal overige stops.
+    """
+    legend = {}
+    ids = {}
+    for s in new_request["stops"]:
+        addr = s["address"]
+        if addr not in ids:
+            ids[addr] = len(ids) + 1
+            legend[ids[addr]] = addr
+
+    parts = [COMPACT_RULES.format(max=new_request["max_stops_per_bus"])]
+
+    if examples:
+        parts.append("Historie (nummers uit deze aanvraag, +n = overige stops):")
+        for ex in examples:
+            known = [str(ids[a]) for a in dict.fromkeys(ex["historical_stops"]) if a in ids]
+            other = len(set(ex["historical_stops"])) - len(known)
+            line = f"{ex['date']} {_weekday_short(ex['date'])} {ex['bus_name']}: " + " ".join(known)
+            if other:
+                line += f" +{other}"
+            parts.append(line)
+        parts.append("")
+
+    parts.append(f"Datum: {new_request['date']} ({_weekday_short(new_request['date'])})")
+    parts.append("Bussen: " + ", ".join(new_request["buses"]))
+    parts.append("Max stops per bus: " + str(new_request["max_stops_per_bus"]))
+    parts.append("Adressen:")
+    colli = {s["address"]: s.get("colli") for s in new_request["stops"]}
+    for i, addr in legend.items():
+        line = f"{i} {_short_address(addr)}"
+        if colli.get(addr) is not None:
+            line += f" (colli {colli[addr]})"
+        parts.append(line)
+
+    return "\n".join(parts), legend
+
+
+def decode_ids(llm_result, legend):
+    """
+    Zet nummers in bus_routes terug naar adressen. Onbekende nummers blijven als tekst
+    staan zodat check_llm_result ze als missing_stops afkeurt.
+    """
+    if not isinstance(llm_result, dict) or not isinstance(llm_result.get("bus_routes"), dict):
+        return llm_result
+    decoded = {}
+    for bus, arr in llm_result["bus_routes"].items():
+        if not isinstance(arr, list):
+            decoded[bus] = arr
+            continue
+        out = []
+        for x in arr:
+            try:
+                out.append(legend.get(int(str(x).strip().lstrip("#")), f"onbekend nummer: {x}"))
+            except ValueError:
+                out.append(x)  # model gaf toch een adres terug
+        decoded[bus] = out
+    return dict(llm_result, bus_routes=decoded)
+
+
+# -------------------------------------------------
+# 4. LLM-call (GECORRIGEERDE FUNCTIE)
+# -------------------------------------------------
+LLM_PARAMS = {
+    "temperature": 0.7,
+    "response_format": {"type": "json_object"},
+}
+
+
+def _llm_messages(prompt: str):
+    # Alleen bij LOG_PAYLOADS=1, gesampled (zie metrics.py)
+    log_payload("PROMPT AAN LLM", prompt)
+
+    # Ontbrekende API key: get_llm_client gooit LLMConfigError (-> lokale solver, zie _llm_fallback)
+    return [
+        {"role": "user", "content": prompt}
+    ]
+
+
+def _api_error_fallback(e):
+    print(f"LLM API Call Error: {e}")
+    FALLBACKS.inc(engine="llm", reason="api_error")
+    return {
+        "bus_routes": {
+            "Ocho": ["API Error Fallback"],
+            "Rebel": []
         }
+    }
 
-    # 3. JSON Parising
+
+def parse_llm_output(raw: str) -> dict:
     try:
         return json.loads(raw)
     except Exception:
-        m = re.search(r"\{[\s\S]*\}", raw)
+        m = re.search(r"\{[\s\S]*\}", raw or "")
         if m:
             json_str = m.group(0)
             try:
@@ -274,6 +514,7 @@ def call_llm(prompt: str) -> dict:
 
         print("Kon model-output niet parsen. Ruwe output:")
         print(raw)
+        FALLBACKS.inc(engine="llm", reason="parse_error")
         return {
             "bus_routes": {
                 "Ocho": ["Parsing Error Fallback"],
@@ -282,20 +523,452 @@ def call_llm(prompt: str) -> dict:
         }
 
 
+def _complete(messages, legend=None) -> dict:
+    # Moderne OpenAI Call (timeouts, retries en circuit breaker in de manager)
+    try:
+        with span("llm_call"):
+            completion = get_llm_client().chat_completion(messages=messages, **LLM_PARAMS)
+        raw = completion.choices[0].message.content
+    except (LLMUnavailableError, LLMConfigError):
+        raise
+    except Exception as e:
+        return _api_error_fallback(e)
+    with span("json_parse"):
+        parsed = parse_llm_output(raw)
+        return decode_ids(parsed, legend) if legend else parsed
+
+
+async def _complete_async(messages, legend=None) -> dict:
+    try:
+        with span("llm_call"):
+            completion = await get_llm_client().chat_completion_async(messages=messages, **LLM_PARAMS)
+        raw = completion.choices[0].message.content
+    except (LLMUnavailableError, LLMConfigError):
+        raise
+    except Exception as e:
+        return _api_error_fallback(e)
+    with span("json_parse"):
+        parsed = parse_llm_output(raw)
+        return decode_ids(parsed, legend) if legend else parsed
+
+
+def call_llm(prompt: str, legend: dict = None) -> dict:
+    # 1 connection pool per worker (zie llm_client.py); met legend worden nummers terugvertaald
+    return _complete(_llm_messages(prompt), legend)
+
+
+async def call_llm_async(prompt: str, legend: dict = None) -> dict:
+    """Zelfde als call_llm, maar blokkeert de event loop niet tijdens de API-call."""
+    return await _complete_async(_llm_messages(prompt), legend)
+
+
+# -------------------------------------------------
+# 4b. Speculatieve LLM-kandidaten (eerste geldige wint)
+# -------------------------------------------------
+# N kandidaten tegelijk; de eerste die check_llm_result doorstaat wint, de rest wordt geannuleerd.
+# LLM_CANDIDATES=1 is het oude gedrag (1 call).
+LLM_CANDIDATES = int(os.environ.get("LLM_CANDIDATES", "1"))
+# Deadline nooit korter dan 1 call met al zijn retries (llm_client.LLM_WORST_CASE_S): anders annuleert
+# de deadline gewone calls, en daarmee ook de half-open proefaanroep van de circuit breaker.
+# Sneller opgeven = LLM_READ_TIMEOUT of LLM_MAX_RETRIES verlagen.
+LLM_DEADLINE_S = float(os.environ.get("LLM_DEADLINE", LLM_WORST_CASE_S))
+if LLM_DEADLINE_S < LLM_WORST_CASE_S:
+    print(f"LLM_DEADLINE={LLM_DEADLINE_S:g}s is korter dan 1 call met retries ({LLM_WORST_CASE_S:g}s); "
+          f"deadline opgehoogd. Verlaag LLM_READ_TIMEOUT of LLM_MAX_RETRIES voor een kortere deadline.")
+    LLM_DEADLINE_S = LLM_WORST_CASE_S
+
+_SPEC_LOCK = threading.Lock()
+SPECULATIVE_STATS = Counter()
+
+
+def _spec_count(**kwargs):
+    with _SPEC_LOCK:
+        SPECULATIVE_STATS.update(kwargs)
+
+
+def speculative_stats() -> dict:
+    """Tellers om N te tunen: kandidaten verstuurd/gebruikt, winnaars, fallbacks, deadlines."""
+    with _SPEC_LOCK:
+        stats = dict(SPECULATIVE_STATS)
+    stats.setdefault("requests", 0)
+    stats.setdefault("fallbacks", 0)
+    stats["candidates"] = LLM_CANDIDATES
+    stats["deadline_s"] = LLM_DEADLINE_S
+    stats["fallback_rate"] = (stats["fallbacks"] / stats["requests"]) if stats["requests"] else 0.0
+    return stats
+
+
+def _spec_outcome(new_request, results, winner):
+    """Boekhouding na afloop; geeft de winnaar of (geen geldige kandidaat) de eerste uitkomst."""
+    _spec_count(requests=1, candidates_used=len(results))
+    if winner is not None:
+        _spec_count(winners=1)
+        return winner
+    _spec_count(fallbacks=1)
+    for r in results:
+        _spec_count(**{f"rejected_{check_llm_result(new_request, r)}": 1})
+    if not results:
+        raise LLMUnavailableError("Geen enkele LLM-kandidaat binnen de deadline")
+    return results[0]
+
+
+def call_llm_speculative(prompt: str, new_request: dict, n: int = None, deadline: float = None,
+                         legend: dict = None) -> dict:
+    """
+    Stuurt n kandidaten tegelijk en geeft de eerste geldige terug (check_llm_result).
+    Nog niet gestarte kandidaten worden geannuleerd; lopende HTTP-calls lopen op de
+    achtergrond uit maar hun antwoord wordt genegeerd.
+    """
+    n = max(1, n or LLM_CANDIDATES)
+    deadline = deadline or LLM_DEADLINE_S
+    messages = _llm_messages(prompt)
+    _spec_count(candidates_sent=n)
+
+    results, winner = [], None
+    errors = []
+    ex = ThreadPoolExecutor(max_workers=n, thread_name_prefix="llm-candidate")
+    # Eigen kopie van de context per kandidaat: span("llm_call") komt zo in collect_spans() van de request
+    futures = [ex.submit(contextvars.copy_context().run, _complete, messages, legend) for _ in range(n)]
+    try:
+        for fut in as_completed(futures, timeout=deadline):
+            try:
+                res = fut.result()
+            except LLMUnavailableError as e:
+                errors.append(e)
+                continue
+            results.append(res)
+            if check_llm_result(new_request, res) is None:
+                winner = res
+                break
+    except FuturesTimeout:
+        _spec_count(deadline_expired=1)
+    finally:
+        ex.shutdown(wait=False, cancel_futures=True)
+
+    if not results and errors and len(errors) == n:
+        _spec_count(requests=1, fallbacks=1)
+        raise errors[0]
+    return _spec_outcome(new_request, results, winner)
+
+
+async def call_llm_speculative_async(prompt: str, new_request: dict, n: int = None, deadline: float = None,
+                                     legend: dict = None) -> dict:
+    """Async variant: verliezende kandidaten worden echt geannuleerd (ook de HTTP-call)."""
+    n = max(1, n or LLM_CANDIDATES)
+    deadline = deadline or LLM_DEADLINE_S
+    messages = _llm_messages(prompt)
+    _spec_count(candidates_sent=n)
+
+    loop = asyncio.get_running_loop()
+    end = loop.time() + deadline
+    pending = {asyncio.ensure_future(_complete_async(messages, legend)) for _ in range(n)}
+    results, winner = [], None
+    errors = []
+    try:
+        while pending and winner is None:
+            remaining = end - loop.time()
+            if remaining <= 0:
+                _spec_count(deadline_expired=1)
+                break
+            done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                try:
+                    res = task.result()
+                except LLMUnavailableError as e:
+                    errors.append(e)
+                    continue
+                results.append(res)
+                if winner is None and check_llm_result(new_request, res) is None:
+                    winner = res
+    finally:
+        for task in pending:
+            task.cancel()
+
+    if not results and errors and len(errors) == n:
+        _spec_count(requests=1, fallbacks=1)
+        raise errors[0]
+    return _spec_outcome(new_request, results, winner)
+
+
 # -------------------------------------------------
 # 5. Publieke functie voor server/app 
 # -------------------------------------------------
-def optimize_route(new_request: dict) -> dict:
-    if not TRAINING_JSON.exists():
-        raise FileNotFoundError(f"Training JSON ontbreekt: {TRAINING_JSON}")
-
-    # load_training_routes zal nu de cache/lazily data inladen
-    training_routes = load_training_routes(TRAINING_JSON, max_routes=50) 
-    examples = build_examples(training_routes, num_examples=3)
-    prompt = build_prompt(examples, new_request)
-    raw = call_llm(prompt)
-    clean = validate_and_fix(new_request, raw)
-    return clean
+def _resolve_engine(new_request: dict, engine: str = None) -> str:
+    engine = engine or new_request.get("engine") or DEFAULT_ENGINE
+    if engine not in ENGINES:
+        raise ValueError(f"Onbekende engine: {engine} (kies uit {', '.join(ENGINES)})")
+    return engine
+
+
+def validate_request(new_request) -> None:
+    """
+    Controle aan de rand (server/jobs): ValueError met een leesbare melding als de aanvraag
+    geen object is, of als "date" (YYYY-MM-DD), "stops" (lijst met {"address": ...}) of de
+    optionele "start_time" (HH:MM) niet klopt.
+    """
+    if not isinstance(new_request, dict):
+        raise ValueError("Verwacht een JSON-object met de aanvraag")
+    date = new_request.get("date")
+    if not isinstance(date, str):
+        raise ValueError('"date" ontbreekt (verwacht "YYYY-MM-DD")')
+    try:
+        get_weekday(date)
+    except ValueError:
+        raise ValueError(f'Ongeldige "date": {date!r} (verwacht "YYYY-MM-DD")') from None
+    stops = new_request.get("stops")
+    if not isinstance(stops, list):
+        raise ValueError('"stops" ontbreekt (verwacht een lijst met {"address": ...})')
+    for i, stop in enumerate(stops):
+        if not isinstance(stop, dict) or not isinstance(stop.get("address"), str) or not stop["address"]:
+            raise ValueError(f'stops[{i}]: verwacht een object met een "address"')
+    if new_request.get("start_time") is not None:
+        # Anders faalt pas de sequencing-stap, nadat de verdeling (LLM-call) al gedaan is
+        try:
+            parse_hhmm(new_request["start_time"])
+        except ValueError:
+            raise ValueError(f'Ongeldige "start_time": {new_request["start_time"]!r} (verwacht "HH:MM")') from None
+
+
+def cached_route(new_request: dict, engine: str = None):
+    """
+    Aanvraag valideren (validate_request, onbekende engine) en het resultaat uit de cache
+    teruggeven zonder te rekenen, of None. Gooit ValueError bij een ongeldige aanvraag.
+    """
+    validate_request(new_request)
+    engine = _resolve_engine(new_request, engine)
+    return get_result_cache().get(canonical_key(new_request, engine))
+
+
+def optimize_route(new_request: dict, engine: str = None, use_cache: bool = True) -> dict:
+    engine = _resolve_engine(new_request, engine)
+    if not use_cache:
+        return _optimize_and_sequence(new_request, engine)[0]
+
+    # Herhaalde aanvragen (zelfde dag, stops, bussen) komen uit de cache
+    cache = get_result_cache()
+    key = canonical_key(new_request, engine)
+    hit = cache.get(key)
+    if hit is not None:
+        return hit
+
+    def compute():
+        result, cacheable = _optimize_and_sequence(new_request, engine)
+        if cacheable:
+            cache.put(key, result)
+        return result
+
+    if not COALESCE_REQUESTS:
+        return compute()
+    # Identieke aanvraag loopt al (dubbele submit, 2 planners op dezelfde dag): op dat resultaat wachten
+    result, leader = get_single_flight().do(key, compute)
+    if not leader:
+        COALESCED.inc(engine=engine)
+    return result
+
+
+def _optimize_and_sequence(new_request: dict, engine: str):
+    # Verdeling over de bussen, daarna de volgorde per bus (+ km_per_bus); (resultaat, cachebaar)
+    result, cacheable = _optimize_route_uncached(new_request, engine)
+    with span("sequencing"):
+        return sequence_result(result, start_time=new_request.get("start_time")), cacheable
+
+
+async def optimize_route_async(new_request: dict, engine: str = None, use_cache: bool = True) -> dict:
+    """Async variant voor server_async: alleen de LLM-call wordt ge-await, de rest is snel en lokaal."""
+    engine = _resolve_engine(new_request, engine)
+    if not use_cache:
+        return (await _optimize_and_sequence_async(new_request, engine))[0]
+
+    cache = get_result_cache()
+    key = canonical_key(new_request, engine)
+    hit = cache.get(key)
+    if hit is not None:
+        return hit
+
+    async def compute():
+        result, cacheable = await _optimize_and_sequence_async(new_request, engine)
+        if cacheable:
+            cache.put(key, result)
+        return result
+
+    if not COALESCE_REQUESTS:
+        return await compute()
+    result, leader = await get_single_flight().do_async(key, compute)
+    if not leader:
+        COALESCED.inc(engine=engine)
+    return result
+
+
+async def _optimize_and_sequence_async(new_request: dict, engine: str):
+    """
+    (resultaat, cachebaar), zoals _optimize_and_sequence. Al het CPU-werk (lokale solver, prompt
+    incl. de eerste lazy load van de trainingsdata, fallback, sequencing) draait via to_thread,
+    zodat de event loop andere requests en /health blijft beantwoorden; alleen de LLM-call wordt
+    hier ge-await. to_thread neemt de context mee, dus de spans tellen gewoon mee.
+    """
+    if engine == "local":
+        result, cacheable = await asyncio.to_thread(_optimize_route_uncached, new_request, engine)
+    else:
+        prompt, legend = await asyncio.to_thread(_llm_prompt, new_request)
+        try:
+            if LLM_CANDIDATES > 1:
+                raw = await call_llm_speculative_async(prompt, new_request, legend=legend)
+            else:
+                raw = await call_llm_async(prompt, legend)
+        except (LLMUnavailableError, LLMConfigError) as e:
+            raw = await asyncio.to_thread(_llm_fallback, new_request, e)
+            result, cacheable = _validated(new_request, raw, cacheable=False)
+        else:
+            result, cacheable = _validated(new_request, raw)
+    with span("sequencing"):
+        result = await asyncio.to_thread(sequence_result, result, start_time=new_request.get("start_time"))
+    return result, cacheable
+
+
+def _llm_prompt(new_request: dict):
+    """(prompt, legend); legend is None bij PROMPT_ENCODING=full (antwoord met volledige adressen)."""
+    if not (TRAINING_JSON.exists() or TRAINING_JSONL.exists() or RouteStore.exists(TRAINING_STORE)):
+        raise FileNotFoundError(f"Trainingsdata ontbreekt: {TRAINING_JSON}")
+
+    # get_example_index laadt de trainingsdata (lazy) en bouwt 1x de index
+    index = get_example_index(TRAINING_JSON)
+    with span("example_selection"):
+        examples = build_examples(select_examples(index, new_request, k=3), num_examples=3)
+    with span("prompt_build"):
+        if PROMPT_ENCODING == "compact":
+            return build_prompt_compact(examples, new_request)
+        return build_prompt(examples, new_request), None
+
+
+def _optimize_route_uncached(new_request: dict, engine: str):
+    """(verdeling, cachebaar); niet cachebaar na een fallback (zie _validated)."""
+    if engine == "local":
+        # Lokale solver: geen trainingsdata of API-call nodig, antwoord in milliseconden
+        with span("local_solve"):
+            raw = solve_local(new_request)
+        return _validated(new_request, raw)
+
+    prompt, legend = _llm_prompt(new_request)
+    try:
+        if LLM_CANDIDATES > 1:
+            raw = call_llm_speculative(prompt, new_request, legend=legend)
+        else:
+            raw = call_llm(prompt, legend)
+    except (LLMUnavailableError, LLMConfigError) as e:
+        # Lokale vervanger: prima als antwoord, maar niet onder de "llm"-key cachen
+        return _validated(new_request, _llm_fallback(new_request, e), cacheable=False)
+    return _validated(new_request, raw)
+
+
+def _llm_fallback(new_request: dict, e: Exception) -> dict:
+    """
+    Lokale solver i.p.v. de LLM: upstream blijft falen / breaker open (llm_unavailable), of de
+    API key ontbreekt of wordt geweigerd (llm_not_configured). Nooit de 1-bus-fallback: die ziet
+    eruit als een echt plan terwijl de verdeling niet gemaakt is.
+    """
+    if isinstance(e, LLMConfigError):
+        print(f"ERROR: LLM niet geconfigureerd, lokale solver gebruikt: {e}")
+        FALLBACKS.inc(engine="llm", reason="llm_not_configured")
+    else:
+        print(f"LLM niet beschikbaar, lokale solver gebruikt: {e}")
+        FALLBACKS.inc(engine="llm", reason="llm_unavailable")
+    with span("local_solve"):
+        return solve_local(new_request)
+
+
+class BatchTooLarge(ValueError):
+    """Meer dagen in 1 batch dan BATCH_MAX_REQUESTS."""
+
+
+def check_batch_size(requests: list, max_requests: int = None):
+    """Gooit BatchTooLarge als de batch te groot is; vóór er iets gerekend wordt aanroepen."""
+    max_requests = max_requests or BATCH_MAX_REQUESTS
+    if len(requests) > max_requests:
+        raise BatchTooLarge(f"Te veel dagen in 1 batch: {len(requests)} (max {max_requests})")
+
+
+def _batch_item(new_request: dict, fn) -> dict:
+    t = time.perf_counter()
+    try:
+        validate_request(new_request)
+        result = fn(new_request)
+        item = {"status": "ok", "result": result}
+    except Exception as e:
+        item = {"status": "error", "error": str(e)}
+    item["date"] = new_request.get("date") if isinstance(new_request, dict) else None
+    item["elapsed_ms"] = round((time.perf_counter() - t) * 1000, 1)
+    return item
+
+
+def _warm_for_batch(requests: list):
+    # Trainingsdata + index 1x laden vóór de threads starten, zodat de batch ze deelt.
+    # Fouten hier negeren: die komen per dag terug in het resultaat.
+    try:
+        if any(isinstance(r, dict) and _resolve_engine(r) == "llm" for r in requests):
+            get_example_index(TRAINING_JSON)
+    except Exception:
+        pass
+
+
+def optimize_routes(requests: list, max_workers: int = None) -> list:
+    """
+    Meerdere dagen in 1 aanroep (bv. de hele week). Dagen lopen parallel in een begrensde
+    thread pool; per dag: {"date", "status": "ok"|"error", "result"|"error", "elapsed_ms"},
+    in dezelfde volgorde als de aanvragen. Een fout in 1 dag laat de rest gewoon doorgaan.
+    """
+    if not requests:
+        return []
+    _warm_for_batch(requests)
+    workers = max(1, min(max_workers or BATCH_MAX_WORKERS, len(requests)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="optimize-batch") as ex:
+        return list(ex.map(lambda r: _batch_item(r, optimize_route), requests))
+
+
+async def optimize_routes_async(requests: list, max_concurrency: int = None, shared_limiter=None) -> list:
+    """
+    Async variant van optimize_routes voor server_async (zelfde resultaatvorm). shared_limiter:
+    de semafoor van de server (MAX_CONCURRENT_OPTIMIZATIONS); die wordt per dag genomen, zodat
+    een batch net zoveel plekken bezet als er dagen tegelijk rekenen.
+    """
+    if not requests:
+        return []
+    _warm_for_batch(requests)
+    limiter = asyncio.Semaphore(max(1, max_concurrency or BATCH_MAX_WORKERS))
+
+    async def optimize(new_request):
+        if shared_limiter is None:
+            return await optimize_route_async(new_request)
+        async with shared_limiter:
+            return await optimize_route_async(new_request)
+
+    async def one(new_request):
+        async with limiter:
+            t = time.perf_counter()
+            try:
+                validate_request(new_request)
+                item = {"status": "ok", "result": await optimize(new_request)}
+            except Exception as e:
+                item = {"status": "error", "error": str(e)}
+            item["date"] = new_request.get("date") if isinstance(new_request, dict) else None
+            item["elapsed_ms"] = round((time.perf_counter() - t) * 1000, 1)
+            return item
+
+    return list(await asyncio.gather(*(one(r) for r in requests)))
+
+
+def service_stats() -> dict:
+    """Tellers voor /stats: resultaat-cache, single-flight, jobs, LLM-client en speculatieve kandidaten."""
+    try:
+        llm = get_llm_client().stats()
+    except ValueError:
+        llm = None  # geen API key: LLM nooit gebruikt
+    return {
+        "cache": get_result_cache().stats(),
+        "single_flight": get_single_flight().stats(),
+        "jobs": job_stats(),
+        "llm": llm,
+        "speculative": speculative_stats(),
+    }
 
 
 # -------------------------------------------------
@@ -0,0 +1,271 @@
+# route_cache.py
+# Memoizing resultaat-cache voor optimize_route: LRU + TTL in het geheugen, optioneel SQLite op schijf
+# zodat entries een worker-herstart overleven. Plus single-flight: identieke aanvragen die tegelijk
+# binnenkomen (dubbele submit, meerdere planners op dezelfde dag) wachten op 1 berekening.
+
+import os
+import copy
+import json
+import time
+import asyncio
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from route_solver import get_weekday
+
+# Configuratie via environment (Railway Variables)
+CACHE_SIZE = int(os.environ.get("ROUTE_CACHE_SIZE", "256"))
+CACHE_TTL_S = float(os.environ.get("ROUTE_CACHE_TTL", "3600"))
+CACHE_PATH = os.environ.get("ROUTE_CACHE_PATH") or None  # bv. data/route_cache.sqlite
+# 1 = identieke lopende aanvragen samenvoegen (single-flight), 0 = elke aanvraag rekent zelf
+COALESCE_REQUESTS = os.environ.get("COALESCE_REQUESTS", "1") == "1"
+
+# GLOBALE CACHE: 1 instantie per worker
+_RESULT_CACHE = None
+_SINGLE_FLIGHT = None
+_INIT_LOCK = threading.Lock()
+
+
+def canonical_key(new_request, engine):
+    """
+    Canonieke vorm van een aanvraag: weekdag, gesorteerde stop-adressen, bussen,
+    max_stops_per_bus, starttijd (voor de ETA's) en engine. Volgorde van stops of extra velden maken niet uit.
+    """
+    canon = {
+        "weekday": get_weekday(new_request["date"]),
+        "stops": sorted(s["address"] for s in new_request.get("stops", [])),
+        "buses": list(new_request.get("buses") or []),
+        "max_stops_per_bus": new_request.get("max_stops_per_bus", 18),
+        "start_time": new_request.get("start_time"),
+        "engine": engine,
+    }
+    raw = json.dumps(canon, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class _SqliteBackend:
+    """Eenvoudige key/value-tabel met vervaltijd; 1 connectie per thread."""
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._local = threading.local()
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        with self._conn() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS route_cache ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)"
+            )
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._conn().execute(
+            "SELECT value, expires FROM route_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def put(self, key, value, expires):
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO route_cache (key, value, expires) VALUES (?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), expires),
+            )
+
+    def delete(self, key):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM route_cache WHERE key = ?", (key,))
+
+    def clear(self):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM route_cache")
+
+
+class ResultCache:
+    """
+    Thread-safe LRU-cache met TTL en hit/miss-tellers.
+    Met path wordt elke entry ook in SQLite bewaard; een miss in het geheugen kijkt daar nog.
+    """
+
+    def __init__(self, maxsize: int = CACHE_SIZE, ttl: float = CACHE_TTL_S, path=None, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._data = OrderedDict()  # key -> (expires, value)
+        self._lock = threading.Lock()
+        self._disk = _SqliteBackend(path) if path else None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        now = self._clock()
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and item[0] > now:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return copy.deepcopy(item[1])
+            if item is not None:
+                del self._data[key]
+
+        if self._disk is not None:
+            # Op schijf staat een wall-clock vervaltijd (overleeft herstarts)
+            stored = self._disk.get(key)
+            if stored is not None:
+                value, expires_wall = stored
+                remaining = expires_wall - time.time()
+                if remaining > 0:
+                    with self._lock:
+                        self._store(key, value, now + remaining)
+                        self.hits += 1
+                    return copy.deepcopy(value)
+                self._disk.delete(key)
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, value):
+        value = copy.deepcopy(value)
+        with self._lock:
+            self._store(key, value, self._clock() + self.ttl)
+        if self._disk is not None:
+            self._disk.put(key, value, time.time() + self.ttl)
+
+    def _store(self, key, value, expires):
+        self._data[key] = (expires, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+        if self._disk is not None:
+            self._disk.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl_s": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits / total) if total else 0.0,
+                "disk": self._disk.path if self._disk is not None else None,
+            }
+
+
+def get_result_cache():
+    global _RESULT_CACHE
+    if _RESULT_CACHE is None:
+        with _INIT_LOCK:
+            if _RESULT_CACHE is None:
+                _RESULT_CACHE = ResultCache(CACHE_SIZE, CACHE_TTL_S, CACHE_PATH)
+    return _RESULT_CACHE
+
+
+# -------------------------------------------------
+# Single-flight
+# -------------------------------------------------
+class _Flight:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Per key hoogstens 1 lopende berekening. De eerste aanroeper (leader) rekent; wie met dezelfde
+    key binnenkomt terwijl die loopt (follower) wacht en krijgt een kopie van hetzelfde resultaat,
+    of dezelfde exceptie. Na afloop wordt de key vrijgegeven: hergebruik daarna loopt via de cache.
+    Threads (server.py, batch) via do(); de event loop (server_async) via do_async().
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}   # key -> _Flight (threads)
+        self._tasks = {}     # key -> asyncio.Task (event loop)
+        self.leaders = 0
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        """(resultaat, leader): leader is False als het resultaat van een andere aanroep komt."""
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return copy.deepcopy(flight.result), False
+
+        try:
+            flight.result = fn()
+            return flight.result, True
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    async def do_async(self, key, coro_fn):
+        """
+        Async variant: de berekening draait als losse task; alle aanroepers wachten via shield,
+        zodat een afgebroken client (ook de leader) de berekening voor de rest niet annuleert.
+        """
+        with self._lock:
+            task = self._tasks.get(key)
+            leader = task is None
+            if leader:
+                task = self._tasks[key] = asyncio.ensure_future(coro_fn())
+                task.add_done_callback(lambda t, key=key: self._tasks.get(key) is t and self._tasks.pop(key))
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+        result = await asyncio.shield(task)
+        return (result, True) if leader else (copy.deepcopy(result), False)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "in_flight": len(self._flights) + len(self._tasks),
+                "leaders": self.leaders,
+                "coalesced": self.coalesced,
+            }
+
+
+def get_single_flight():
+    global _SINGLE_FLIGHT
+    if _SINGLE_FLIGHT is None:
+        # Lock: twee gelijktijdige eerste aanvragen mogen niet elk een eigen SingleFlight krijgen
+        with _INIT_LOCK:
+            if _SINGLE_FLIGHT is None:
+                _SINGLE_FLIGHT = SingleFlight()
+    return _SINGLE_FLIGHT
@@ -0,0 +1,251 @@
+# route_jobs.py
+# Job-modus voor /optimize-route: POST /optimize-route/jobs zet de optimalisatie in een begrensde
+# achtergrond-pool en geeft meteen een job-id terug; GET /optimize-route/jobs/<id> geeft status,
+# timings en (als hij klaar is) het resultaat. Zo houdt een trage LLM-call geen HTTP-connectie
+# (en bij gunicorn -w 1 de enige worker) vast tot de --timeout.
+#
+# Configuratie via environment (Railway Variables):
+#   JOB_WORKERS        aantal optimalisaties dat tegelijk draait (per proces)
+#   JOB_MAX_PENDING    max. wachtende + lopende jobs; daarboven weigert submit (HTTP 429)
+#   JOB_RETENTION      seconden dat een afgeronde job (met resultaat) opvraagbaar blijft
+#   JOB_MAX_JOBS       max. bewaarde jobs in het geheugen; de oudste afgeronde gaan eerst
+#   JOB_STORE_PATH     optioneel SQLite-bestand; nodig bij WEB_CONCURRENCY > 1, zodat elke
+#                      worker de status van jobs uit een andere worker kan teruggeven
+#
+# Status: queued -> running -> done | error. Een cache-hit is direct "done", zonder wachtrij.
+
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from metrics import collect_spans, JOBS, JOB_SECONDS
+
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "4"))
+JOB_MAX_PENDING = int(os.environ.get("JOB_MAX_PENDING", "100"))
+JOB_RETENTION_S = float(os.environ.get("JOB_RETENTION", "3600"))
+JOB_MAX_JOBS = int(os.environ.get("JOB_MAX_JOBS", "1000"))
+JOB_STORE_PATH = os.environ.get("JOB_STORE_PATH") or None  # bv. data/jobs.sqlite
+
+FINISHED = ("done", "error")
+
+# GLOBALE QUEUE: 1 pool per worker, pas na de fork aangemaakt (threads overleven geen fork)
+_JOB_QUEUE = None
+_JOB_QUEUE_LOCK = threading.Lock()
+
+
+class JobQueueFull(RuntimeError):
+    """Te veel openstaande jobs; de client moet het later opnieuw proberen."""
+
+
+class _SqliteJobs:
+    """Jobs als JSON per id, met wall-clock vervaltijd; 1 connectie per thread (zoals route_cache)."""
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._local = threading.local()
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        with self._conn() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)"
+            )
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def put(self, job, expires):
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO jobs (id, value, expires) VALUES (?, ?, ?)",
+                (job["job_id"], json.dumps(job, ensure_ascii=False), expires),
+            )
+
+    def get(self, job_id):
+        row = self._conn().execute(
+            "SELECT value FROM jobs WHERE id = ? AND expires > ?", (job_id, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def purge(self):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM jobs WHERE expires <= ?", (time.time(),))
+
+
+class JobQueue:
+    """
+    Begrensde achtergrond-pool + jobregister. submit() geeft direct de job (status queued of,
+    bij een cache-hit, done); get() de actuele stand. Per job: queue_ms, run_ms, total_ms en
+    stages_ms (de spans van optimize_route: prompt_build, llm_call, validation, ...).
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS, max_pending: int = JOB_MAX_PENDING,
+                 retention: float = JOB_RETENTION_S, max_jobs: int = JOB_MAX_JOBS, path=None,
+                 optimize=None, cached=None):
+        if optimize is None or cached is None:
+            from route_brain import optimize_route, cached_route
+            optimize, cached = optimize or optimize_route, cached or cached_route
+        self._optimize = optimize
+        self._cached = cached
+        self.max_pending = max_pending
+        self.retention = retention
+        self.max_jobs = max_jobs
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="route-job")
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()  # job_id -> job (dict), in volgorde van aanmaken
+        self._pending = 0
+        self._disk = _SqliteJobs(path) if path else None
+        self.rejected = 0
+
+    # ---------- intern ----------
+    def _save(self, job):
+        # Onder self._lock aanroepen; kopie naar SQLite zodat andere workers hem ook zien
+        if self._disk is not None:
+            self._disk.put(job, time.time() + self.retention)
+
+    def _purge(self):
+        now = time.time()
+        with self._lock:
+            expired = [jid for jid, job in self._jobs.items()
+                       if job["status"] in FINISHED and job["finished_at"] + self.retention <= now]
+            for jid in expired:
+                del self._jobs[jid]
+            finished = [jid for jid, job in self._jobs.items() if job["status"] in FINISHED]
+            for jid in finished[:max(0, len(self._jobs) - self.max_jobs)]:
+                del self._jobs[jid]
+        if self._disk is not None and expired:
+            self._disk.purge()
+
+    def _finish(self, job, status, **fields):
+        now = time.time()
+        job.update(fields, status=status, finished_at=now)
+        job["timings"]["total_ms"] = round((now - job["created_at"]) * 1000, 1)
+        JOBS.inc(status=status)
+
+    def _run(self, job_id, new_request, engine):
+        with self._lock:
+            job = self._jobs[job_id]
+            job["status"] = "running"
+            job["started_at"] = time.time()
+            queue_s = job["started_at"] - job["created_at"]
+            job["timings"]["queue_ms"] = round(queue_s * 1000, 1)
+            self._save(job)
+        JOB_SECONDS.observe(queue_s, phase="queue")
+
+        t = time.perf_counter()
+        with collect_spans() as spans:
+            try:
+                result, error = self._optimize(new_request, engine=engine), None
+            except Exception as e:
+                result, error = None, str(e)
+        run_s = time.perf_counter() - t
+        JOB_SECONDS.observe(run_s, phase="run")
+
+        with self._lock:
+            job["timings"]["run_ms"] = round(run_s * 1000, 1)
+            job["timings"]["stages_ms"] = {k: round(v * 1000, 1) for k, v in spans.items()}
+            if error is None:
+                self._finish(job, "done", result=result)
+            else:
+                print(f"=== JOB {job_id} MISLUKT: {error} ===")
+                self._finish(job, "error", error=error)
+            self._pending -= 1
+            self._save(job)
+
+    # ---------- publiek ----------
+    def submit(self, new_request: dict, engine: str = None) -> dict:
+        """Job aanmaken. ValueError bij een ongeldige aanvraag, JobQueueFull als de pool vol zit."""
+        if not isinstance(new_request, dict):
+            raise ValueError("Verwacht een JSON-object met de aanvraag")
+        # Valideert de aanvraag (ValueError -> HTTP 400) vóór er een job bestaat
+        hit = self._cached(new_request, engine=engine)
+        self._purge()
+        now = time.time()
+        job = {
+            "job_id": uuid.uuid4().hex,
+            "status": "queued",
+            "date": new_request.get("date"),
+            "created_at": now,
+            "started_at": None,
+            "finished_at": None,
+            "timings": {"queue_ms": None, "run_ms": None, "total_ms": None, "stages_ms": {}},
+            "result": None,
+            "error": None,
+        }
+
+        # Cache-hit: direct klaar, zonder achter trage LLM-jobs in de rij te staan
+        with self._lock:
+            if hit is not None:
+                job.update(started_at=now, timings=dict(job["timings"], queue_ms=0.0, run_ms=0.0))
+                self._jobs[job["job_id"]] = job
+                self._finish(job, "done", result=hit)
+                self._save(job)
+                return self._view(job)
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                JOBS.inc(status="rejected")
+                raise JobQueueFull(f"Te veel openstaande jobs ({self._pending}); probeer het later opnieuw")
+            self._pending += 1
+            self._jobs[job["job_id"]] = job
+            self._save(job)
+            view = self._view(job)
+        JOBS.inc(status="queued")
+        self._executor.submit(self._run, job["job_id"], new_request, engine)
+        return view
+
+    def get(self, job_id: str):
+        """Actuele stand van een job, of None (onbekend of verlopen)."""
+        self._purge()
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                return self._view(job)
+        if self._disk is not None:
+            job = self._disk.get(job_id)
+            return self._view(job) if job else None
+        return None
+
+    @staticmethod
+    def _view(job):
+        out = dict(job, timings=dict(job["timings"]))
+        if out["status"] != "done":
+            out.pop("result")
+        if out["status"] != "error":
+            out.pop("error")
+        return out
+
+    def stats(self):
+        with self._lock:
+            states = {}
+            for job in self._jobs.values():
+                states[job["status"]] = states.get(job["status"], 0) + 1
+            return {"pending": self._pending, "max_pending": self.max_pending, "stored": len(self._jobs),
+                    "rejected": self.rejected, "by_status": states}
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
+
+
+def get_job_queue():
+    global _JOB_QUEUE
+    if _JOB_QUEUE is None:
+        # Lock: twee eerste requests (gunicorn threads) mogen niet elk een eigen queue maken
+        with _JOB_QUEUE_LOCK:
+            if _JOB_QUEUE is None:
+                _JOB_QUEUE = JobQueue(path=JOB_STORE_PATH)
+    return _JOB_QUEUE
+
+
+def job_stats():
+    """Tellers voor /stats; None zolang er geen job is ingediend (de pool wordt er niet voor gestart)."""
+    return _JOB_QUEUE.stats() if _JOB_QUEUE is not None else None
@@ -1,12 +1,19 @@
 # route_merge.py
 # FleetGO CSV -> genormaliseerde legs + koppeling met customers
-# Schrijft Parquet (indien mogelijk) of CSV naar data/matched/
+# Schrijft incrementeel Parquet (indien mogelijk) of CSV naar data/matched/<bus>/<YYYY-MM>
+#
+#   python route_merge.py             alleen nieuwe/gewijzigde exports (zie manifest.json)
+#   python route_merge.py --full      alles opnieuw
+#   python route_merge.py --geocode   eerst ontbrekende coördinaten in batch geocoderen
 
-import re, json, sys, time
+import os, re, json, sys, time, hashlib
 from pathlib import Path
 from datetime import datetime
+import numpy as np
 import pandas as pd
 
+from geocode_store import get_geocode_store
+
 # ------------------------------------------------------
 # PADCONFIG
 # ------------------------------------------------------
@@ -26,7 +33,7 @@ CUSTOMERS_PATH = OUT_BASE / "customers.csv"
 MATCHED_DIR = OUT_BASE / "matched"; MATCHED_DIR.mkdir(exist_ok=True)
 REPORTS_DIR = OUT_BASE / "reports"; REPORTS_DIR.mkdir(exist_ok=True)
 
-# Geocode-cache
+# Geocode-cache: SQLite-store (geocode_store.py); de JSON is het import/export-formaat
 CACHE_PATH = OUT_BASE / "geocode_cache.json"
 
 # Optionele geocoding (requests is optioneel)
@@ -40,14 +47,21 @@ except Exception:
 # HELPERS
 # ------------------------------------------------------
 def read_csv_auto(path: Path) -> pd.DataFrame:
+    # Eerste scheidingsteken dat meer dan 1 kolom oplevert; anders de eerste leesbare variant
+    # (customers.csv is komma-gescheiden en werd met ";" als 1 kolom ingelezen)
+    single = None
     for enc in ("utf-8", "latin1"):
         for sep in (";", ",", "\t"):
             try:
                 df = pd.read_csv(path, encoding=enc, sep=sep)
-                if df.shape[1] >= 1:
-                    return df
             except Exception:
                 continue
+            if df.shape[1] > 1:
+                return df
+            if single is None and df.shape[1] >= 1:
+                single = df
+    if single is not None:
+        return single
     raise RuntimeError(f"Kon CSV niet lezen: {path.name}")
 
 WEEKDAYS_NL = {"ma","di","wo","do","vr","za","zo"}
@@ -123,23 +137,102 @@ def normalize_address(addr, city_hint=None, postcode_hint=None):
     parts.append("NL")
     return ", ".join(parts)
 
+# --- kolomsgewijze varianten van de helpers hierboven (zelfde regels, hele kolom tegelijk) ---
+def _text(col: pd.Series) -> pd.Series:
+    """Kolom als nullable strings (ook als pandas de kolom als float/int inlas); NaN blijft <NA>."""
+    return col.astype("string")
+
+def _ints(values: pd.Series) -> pd.Series:
+    """Float-kolom met hele getallen -> int64 als er niets ontbreekt, anders float (zoals DataFrame(rows))."""
+    return values.astype("int64") if not values.isna().any() else values.astype(float)
+
+def _objects(values: pd.Series) -> pd.Series:
+    """NaN -> None in een object-kolom (zoals de rij-parser)."""
+    return values.astype(object).where(values.notna(), None)
+
+def parse_date_nl_col(col: pd.Series) -> pd.Series:
+    s = _text(col).str.strip()
+    has_day = (s.str[:2].str.lower().isin(WEEKDAYS_NL) & (s.str.len() >= 2)).fillna(False).astype(bool)
+    s = s.where(~has_day, s.str[2:].str.strip())
+    dates = pd.to_datetime(s, format="%d-%m-%Y", errors="coerce")
+    rest = dates.isna() & s.notna()
+    if rest.any():
+        # Afwijkend formaat: zelfde (tragere) dayfirst-inferentie als parse_date_nl
+        dates[rest] = [pd.to_datetime(v, dayfirst=True, errors="coerce") for v in s[rest]]
+    return dates
+
+_TIME_RE = r"^(\d+):(\d+)(?::(\d+))?$"
+
+def parse_time_to_seconds_col(col: pd.Series) -> pd.Series:
+    parts = _text(col).str.strip().str.extract(_TIME_RE).astype(float)
+    return parts[0] * 3600 + parts[1] * 60 + parts[2].fillna(0)
+
+def to_meters_from_km_col(col: pd.Series) -> pd.Series:
+    km = pd.to_numeric(_text(col).str.replace(",", ".", regex=False).str.strip(), errors="coerce").astype(float)
+    return np.trunc(km * 1000)
+
+def parse_float_col(col: pd.Series) -> pd.Series:
+    s = _text(col).str.replace(",", ".", regex=False).str.replace("%", "", regex=False).str.strip()
+    return pd.to_numeric(s, errors="coerce").astype(float)
+
+def split_driver_col(col: pd.Series) -> pd.DataFrame:
+    m = _text(col).str.extract(r"^\s*(\d+)\s*\(([^)]+)\)")
+    parts = m[1].str.strip().str.split()
+    plate = parts.str[0]
+    bus = parts.str[1:].str.join(" ")
+    return pd.DataFrame({
+        "driver_id": _objects(m[0]),
+        "vehicle_plate": _objects(plate),
+        "bus_name": _objects(bus.where(bus != "")),
+    })
+
+def infer_cities_col(col: pd.Series) -> pd.DataFrame:
+    parts = _text(col).str.split("-")
+    two = (parts.str.len() == 2).fillna(False).astype(bool)
+    return pd.DataFrame({
+        "from_city": _objects(parts.str[0].str.strip().where(two)),
+        "to_city": _objects(parts.str[1].str.strip().where(two)),
+    })
+
+def normalize_postcode_col(col: pd.Series) -> pd.Series:
+    m = _text(col).str.upper().str.replace(r"\s+", "", regex=True).str.extract(r"(\d{4})([A-Z]{2})")
+    return m[0] + " " + m[1]
+
+def normalize_address_col(col: pd.Series, city: pd.Series, postcode: pd.Series = None) -> pd.Series:
+    s = _text(col)
+    empty = (s.isna() | s.str.strip().str.lower().isin(("", "nan", "none"))).fillna(True).astype(bool)
+    a = s.str.replace(r"\s+", " ", regex=True).str.strip()
+    c = _text(city).fillna("").str.strip()
+    c = c.where(c != "", "Amsterdam")
+    if postcode is not None:
+        pc = normalize_postcode_col(postcode)
+        a = a + (", " + pc).fillna("")
+    return _objects((a + ", " + c + ", NL").where(~empty))
+
 def load_cache():
     if CACHE_PATH.exists():
         try: return json.loads(CACHE_PATH.read_text())
         except Exception: return {}
     return {}
 def save_cache(obj):
-    try: CACHE_PATH.write_text(json.dumps(obj, ensure_ascii=False, indent=2))
+    # via tijdelijk bestand + rename: een crash halverwege laat de oude JSON heel
+    try:
+        tmp = CACHE_PATH.with_suffix(".json.tmp")
+        tmp.write_text(json.dumps(obj, ensure_ascii=False, indent=2))
+        os.replace(tmp, CACHE_PATH)
     except Exception: pass
 
-GEO_CACHE = load_cache()
+def get_geo_cache():
+    """Momentopname van de geocode-store in JSON-vorm ({adres: {"lat": .., "lon": ..}})."""
+    return get_geocode_store().as_dict()
 
 # ------------------------------------------------------
 # CUSTOMERS MAPPING
 # ------------------------------------------------------
-def load_customers_mapping():
-    if not CUSTOMERS_PATH.exists(): return {}
-    df = read_csv_auto(CUSTOMERS_PATH)
+def load_customers_mapping(path: Path = None):
+    path = path or CUSTOMERS_PATH
+    if not path.exists(): return {}
+    df = read_csv_auto(path)
 
     # normaliseer kolomnamen
     rename_map = {}
@@ -155,34 +248,60 @@ def load_customers_mapping():
         elif cl in ("name","account name","account","klant","bedrijf"): rename_map[c] = "name"
     if rename_map: df = df.rename(columns=rename_map)
 
-    def build_key(r):
-        if "fulladdress" in df.columns and pd.notna(r.get("fulladdress")) and str(r.get("fulladdress")).strip():
-            addr = " ".join(str(r.get("fulladdress")).split())
-            if not re.search(r",\s*NL$", addr, flags=re.I): addr = addr + ", NL"
-            return addr
-        street = str(r.get("address","")).strip()
-        nr = str(r.get("nr","")).strip()
-        base = (street + (" " + nr if nr else "")).strip()
-        city = r.get("city", None)
-        pc   = r.get("postcode", None)
-        return normalize_address(base, city, pc)
-
-    df["addr_key"] = df.apply(build_key, axis=1)
-
-    mapping = {}
-    for _, r in df.iterrows():
-        key = r.get("addr_key")
-        if not key: continue
-        lat = r.get("lat", None); lon = r.get("lon", None)
-        try:
-            lat = float(str(lat).replace(",", ".")) if pd.notna(lat) else None
-            lon = float(str(lon).replace(",", ".")) if pd.notna(lon) else None
-        except Exception:
-            lat = lon = None
-        mapping[key] = (lat, lon)
-    return mapping
-
-CUSTOMER_COORDS = load_customers_mapping()
+    def col(name):
+        if name in df.columns: return _text(df[name])
+        return pd.Series(pd.NA, index=df.index, dtype="string")
+
+    # Sleutel: fulladdress (met ", NL" erachter) of anders straat + nr + postcode + stad
+    key = col("fulladdress").str.replace(r"\s+", " ", regex=True).str.strip()
+    has_nl = key.str.contains(r",\s*NL$", case=False, regex=True).fillna(False).astype(bool)
+    key = key.where(has_nl, key + ", NL")
+    rest = (key.isna() | (key == ", NL")).fillna(True).astype(bool)
+    if rest.any():
+        street = col("address")[rest].fillna("").str.strip()
+        nr = col("nr")[rest].fillna("").str.strip()
+        base = (street + (" " + nr).where(nr != "", "")).str.strip()
+        key = key.astype(object)
+        key[rest] = normalize_address_col(base, col("city")[rest], col("postcode")[rest])
+
+    # Coördinaten: komma als decimaalteken toegestaan; 1 onleesbare waarde -> beide None
+    def coord(name):
+        raw = col(name)
+        val = pd.to_numeric(raw.str.replace(",", ".", regex=False).str.strip(), errors="coerce").astype(float)
+        return val, raw.notna() & val.isna()
+    lat, bad_lat = coord("lat")
+    lon, bad_lon = coord("lon")
+    bad = (bad_lat | bad_lon).astype(bool)
+    lat = _objects(lat.mask(bad))
+    lon = _objects(lon.mask(bad))
+
+    ok = pd.notna(key).to_numpy()
+    # dict(zip(...)): bij dubbele sleutels wint (net als voorheen) de laatste rij
+    return dict(zip(key[ok].tolist(), zip(lat[ok].tolist(), lon[ok].tolist())))
+
+_CUSTOMER_COORDS = None
+
+def get_customer_coords():
+    global _CUSTOMER_COORDS
+    if _CUSTOMER_COORDS is None:
+        _CUSTOMER_COORDS = load_customers_mapping()
+    return _CUSTOMER_COORDS
+
+_ADDRESS_MATCHER = None
+
+def get_address_matcher():
+    # Fuzzy index over de klantadressen (address_matcher.py), pas bij eerste gebruik opgebouwd
+    global _ADDRESS_MATCHER
+    if _ADDRESS_MATCHER is None:
+        from address_matcher import AddressMatcher
+        _ADDRESS_MATCHER = AddressMatcher(get_customer_coords().keys())
+    return _ADDRESS_MATCHER
+
+def __getattr__(name):
+    # Compatibel met route_merge.GEO_CACHE / route_merge.CUSTOMER_COORDS (laadt bij eerste gebruik)
+    if name == "GEO_CACHE": return get_geo_cache()
+    if name == "CUSTOMER_COORDS": return get_customer_coords()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # ------------------------------------------------------
 # GEOCODING (optioneel)
@@ -202,24 +321,43 @@ def geocode_online(address):
     except Exception:
         return None, None
 
-def geocode_cached(address):
+def geocode_cached(address, geocode=geocode_online, store=None):
     if not address:
         return None, None
-    g = GEO_CACHE.get(address)
+    if store is None:
+        store = get_geocode_store()
+    g = store.get(address)
     # Alleen cache-hit accepteren als beide coördinaten echt bestaan
-    if g and (g.get("lat") is not None and g.get("lon") is not None):
-        return g["lat"], g["lon"]
-    # Anders: opnieuw online geocoden
-    lat, lon = geocode_online(address)
-    GEO_CACHE[address] = {"lat": lat, "lon": lon}
-    save_cache(GEO_CACHE)
-    if HAVE_REQUESTS:
+    if g and (g[0] is not None and g[1] is not None):
+        return g
+    # Anders: opnieuw geocoden; de store commit per batch i.p.v. de hele JSON te herschrijven
+    lat, lon = geocode(address)
+    store.put(address, lat, lon)
+    if geocode is geocode_online and HAVE_REQUESTS:
         time.sleep(1.1)  # Nominatim rate limit
     return lat, lon
 
 
 def coords_for(address):
-    # Tijdelijk: geen geocoding, geen requests, alleen adressen gebruiken
+    # Alleen lokaal opzoeken; online geocoden gebeurt vooraf in batch via geocoder.BatchGeocoder
+    # (python route_merge.py --geocode, geocodeert ook alle klantadressen). Volgorde: klantbestand
+    # exact, geocode-store exact, dan de fuzzy match (address_matcher) op een klantadres en diens
+    # coördinaten. Het klantbestand zelf heeft meestal geen lat/lon; die staan dan in de store.
+    if not address:
+        return None, None
+    customers = get_customer_coords()
+    store = get_geocode_store()
+    for lookup in (customers.get, store.get):
+        c = lookup(address)
+        if c and c[0] is not None and c[1] is not None:
+            return c
+    m = get_address_matcher().match(address)
+    if m is None or m.key == address:
+        return None, None
+    for lookup in (customers.get, store.get):
+        c = lookup(m.key)
+        if c and c[0] is not None and c[1] is not None:
+            return c
     return None, None
 
 
@@ -231,15 +369,32 @@ NEEDED = [
     "Vertrekadres","Vertreklocatie","Bezoekadres","Bezoeklocatie","Bestuurder","Administratie"
 ]
 
-def convert_one(csv_path: Path):
-    df = read_csv_auto(csv_path)
-    missing = [c for c in NEEDED if c not in df.columns]
-    if missing: raise RuntimeError(f"{csv_path.name}: ontbrekende kolommen: {missing}")
+def _bus_from_filename(csv_path: Path):
+    fn = csv_path.name.lower()
+    if "ocho" in fn: return "Ocho"
+    if "rebel" in fn: return "Rebel"
+    return None
+
+# Sleutel voor legs zonder bus: in route_id, partitiemap en watermark (zie _bus_key)
+NO_BUS = "Bus"
 
+def _bus_col(bus: pd.Series, csv_path: Path) -> pd.Series:
+    """bus_name per rij: uit "Bestuurder" (split_driver_col), anders uit de bestandsnaam; kan None blijven."""
+    fallback_bus = _bus_from_filename(csv_path)
+    if fallback_bus:
+        bus = bus.where(bus.notna(), fallback_bus)
+    return bus
+
+def _bus_key(bus: pd.Series) -> pd.Series:
+    """Bus-sleutel per rij; overal dezelfde, anders vindt _new_rows de watermark van merge_legs niet."""
+    return bus.fillna(NO_BUS).astype(str)
+
+def legs_rowwise(df: pd.DataFrame, csv_path: Path) -> pd.DataFrame:
+    """Oude rij-voor-rij parser (iterrows); alleen nog voor vergelijking in bench.py convert."""
     rows = []
     for _, row in df.iterrows():
         date = parse_date_nl(row["Datum"])
-        if not date: continue
+        if pd.isna(date): continue  # NaT is truthy: `if not date` liet lege datums door
 
         leg = None
         try: leg = int(str(row["Rit"]).strip())
@@ -257,9 +412,7 @@ def convert_one(csv_path: Path):
 
         driver_id, plate, bus = split_driver(row["Bestuurder"])
         if not bus:
-            fn = csv_path.name.lower()
-            if "ocho" in fn: bus = "Ocho"
-            elif "rebel" in fn: bus = "Rebel"
+            bus = _bus_from_filename(csv_path)
 
         admin = str(row.get("Administratie","")).strip() or None
 
@@ -268,7 +421,7 @@ def convert_one(csv_path: Path):
 
         rows.append({
             "date": str(date),
-            "route_id": f"{date}-{bus or 'Bus'}",
+            "route_id": f"{date}-{bus or NO_BUS}",
             "leg": leg,
             "start_s": start_s,
             "end_s": end_s,
@@ -283,49 +436,274 @@ def convert_one(csv_path: Path):
             "administration": admin,
             "source_file": csv_path.name,
         })
+    return pd.DataFrame(rows)
+
+def _coords_col(addresses: pd.Series):
+    """coords_for() 1x per uniek adres i.p.v. per rij."""
+    lookup = {a: coords_for(a) for a in pd.unique(addresses.dropna())}
+    pairs = addresses.map(lambda a: lookup.get(a, (None, None)) if a is not None else (None, None))
+    return _objects(pairs.str[0]), _objects(pairs.str[1])
+
+def legs_vectorized(df: pd.DataFrame, csv_path: Path) -> pd.DataFrame:
+    """Kolomsgewijze parser: zelfde uitvoerschema als legs_rowwise, zonder Python-lus per rij."""
+    dates = parse_date_nl_col(df["Datum"])
+    keep = dates.notna()
+    df, dates = df[keep], dates[keep]
+    if df.empty: return pd.DataFrame()
+
+    date_s = dates.dt.strftime("%Y-%m-%d")
+    rit = _text(df["Rit"]).str.strip()
+    leg = pd.to_numeric(rit.where(rit.str.fullmatch(r"[+-]?\d+", na=False)), errors="coerce")
+
+    cities = infer_cities_col(df["Van/naar"])
+    cities.index = df.index
+    driver = split_driver_col(df["Bestuurder"])
+    driver.index = df.index
+    bus = _bus_col(driver["bus_name"], csv_path)
+
+    from_addr = normalize_address_col(df["Vertrekadres"], cities["from_city"])
+    to_addr = normalize_address_col(df["Bezoekadres"], cities["to_city"])
+    from_lat, from_lon = _coords_col(from_addr)
+    to_lat, to_lon = _coords_col(to_addr)
+
+    admin = _text(df["Administratie"]) if "Administratie" in df.columns else pd.Series("", index=df.index)
+    admin = admin.fillna("nan").str.strip()  # rij-parser deed str(NaN) -> "nan"
+
+    out = pd.DataFrame({
+        "date": date_s,
+        "route_id": date_s + "-" + _bus_key(bus),
+        "leg": _ints(leg),
+        "start_s": _ints(parse_time_to_seconds_col(df["Start"])),
+        "end_s": _ints(parse_time_to_seconds_col(df["Eind"])),
+        "duration_s": _ints(parse_time_to_seconds_col(df["Duur"])),
+        "distance_m": _ints(to_meters_from_km_col(df["Totale afstand (km)"])),
+        "deviation_pct": parse_float_col(df["Afwijking (%)"]),
+        "from_city": cities["from_city"], "to_city": cities["to_city"],
+        "from_address": from_addr, "to_address": to_addr,
+        "from_lat": from_lat, "from_lon": from_lon,
+        "to_lat": to_lat, "to_lon": to_lon,
+        "driver_id": driver["driver_id"], "vehicle_plate": driver["vehicle_plate"], "bus_name": _objects(bus),
+        "administration": _objects(admin.where(admin != "")),
+        "source_file": csv_path.name,
+    })
+    # dtypes opnieuw laten afleiden zoals pd.DataFrame(rows) dat doet (bv. str-kolommen in pandas 3);
+    # index 0..n-1 zoals de rij-parser, ook als er rijen zonder datum weggevallen zijn
+    out = out.reset_index(drop=True)
+    return pd.DataFrame({c: v if v.dtype.kind in "fi" else v.tolist() for c, v in out.items()})
 
-    out = pd.DataFrame(rows)
-    if out.empty: return None, {"file": csv_path.name, "rows": 0}
-
-    out = out.sort_values(["date","bus_name","leg"], na_position="last").reset_index(drop=True)
+# ------------------------------------------------------
+# INCREMENTEEL: manifest + partities per bus en maand
+# ------------------------------------------------------
+# data/matched/<bus>/<YYYY-MM>.parquet|csv ; manifest.json houdt per bronbestand de hash bij
+# en per bus de laatst verwerkte datum (watermark). Een onveranderd bestand wordt overgeslagen;
+# van een nieuw/gewijzigd bestand tellen alleen rijen vanaf de watermark (die dag wordt vervangen,
+# zodat een eerder gedeeltelijk geëxporteerde dag aangevuld kan worden).
+MANIFEST_PATH = MATCHED_DIR / "manifest.json"
+MANIFEST_VERSION = 1
+SORT_COLS = ["date","bus_name","leg"]
+
+def file_sha256(path: Path, chunk=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def load_manifest(path: Path = None):
+    path = path or MANIFEST_PATH
+    if path.exists():
+        try:
+            m = json.loads(path.read_text(encoding="utf-8"))
+            if m.get("version") == MANIFEST_VERSION: return m
+        except Exception:
+            pass
+    return {"version": MANIFEST_VERSION, "files": {}, "watermarks": {}}
 
-    rep = {
-        "file": csv_path.name,
-        "rows": int(len(out)),
-        "date_min": str(out["date"].min()),
-        "date_max": str(out["date"].max()),
-        "buses": sorted([b for b in out["bus_name"].dropna().unique()]),
-        "missing_coords": int(out[ out["from_lat"].isna() | out["to_lat"].isna() ].shape[0]),
-    }
+def save_manifest(manifest, path: Path = None):
+    path = path or MANIFEST_PATH
+    tmp = path.with_suffix(".json.tmp")
+    tmp.write_text(json.dumps(manifest, ensure_ascii=False, indent=2, sort_keys=True), encoding="utf-8")
+    os.replace(tmp, path)
 
-    date_min, date_max = out["date"].min(), out["date"].max()
-    out_path_parquet = MATCHED_DIR / f"{date_min}_to_{date_max}.parquet"
+def _parquet_ok():
     try:
-        out.to_parquet(out_path_parquet, index=False)
-        written = str(out_path_parquet)
+        import pyarrow  # noqa: F401
+        return True
     except Exception:
-        out_path_csv = MATCHED_DIR / f"{date_min}_to_{date_max}.csv"
-        out.to_csv(out_path_csv, index=False)
-        written = str(out_path_csv)
+        return False
+
+# ".parquet" als pyarrow er is, anders ".csv"; pas bij de eerste partitie bepaald (zie _partition_ext),
+# zodat `import route_merge` (server: coords_for) pyarrow niet laadt
+_PARTITION_EXT = None
+
+def _partition_ext():
+    global _PARTITION_EXT
+    if _PARTITION_EXT is None:
+        _PARTITION_EXT = ".parquet" if _parquet_ok() else ".csv"
+    return _PARTITION_EXT
+
+def _safe_name(s):
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", str(s)) or "Bus"
+
+def partition_path(bus, month, out_dir: Path = None):
+    return (out_dir or MATCHED_DIR) / _safe_name(bus) / f"{month}{_partition_ext()}"
+
+def read_partition(path: Path) -> pd.DataFrame:
+    if path.suffix == ".parquet":
+        return pd.read_parquet(path)
+    return pd.read_csv(path, dtype={"date": str})
+
+def write_partition(df: pd.DataFrame, path: Path):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    if path.suffix == ".parquet":
+        df.to_parquet(tmp, index=False)
+    else:
+        df.to_csv(tmp, index=False)
+    os.replace(tmp, path)
+
+def iter_partitions(out_dir: Path = None):
+    """Alle partitiebestanden, gesorteerd op bus en maand."""
+    out_dir = out_dir or MATCHED_DIR
+    return sorted(p for p in out_dir.glob("*/*") if p.suffix in (".parquet", ".csv"))
+
+def _new_rows(df: pd.DataFrame, csv_path: Path, watermarks):
+    """Alleen ruwe rijen op/na de watermark van hun bus (goedkoop: alleen datum + bestuurder parsen)."""
+    if not watermarks: return df
+    dates = parse_date_nl_col(df["Datum"]).dt.strftime("%Y-%m-%d")
+    bus = split_driver_col(df["Bestuurder"])["bus_name"]
+    bus.index = df.index
+    cutoff = _bus_key(_bus_col(bus, csv_path)).map(lambda b: watermarks.get(b) or "")
+    return df[(dates >= cutoff).fillna(False).astype(bool).to_numpy()]
+
+def merge_legs(legs: pd.DataFrame, manifest, out_dir: Path = None):
+    """Schrijft legs naar de geraakte (bus, maand)-partities; dagen >= watermark worden vervangen."""
+    written = []
+    legs = legs.assign(_month=legs["date"].str[:7], _bus=_bus_key(legs["bus_name"]))
+    for (bus, month), part in legs.groupby(["_bus", "_month"], sort=True):
+        part = part.drop(columns=["_month", "_bus"])
+        first_new = part["date"].min()
+        path = partition_path(bus, month, out_dir)
+        if path.exists():
+            old = read_partition(path)
+            part = pd.concat([old[old["date"] < first_new], part], ignore_index=True)
+        part = part.sort_values(SORT_COLS, na_position="last").reset_index(drop=True)
+        write_partition(part, path)
+        written.append(str(path))
+        wm = manifest["watermarks"].get(bus)
+        manifest["watermarks"][bus] = max(wm or "", part["date"].max())
+    return written
+
+def convert_one(csv_path: Path, manifest=None, out_dir: Path = None):
+    """
+    Verwerkt 1 FleetGO-export incrementeel. Geeft (geschreven partities, rapport) terug;
+    met manifest=None wordt het manifest zelf geladen en opgeslagen.
+    """
+    own_manifest = manifest is None
+    if own_manifest: manifest = load_manifest()
+
+    sha = file_sha256(csv_path)
+    seen = manifest["files"].get(csv_path.name)
+    if seen and seen.get("sha256") == sha:
+        return [], {"file": csv_path.name, "rows": 0, "skipped": True}
 
-    rep_path = REPORTS_DIR / f"report_{date_min}_to_{date_max}.json"
-    try:
-        rep_path.write_text(json.dumps(rep, ensure_ascii=False, indent=2))
-    except Exception:
-        pass
+    df = read_csv_auto(csv_path)
+    missing = [c for c in NEEDED if c not in df.columns]
+    if missing: raise RuntimeError(f"{csv_path.name}: ontbrekende kolommen: {missing}")
 
+    raw_rows = len(df)
+    df = _new_rows(df, csv_path, manifest["watermarks"])
+    out = legs_vectorized(df, csv_path) if len(df) else pd.DataFrame()
+
+    written, rep = [], {"file": csv_path.name, "rows": 0, "raw_rows": raw_rows}
+    if not out.empty:
+        out = out.sort_values(SORT_COLS, na_position="last").reset_index(drop=True)
+        written = merge_legs(out, manifest, out_dir)
+        rep.update({
+            "rows": int(len(out)),
+            "date_min": str(out["date"].min()),
+            "date_max": str(out["date"].max()),
+            "buses": sorted([b for b in out["bus_name"].dropna().unique()]),
+            "missing_coords": int(out[ out["from_lat"].isna() | out["to_lat"].isna() ].shape[0]),
+            "partitions": len(written),
+        })
+        rep_dir = REPORTS_DIR if out_dir is None else out_dir / "reports"
+        rep_dir.mkdir(exist_ok=True)
+        rep_path = rep_dir / f"report_{_safe_name(csv_path.stem)}.json"
+        try:
+            rep_path.write_text(json.dumps(rep, ensure_ascii=False, indent=2))
+        except Exception:
+            pass
+
+    manifest["files"][csv_path.name] = {
+        "sha256": sha,
+        "size": csv_path.stat().st_size,
+        "rows": raw_rows,
+        "new_rows": rep["rows"],
+        "processed_at": datetime.now().isoformat(timespec="seconds"),
+    }
+    if own_manifest: save_manifest(manifest)
     return written, rep
 
-# ------------------------------------------------------
-# MAIN
-# ------------------------------------------------------
-def main():
+def reset_output(out_dir: Path = None):
+    """--full: partities en manifest weggooien zodat alles opnieuw ingelezen wordt."""
+    for p in iter_partitions(out_dir):
+        p.unlink()
+    manifest_path = (out_dir / "manifest.json") if out_dir else MANIFEST_PATH
+    if manifest_path.exists(): manifest_path.unlink()
+
+def ingest(csvs, out_dir: Path = None):
+    """Alle exports incrementeel verwerken (oudste bestandsnaam eerst); manifest 1x opslaan."""
+    manifest_path = (out_dir / "manifest.json") if out_dir else MANIFEST_PATH
+    manifest = load_manifest(manifest_path)
+    written, reports = [], []
+    for c in csvs:
+        try:
+            w, r = convert_one(c, manifest, out_dir)
+            written += [x for x in w if x not in written]
+            if r: reports.append(r)
+        except Exception as e:
+            print(f"Fout in {c.name}: {e}")
+    save_manifest(manifest, manifest_path)
+    return written, reports
+
+def find_csvs():
     # verzamel CSV's uit beide mogelijke mappen
     csvs = []
     for d in FLEETGO_DIRS:
         if d.exists():
             csvs += list(d.glob("*.csv"))
-    csvs = sorted(csvs)
+    return sorted(csvs)
+
+def collect_addresses(csvs=None):
+    """Alle unieke genormaliseerde adressen uit de FleetGO-exports plus het klantbestand."""
+    addresses = {}
+    for c in (find_csvs() if csvs is None else csvs):
+        df = read_csv_auto(c)
+        if "Van/naar" not in df.columns: continue
+        cities = infer_cities_col(df["Van/naar"])
+        cities.index = df.index
+        for col, city in (("Vertrekadres", "from_city"), ("Bezoekadres", "to_city")):
+            if col in df.columns:
+                addresses.update(dict.fromkeys(normalize_address_col(df[col], cities[city]).dropna()))
+    addresses.update(dict.fromkeys(get_customer_coords()))
+    return list(addresses)
+
+def geocode_all(csvs=None, retry_missing=False):
+    from geocoder import BatchGeocoder
+    geocoder = BatchGeocoder()
+    report = geocoder.geocode_many(
+        collect_addresses(csvs), progress=lambda i, n: print(f"  geocoding {i}/{n}"),
+        retry_missing=retry_missing,
+    )
+    print(f"Geocoding: {report}")
+    return report
+
+# ------------------------------------------------------
+# MAIN
+# ------------------------------------------------------
+def main():
+    csvs = find_csvs()
 
     if not csvs:
         print(f"Geen CSV’s gevonden in: {', '.join(str(d) for d in FLEETGO_DIRS)}")
@@ -334,16 +712,20 @@ def main():
     # log welke customers gebruikt wordt
     print(f"Customers file: {CUSTOMERS_PATH} (bestaat={CUSTOMERS_PATH.exists()})")
 
-    written, reports = [], []
-    for c in csvs:
-        try:
-            w, r = convert_one(c)
-            if w: written.append(w)
-            if r: reports.append(r)
-        except Exception as e:
-            print(f"Fout in {c.name}: {e}")
+    # --geocode (of GEOCODE_ON_IMPORT=1): ontbrekende coördinaten eerst in batch opzoeken;
+    # --retry-missing: ook eerder "niet gevonden" adressen opnieuw
+    if "--geocode" in sys.argv[1:] or os.environ.get("GEOCODE_ON_IMPORT") == "1":
+        geocode_all(csvs, retry_missing="--retry-missing" in sys.argv[1:])
 
-    save_cache(GEO_CACHE)
+    if "--full" in sys.argv[1:]:
+        reset_output()
+
+    written, reports = ingest(csvs)
+
+    # store committen en de JSON (uitwisselformaat, o.a. voor distance_matrix) bijwerken
+    store = get_geocode_store()
+    store.flush()
+    store.export_json(CACHE_PATH)
 
     if written:
         print("Geschreven bestanden:")
@@ -351,6 +733,9 @@ def main():
     if reports:
         print("\nKorte rapportage:")
         for r in reports:
+            if r.get("skipped"):
+                print(f"- {r.get('file')}: ongewijzigd, overgeslagen")
+                continue
             print(f"- {r.get('file')}: rows={r.get('rows')} range={r.get('date_min')}..{r.get('date_max')} buses={r.get('buses')} missing_coords={r.get('missing_coords')}")
 
 if __name__ == "__main__":
@@ -0,0 +1,220 @@
+# route_sequencer.py
+# Volgorde van de stops binnen elke bus (na de verdeling door LLM of route_solver).
+# Start vanaf het depot met nearest-neighbour en verbetert de rit met 2-opt en Or-opt
+# op de afstandsmatrix van distance_matrix, binnen een vast tijdsbudget per aanvraag.
+#
+# Configuratie via environment (Railway Variables):
+#   SEQUENCE_STOPS            1 = volgorde optimaliseren (standaard), 0 = volgorde van de verdeling houden
+#   SEQUENCE_BUDGET_MS        max. rekentijd per aanvraag (alle bussen samen)
+#   SEQUENCE_RETURN_TO_DEPOT  1 = rit eindigt weer bij het depot (zo rijden de historische routes)
+#   SEQUENCE_COST             "km" (afstandsmatrix) of "time" (geleerde reistijden uit travel_times.py)
+#
+# Per bus komen ook de verwachte aankomsttijden en de totale duur in het antwoord (travel_times).
+
+import os
+import time
+
+from distance_matrix import get_matrix
+from route_solver import DEPOT_ADDRESS, DEPOT_COORDS, resolve_coords
+from travel_times import get_travel_times, parse_hhmm
+
+SEQUENCE_STOPS = os.environ.get("SEQUENCE_STOPS", "1") == "1"
+SEQUENCE_BUDGET_MS = float(os.environ.get("SEQUENCE_BUDGET_MS", "50"))
+SEQUENCE_RETURN_TO_DEPOT = os.environ.get("SEQUENCE_RETURN_TO_DEPOT", "1") == "1"
+SEQUENCE_COST = os.environ.get("SEQUENCE_COST", "km")
+
+# Or-opt: segmenten van 1 t/m 3 opeenvolgende stops verplaatsen
+OR_OPT_MAX_SEGMENT = 3
+
+# Kleinste verbetering (km) die als verbetering telt; voorkomt eindeloos wisselen door afronding
+EPS = 1e-9
+
+
+# -------------------------------------------------
+# Afstanden
+# -------------------------------------------------
+def distance_rows(addresses, coords=None):
+    """
+    (n, n) afstanden in km als lijst van lijsten (sneller te indexeren dan numpy in de lussen).
+    Onbekende adressen krijgen via route_solver.resolve_coords het centrum van hun stad.
+    """
+    matrix = get_matrix()
+    fallback = resolve_coords(addresses, coords)
+    if DEPOT_ADDRESS in fallback and DEPOT_ADDRESS not in matrix:
+        fallback[DEPOT_ADDRESS] = DEPOT_COORDS
+    return matrix.submatrix(list(addresses), fallback_coords=fallback).tolist()
+
+
+def tour_cost(dist, tour):
+    return sum(dist[a][b] for a, b in zip(tour, tour[1:]))
+
+
+def route_km(addresses, start=DEPOT_ADDRESS, return_to_depot: bool = None):
+    """Km van een rit in de gegeven volgorde, vanaf het depot (en terug, bij return_to_depot)."""
+    if return_to_depot is None:
+        return_to_depot = SEQUENCE_RETURN_TO_DEPOT
+    addresses = list(addresses)
+    if not addresses:
+        return 0.0
+    tour = list(range(len(addresses) + 1)) + ([0] if return_to_depot else [])
+    return tour_cost(distance_rows([start] + addresses), tour)
+
+
+# -------------------------------------------------
+# Constructie + lokale verbetering
+# -------------------------------------------------
+def nearest_neighbour(dist, start, end, nodes):
+    """Rit start -> (telkens de dichtstbijzijnde nog niet bezochte stop) -> end."""
+    tour, todo, cur = [start], set(nodes), start
+    while todo:
+        nxt = min(todo, key=lambda j: (dist[cur][j], j))
+        tour.append(nxt)
+        todo.remove(nxt)
+        cur = nxt
+    tour.append(end)
+    return tour
+
+
+def _prefix(dist, tour):
+    """Cumulatieve kosten vooruit en achteruit (voor asymmetrische matrices, bv. reistijden)."""
+    fwd, bwd = [0.0], [0.0]
+    for a, b in zip(tour, tour[1:]):
+        fwd.append(fwd[-1] + dist[a][b])
+        bwd.append(bwd[-1] + dist[b][a])
+    return fwd, bwd
+
+
+def two_opt(dist, tour, deadline):
+    """1 ronde first-improvement 2-opt; begin en eind van de rit liggen vast. True bij verbetering."""
+    n = len(tour)
+    fwd, bwd = _prefix(dist, tour)
+    for i in range(1, n - 2):
+        if time.perf_counter() > deadline:
+            return False
+        a, b = tour[i - 1], tour[i]
+        for j in range(i + 1, n - 1):
+            c, d = tour[j], tour[j + 1]
+            old = dist[a][b] + (fwd[j] - fwd[i]) + dist[c][d]
+            new = dist[a][c] + (bwd[j] - bwd[i]) + dist[b][d]
+            if new < old - EPS:
+                tour[i:j + 1] = tour[i:j + 1][::-1]
+                return True
+    return False
+
+
+def or_opt(dist, tour, deadline):
+    """1 ronde Or-opt: verplaats een segment van 1..3 stops (eventueel omgekeerd) naar een betere plek."""
+    n = len(tour)
+    fwd, bwd = _prefix(dist, tour)
+    for length in range(1, OR_OPT_MAX_SEGMENT + 1):
+        for i in range(1, n - length):
+            if time.perf_counter() > deadline:
+                return False
+            j = i + length - 1  # laatste stop van het segment
+            a, s0, s1, b = tour[i - 1], tour[i], tour[j], tour[j + 1]
+            seg, seg_rev = fwd[j] - fwd[i], bwd[j] - bwd[i]
+            removed = dist[a][s0] + seg + dist[s1][b] - dist[a][b]
+            for p in range(n - 1):
+                if i - 1 <= p <= j:
+                    continue
+                c, d = tour[p], tour[p + 1]
+                base = dist[c][d]
+                if dist[c][s0] + seg + dist[s1][d] - base < removed - EPS:
+                    segment = tour[i:j + 1]
+                elif dist[c][s1] + seg_rev + dist[s0][d] - base < removed - EPS:
+                    segment = tour[i:j + 1][::-1]
+                else:
+                    continue
+                rest = tour[:i] + tour[j + 1:]
+                at = p + 1 if p < i else p + 1 - length
+                tour[:] = rest[:at] + segment + rest[at:]
+                return True
+    return False
+
+
+def improve(dist, tour, deadline):
+    """2-opt en Or-opt afwisselen tot geen van beide nog iets vindt of de deadline verstreken is."""
+    while time.perf_counter() < deadline:
+        if two_opt(dist, tour, deadline):
+            continue
+        if not or_opt(dist, tour, deadline):
+            break
+    return tour
+
+
+# -------------------------------------------------
+# Publieke functies
+# -------------------------------------------------
+def sequence_stops(addresses, start=DEPOT_ADDRESS, time_budget_s: float = None,
+                   return_to_depot: bool = None, dist=None):
+    """
+    Optimale(re) volgorde voor 1 bus. Geeft (adressen, kosten) terug; kosten in km (of seconden bij
+    SEQUENCE_COST=time), inclusief de rit vanaf het depot (en terug, bij return_to_depot).
+    Staat het depot zelf in de lijst, dan blijft het vooraan.
+    dist: optioneel een eigen (n+1, n+1) matrix voor [start] + addresses.
+    """
+    if time_budget_s is None:
+        time_budget_s = SEQUENCE_BUDGET_MS / 1000.0
+    if return_to_depot is None:
+        return_to_depot = SEQUENCE_RETURN_TO_DEPOT
+    addresses = list(addresses)
+    if not addresses:
+        return [], 0.0
+
+    points = [start] + addresses
+    if dist is None:
+        dist = get_travel_times().durations(points).tolist() if SEQUENCE_COST == "time" else distance_rows(points)
+    n = len(points)
+    if return_to_depot:
+        end = 0
+    else:
+        # Open rit: extra eindpunt dat op afstand 0 van alles ligt
+        dist = [row + [0.0] for row in dist] + [[0.0] * (n + 1)]
+        end = n
+
+    deadline = time.perf_counter() + time_budget_s
+    nodes = [i for i in range(1, n) if points[i] != start]
+    tour = improve(dist, nearest_neighbour(dist, 0, end, nodes), deadline)
+
+    km = tour_cost(dist, tour)
+    ordered = [points[i] for i in tour[1:-1]]
+    if len(nodes) < len(addresses):
+        ordered = [start] * (len(addresses) - len(nodes)) + ordered
+    return ordered, km
+
+
+def sequence_result(result, time_budget_s: float = None, start_time: str = None):
+    """
+    Stage na validate_and_fix: volgorde per bus optimaliseren en per bus "km_per_bus",
+    "duration_min_per_bus" en "eta_per_bus" (aankomsttijd per stop, "HH:MM") toevoegen.
+    Het tijdsbudget geldt voor de hele aanvraag en wordt naar rato van het aantal stops verdeeld.
+    start_time: vertrek bij het depot ("HH:MM"); standaard de mediane historische starttijd.
+    """
+    bus_routes = result.get("bus_routes") or {}
+    if time_budget_s is None:
+        time_budget_s = SEQUENCE_BUDGET_MS / 1000.0
+    total = sum(len(stops) for stops in bus_routes.values()) or 1
+    start_s = parse_hhmm(start_time) if start_time else None
+    tt = get_travel_times()
+
+    routes, km_per_bus, duration_per_bus, eta_per_bus = {}, {}, {}, {}
+    for bus, stops in bus_routes.items():
+        if SEQUENCE_STOPS:
+            ordered, km = sequence_stops(stops, time_budget_s=time_budget_s * len(stops) / total)
+            if SEQUENCE_COST == "time":
+                km = route_km(ordered)
+        else:
+            ordered, km = list(stops), route_km(stops)
+        routes[bus] = ordered
+        km_per_bus[bus] = round(km, 1)
+        timing = tt.route_timing(ordered, start_s=start_s, return_to_depot=SEQUENCE_RETURN_TO_DEPOT) \
+            if ordered else {"eta": [], "duration_s": 0.0}
+        duration_per_bus[bus] = round(float(timing["duration_s"]) / 60.0)
+        eta_per_bus[bus] = timing["eta"]
+
+    out = dict(result)
+    out["bus_routes"] = routes
+    out["km_per_bus"] = km_per_bus
+    out["duration_min_per_bus"] = duration_per_bus
+    out["eta_per_bus"] = eta_per_bus
+    return out
@@ -0,0 +1,236 @@
+# route_solver.py
+# Lokale, deterministische route-verdeling (alternatief voor de LLM-call)
+# Verdeelt stops over de bussen op basis van coördinaten + de dag/regio-regels uit build_prompt.
+
+import math
+import datetime
+from distance_matrix import get_matrix
+
+# Depot: eerste stop van (bijna) elke historische route
+DEPOT_ADDRESS = "Portsmuiden 11, Amsterdam, NL"
+DEPOT_COORDS = (52.3904711, 4.7855078)
+
+# Minimaal aantal stops per bus als er 2 bussen rijden (zie validate_and_fix)
+MIN_STOPS_PER_BUS = 8
+
+# GLOBALE CACHE: coördinaten uit de distance_matrix-tabel (1x per worker laden)
+_COORDS_CACHE = None
+
+# -------------------------------------------------
+# Regio's (zelfde indeling als de regels in build_prompt)
+# -------------------------------------------------
+AMSTERDAM_AREA = {
+    "amsterdam", "amsterdam zuidoost", "westpoort", "amstelveen", "zaandam", "duivendrecht",
+    "diemen", "badhoevedorp", "schiphol", "lijnden", "weesp", "landsmeer", "oostzaan", "halfweg",
+    "hoofddorp",
+}
+UTRECHT_AREA = {
+    "utrecht", "nieuwegein", "maarssen", "breukelen", "breukelen ut", "oud zuilen", "zeist",
+    "houten", "bilthoven", "de bilt", "hilversum", "amersfoort",
+}
+
+# Grove stadscentra voor adressen zonder geocode (fallback)
+CITY_CENTROIDS = {
+    "amsterdam": (52.3676, 4.9041),
+    "amstelveen": (52.3114, 4.8701),
+    "zaandam": (52.4420, 4.8292),
+    "westpoort": (52.4030, 4.8170),
+    "schiphol": (52.3105, 4.7683),
+    "haarlem": (52.3874, 4.6462),
+    "ijmuiden": (52.4600, 4.6200),
+    "hilversum": (52.2292, 5.1669),
+    "utrecht": (52.0907, 5.1214),
+    "amersfoort": (52.1561, 5.3878),
+    "leiden": (52.1601, 4.4970),
+    "den haag": (52.0705, 4.3007),
+    "delft": (52.0116, 4.3571),
+    "rijswijk zh": (52.0363, 4.3250),
+    "schiedam": (51.9192, 4.3989),
+    "rotterdam": (51.9244, 4.4777),
+    "breda": (51.5719, 4.7683),
+}
+
+
+def address_city(address):
+    """'Straat 1, [1234 AB,] Stad, NL' -> 'stad' (lowercase)."""
+    parts = [p.strip() for p in str(address).split(",")]
+    if len(parts) >= 2 and parts[-1].upper() == "NL":
+        parts = parts[:-1]
+    if len(parts) < 2:
+        return "amsterdam"
+    return parts[-1].lower()
+
+
+def address_region(address):
+    city = address_city(address)
+    if city in AMSTERDAM_AREA:
+        return "amsterdam"
+    if city in UTRECHT_AREA:
+        return "utrecht"
+    return "randstad"
+
+
+def get_weekday(date_str):
+    y, m, d = map(int, date_str.split("-"))
+    return datetime.date(y, m, d).weekday()
+
+
+# -------------------------------------------------
+# Coördinaten
+# -------------------------------------------------
+def load_coords():
+    """Adres -> (lat, lon) voor alle adressen in de coördinatentabel van distance_matrix."""
+    global _COORDS_CACHE
+    if _COORDS_CACHE is not None:
+        return _COORDS_CACHE
+    _COORDS_CACHE = get_matrix().coords_dict()
+    return _COORDS_CACHE
+
+
+def _city_centroids(coords):
+    """Gemiddelde positie per stad van alle bekende adressen, aangevuld met CITY_CENTROIDS."""
+    sums = {}
+    for addr, (lat, lon) in coords.items():
+        s = sums.setdefault(address_city(addr), [0.0, 0.0, 0])
+        s[0] += lat; s[1] += lon; s[2] += 1
+    out = dict(CITY_CENTROIDS)
+    for city, (slat, slon, n) in sums.items():
+        out[city] = (slat / n, slon / n)
+    return out
+
+
+def resolve_coords(addresses, coords=None):
+    """Coördinaten voor elk adres; onbekende adressen krijgen het centrum van hun stad (of het depot)."""
+    if coords is None:
+        coords = load_coords()
+    centroids = None
+    out = {}
+    for addr in addresses:
+        if addr in coords:
+            out[addr] = coords[addr]
+            continue
+        if centroids is None:
+            centroids = _city_centroids(coords)
+        out[addr] = centroids.get(address_city(addr), DEPOT_COORDS)
+    return out
+
+
+def _xy(latlon, ref=DEPOT_COORDS):
+    """Equirectangulaire projectie in km t.o.v. het depot (ruim nauwkeurig genoeg binnen NL)."""
+    lat, lon = latlon
+    x = (lon - ref[1]) * 111.32 * math.cos(math.radians(ref[0]))
+    y = (lat - ref[0]) * 110.57
+    return x, y
+
+
+# -------------------------------------------------
+# Clustering
+# -------------------------------------------------
+def _spread(points):
+    """Som van kwadratische afstanden tot het zwaartepunt (lager = compacter cluster)."""
+    if not points:
+        return 0.0
+    cx = sum(p[0] for p in points) / len(points)
+    cy = sum(p[1] for p in points) / len(points)
+    return sum((p[0] - cx) ** 2 + (p[1] - cy) ** 2 for p in points)
+
+
+def _centroid(points):
+    return (sum(p[0] for p in points) / len(points), sum(p[1] for p in points) / len(points))
+
+
+def sweep_order(addresses, xy):
+    """Sorteer adressen op hoek rond het depot (tie-break op adres voor determinisme)."""
+    return sorted(addresses, key=lambda a: (math.atan2(xy[a][1], xy[a][0]), a))
+
+
+def sweep_split(addresses, xy, lo, hi):
+    """
+    Knip de sweep-volgorde in 2 aaneengesloten sectoren, groep 1 met lo..hi stops.
+    Kiest de knip met de kleinste totale spreiding.
+    """
+    order = sweep_order(addresses, xy)
+    n = len(order)
+    best = None
+    for start in range(n):
+        rotated = order[start:] + order[:start]
+        for k in range(lo, hi + 1):
+            g1, g2 = rotated[:k], rotated[k:]
+            cost = _spread([xy[a] for a in g1]) + _spread([xy[a] for a in g2])
+            if best is None or cost < best[0] - 1e-9:
+                best = (cost, g1, g2)
+    return best[1], best[2]
+
+
+def rebalance(big, small, xy, lo, hi):
+    """
+    Verplaats stops van de grootste naar de kleinste groep (dichtst bij het zwaartepunt van
+    de kleine groep eerst) tot beide groepen tussen lo en hi stops zitten.
+    """
+    big, small = list(big), list(small)
+    while (len(small) < lo or len(big) > hi) and big:
+        c = _centroid([xy[a] for a in small]) if small else (0.0, 0.0)
+        nearest = min(big, key=lambda a: ((xy[a][0] - c[0]) ** 2 + (xy[a][1] - c[1]) ** 2, a))
+        big.remove(nearest)
+        small.append(nearest)
+    return big, small
+
+
+# -------------------------------------------------
+# Publieke functie: verdeel stops over bussen
+# -------------------------------------------------
+def solve(new_request, coords=None):
+    """
+    Zelfde output-formaat als de LLM: {"bus_routes": {bus: [adressen, ...], ...}}
+
+    Regels (zie build_prompt):
+      - maandag: altijd 1 route
+      - dinsdag/woensdag: 2 routes Amsterdam (als er genoeg stops zijn)
+      - donderdag/vrijdag/overig: zo min mogelijk bussen, Amsterdam gescheiden van Randstad/Utrecht
+      - max_stops_per_bus per bus, minimaal 8 stops per bus bij 2 bussen
+    """
+    stops = [s["address"] for s in new_request["stops"]]
+    buses = new_request.get("buses") or ["Ocho", "Rebel"]
+    max_stops = new_request.get("max_stops_per_bus", 18)
+    weekday = get_weekday(new_request["date"])
+
+    bus_routes = {bus: [] for bus in buses}
+    first = buses[0]
+
+    xy = {a: _xy(ll) for a, ll in resolve_coords(stops, coords).items()}
+    n = len(stops)
+
+    # 1 bus: maandag, te weinig stops voor 2x minimaal 8, of maar 1 bus beschikbaar
+    if weekday == 0 or n < 2 * MIN_STOPS_PER_BUS or len(buses) < 2:
+        bus_routes[first] = sweep_order(stops, xy)
+        return {"bus_routes": bus_routes}
+
+    core = [a for a in stops if address_region(a) == "amsterdam"]
+    outer = [a for a in stops if address_region(a) != "amsterdam"]
+
+    lo = max(MIN_STOPS_PER_BUS, n - max_stops)
+    hi = min(max_stops, n - MIN_STOPS_PER_BUS)
+
+    if lo > hi:
+        # Meer dan 2x max stops: past niet, validate_and_fix vangt dit af
+        order = sweep_order(stops, xy)
+        g1, g2 = order[:max_stops], order[max_stops:]
+    elif core and outer:
+        # Strikte scheiding Amsterdam vs. Randstad/Utrecht, daarna capaciteit bijsturen
+        if len(outer) < lo or len(core) > hi:
+            core, outer = rebalance(core, outer, xy, lo, hi)
+        elif len(core) < lo or len(outer) > hi:
+            outer, core = rebalance(outer, core, xy, lo, hi)
+        g1, g2 = core, outer
+    elif n <= max_stops and weekday not in (1, 2):
+        # Past in 1 bus en geen verplichte 2 routes
+        bus_routes[first] = sweep_order(stops, xy)
+        return {"bus_routes": bus_routes}
+    else:
+        g1, g2 = sweep_split(stops, xy, lo, hi)
+        if len(g2) > len(g1):
+            g1, g2 = g2, g1
+
+    bus_routes[first] = sweep_order(g1, xy)
+    bus_routes[buses[1]] = sweep_order(g2, xy)
+    return {"bus_routes": bus_routes}
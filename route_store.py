@@ -0,0 +1,272 @@
+# route_store.py
+# Compact, memory-mapped opslagformaat voor de trainingsroutes (vervangt de ingesprongen JSON in de server).
+#
+# Layout (map data/routes_store/, alle arrays als .npy zodat np.load(mmap_mode="r") werkt):
+#   strings_blob.npy     uint8   alle geïnterneerde strings (adressen, datums, bussen, route-ids) achter elkaar
+#   strings_offsets.npy  int64   (n_strings + 1) begin/eind per string in de blob
+#   route_offsets.npy    int64   (n_routes + 1) begin/eind per route in de stop-arrays
+#   route_date.npy       int32   string-id van de datum
+#   route_bus.npy        int32   string-id van de busnaam
+#   route_rid.npy        int32   string-id van het route_id
+#   stop_addr.npy        int32   string-id van het adres per stop
+#   stop_dist.npy        int32   distance_from_prev in meters (-1 = onbekend)
+#   stop_dur.npy         int32   duration_from_prev in seconden (-1 = onbekend)
+#   stop_from_leg.npy    int32   from_leg (-1 = None)
+#   stop_to_leg.npy      int32   to_leg (-1 = None)
+#   meta.json            versie + aantallen
+#
+# Omdat alles read-only gememory-mapt wordt, delen geforkte gunicorn-workers dezelfde pages.
+
+import os
+import json
+from array import array
+from pathlib import Path
+import numpy as np
+
+BASE = Path(__file__).parent
+STORE_DIR = BASE / "data" / "routes_store"
+STORE_VERSION = 1
+
+NONE = -1
+
+ROUTE_ARRAYS = ("route_offsets", "route_date", "route_bus", "route_rid")
+STOP_ARRAYS = ("stop_addr", "stop_dist", "stop_dur", "stop_from_leg", "stop_to_leg")
+
+
+def _int_or_none(v):
+    return NONE if v is None else int(v)
+
+
+def _none_if_missing(v):
+    v = int(v)
+    return None if v == NONE else v
+
+
+# -------------------------------------------------
+# Schrijven
+# -------------------------------------------------
+class StoreWriter:
+    """
+    Bouwt een store route voor route op (geschikt voor streaming: routes hoeven niet
+    allemaal tegelijk in het geheugen). finish() schrijft alles naar out_dir.
+    """
+
+    def __init__(self):
+        self._ids = {}
+        self._strings = []
+        # array i.p.v. list: 4-8 bytes per waarde, ook bij jaren aan historie
+        self.route_offsets = array("q", [0])
+        self.route_date, self.route_bus, self.route_rid = array("i"), array("i"), array("i")
+        self.stop_addr, self.stop_dist, self.stop_dur = array("i"), array("i"), array("i")
+        self.stop_from_leg, self.stop_to_leg = array("i"), array("i")
+
+    def intern(self, s):
+        s = "" if s is None else str(s)
+        i = self._ids.get(s)
+        if i is None:
+            i = self._ids[s] = len(self._strings)
+            self._strings.append(s)
+        return i
+
+    def add(self, route):
+        self.route_date.append(self.intern(route.get("date")))
+        self.route_bus.append(self.intern(route.get("bus_name")))
+        self.route_rid.append(self.intern(route.get("route_id")))
+        for s in route["stops"]:
+            self.stop_addr.append(self.intern(s["address"]))
+            self.stop_dist.append(_int_or_none(s.get("distance_from_prev")))
+            self.stop_dur.append(_int_or_none(s.get("duration_from_prev")))
+            self.stop_from_leg.append(_int_or_none(s.get("from_leg")))
+            self.stop_to_leg.append(_int_or_none(s.get("to_leg")))
+        self.route_offsets.append(len(self.stop_addr))
+
+    def finish(self, out_dir: Path = STORE_DIR):
+        out_dir.mkdir(parents=True, exist_ok=True)
+        encoded = [s.encode("utf-8") for s in self._strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        np.save(out_dir / "strings_blob.npy", np.frombuffer(b"".join(encoded), dtype=np.uint8))
+        np.save(out_dir / "strings_offsets.npy", offsets)
+        np.save(out_dir / "route_offsets.npy", np.frombuffer(self.route_offsets, dtype=np.int64))
+        for name in ROUTE_ARRAYS[1:] + STOP_ARRAYS:
+            np.save(out_dir / f"{name}.npy", np.frombuffer(getattr(self, name), dtype=np.int32))
+        meta = {
+            "version": STORE_VERSION,
+            "routes": len(self.route_date),
+            "stops": len(self.stop_addr),
+            "strings": len(self._strings),
+        }
+        (out_dir / "meta.json").write_text(json.dumps(meta), encoding="utf-8")
+        return meta
+
+
+def write_store(routes, out_dir: Path = STORE_DIR):
+    w = StoreWriter()
+    for r in routes:
+        w.add(r)
+    return w.finish(out_dir)
+
+
+# -------------------------------------------------
+# Lezen
+# -------------------------------------------------
+class RouteStore:
+    """
+    Read-only, sequence-achtige toegang tot de routes. store[i] geeft dezelfde dict-vorm
+    als routes_training.json; de *_ids / *_of methodes werken zonder dicts te bouwen.
+    """
+
+    def __init__(self, store_dir: Path = STORE_DIR):
+        self.store_dir = Path(store_dir)
+        self.meta = json.loads((self.store_dir / "meta.json").read_text(encoding="utf-8"))
+        if self.meta.get("version") != STORE_VERSION:
+            raise ValueError(f"Onbekende route-store versie: {self.meta.get('version')}")
+
+        def load(name):
+            return np.load(self.store_dir / f"{name}.npy", mmap_mode="r")
+
+        self._blob = load("strings_blob")
+        self._offsets = load("strings_offsets")
+        for name in ROUTE_ARRAYS + STOP_ARRAYS:
+            setattr(self, name, load(name))
+        self._string_ids = None
+
+    @classmethod
+    def exists(cls, store_dir: Path = STORE_DIR):
+        return (Path(store_dir) / "meta.json").exists()
+
+    def __len__(self):
+        return len(self.route_date)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        a, b = int(self.route_offsets[i]), int(self.route_offsets[i + 1])
+        stops = []
+        for k in range(a, b):
+            stops.append({
+                "index": k - a,
+                "address": self.string(self.stop_addr[k]),
+                "from_leg": _none_if_missing(self.stop_from_leg[k]),
+                "to_leg": _none_if_missing(self.stop_to_leg[k]),
+                "distance_from_prev": _none_if_missing(self.stop_dist[k]),
+                "duration_from_prev": _none_if_missing(self.stop_dur[k]),
+            })
+        return {
+            "date": self.date_of(i),
+            "route_id": self.string(self.route_rid[i]),
+            "bus_name": self.string(self.route_bus[i]),
+            "num_stops": b - a,
+            "stops": stops,
+        }
+
+    # --- strings ---
+    def string(self, sid):
+        sid = int(sid)
+        a, b = int(self._offsets[sid]), int(self._offsets[sid + 1])
+        return bytes(self._blob[a:b]).decode("utf-8")
+
+    def string_id(self, s):
+        """String -> id (None als onbekend); de lookup-tabel wordt 1x lazy opgebouwd."""
+        if self._string_ids is None:
+            self._string_ids = {self.string(i): i for i in range(len(self._offsets) - 1)}
+        return self._string_ids.get(s)
+
+    # --- per route, zonder dicts ---
+    def date_of(self, i):
+        return self.string(self.route_date[i])
+
+    def bus_of(self, i):
+        return self.string(self.route_bus[i])
+
+    def address_ids(self, i):
+        """int32-view op de adres-ids van route i (geen kopie)."""
+        return self.stop_addr[int(self.route_offsets[i]):int(self.route_offsets[i + 1])]
+
+    def addresses(self, i):
+        return [self.string(s) for s in self.address_ids(i)]
+
+    def address_index(self):
+        """Adres -> set met route-posities, opgebouwd over de id-arrays (elk adres 1x gedecodeerd)."""
+        offsets = self.route_offsets.tolist()
+        stop_addr = self.stop_addr
+        by_id = {}
+        for i in range(len(self)):
+            for sid in set(stop_addr[offsets[i]:offsets[i + 1]].tolist()):
+                by_id.setdefault(sid, set()).add(i)
+        return {self.string(sid): routes for sid, routes in by_id.items()}
+
+    def leg_arrays(self, i):
+        """(adres-ids, distance_from_prev, duration_from_prev) als array-views voor route i."""
+        a, b = int(self.route_offsets[i]), int(self.route_offsets[i + 1])
+        return self.stop_addr[a:b], self.stop_dist[a:b], self.stop_dur[a:b]
+
+
+# -------------------------------------------------
+# JSON Lines (output van build_training_routes)
+# -------------------------------------------------
+class JsonlRoutes:
+    """
+    Random-access over routes_training.jsonl: bij openen wordt 1x een index van (begin, eind)
+    per niet-lege regel gebouwd (geen JSON-parse); len, jsonl[i] en iteratie komen alle drie
+    uit die index, dus lege regels tellen nergens mee.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        starts, ends = [], []
+        pos = 0
+        with self.path.open("rb") as f:
+            for line in f:
+                if line.strip():
+                    starts.append(pos)
+                    ends.append(pos + len(line))
+                pos += len(line)
+        self._starts = np.asarray(starts, dtype=np.int64)
+        self._ends = np.asarray(ends, dtype=np.int64)
+        self._fd = os.open(self.path, os.O_RDONLY)
+
+    @classmethod
+    def exists(cls, path: Path):
+        return Path(path).exists()
+
+    def __len__(self):
+        return len(self._starts)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        a, b = int(self._starts[i]), int(self._ends[i])
+        return json.loads(os.pread(self._fd, b - a, a).decode("utf-8"))  # pread: thread-safe
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+def main():
+    src = BASE / "data" / "routes_training.json"
+    routes = json.loads(src.read_text(encoding="utf-8"))
+    meta = write_store(routes, STORE_DIR)
+    print(f"Route-store geschreven naar {STORE_DIR}: {meta}")
+
+
+if __name__ == "__main__":
+    main()
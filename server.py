@@ -1,15 +1,53 @@
 import os
-from flask import Flask, request, jsonify
+import time
+from flask import Flask, Response, g, request, jsonify
 from flask_cors import CORS, cross_origin
-from route_brain import optimize_route
+from route_brain import (
+    optimize_route, optimize_routes, service_stats, validate_request, check_batch_size, BatchTooLarge,
+)
+from metrics import REQUEST_SECONDS, render, log_payload, payload_sampled
+from warmup import WARM_STARTUP, warm_up, is_ready, warm_status
+from route_jobs import get_job_queue, JobQueueFull
 
 app = Flask(__name__)
 CORS(app)  # sta CORS toe op alle routes
 
+# Opwarmen gebeurt niet bij het importeren: gunicorn doet het 1x in de master, vóór de fork
+# (when_ready in gunicorn.conf.py), lokaal draaien hieronder in __main__
+
+
+@app.before_request
+def _start_timer():
+    g.t0 = time.perf_counter()
+
+
+@app.after_request
+def _observe_request(response):
+    # Vaste endpoint-namen (url_rule) als label, zodat onbekende paden geen nieuwe series maken
+    endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+    REQUEST_SECONDS.observe(time.perf_counter() - g.get("t0", time.perf_counter()),
+                            endpoint=endpoint, status=str(response.status_code))
+    return response
+
 
 @app.get("/health")
 def health():
-    return jsonify({"status": "ok"}), 200
+    # 503 tot de data geladen is, en blijvend na een mislukte warm-up; daarna pas "ok" (Railway healthcheck)
+    if not is_ready():
+        warmup = warm_status()
+        return jsonify({"status": "error" if warmup["state"] == "error" else "warming", "warmup": warmup}), 503
+    return jsonify({"status": "ok", "warmup": warm_status()}), 200
+
+
+@app.get("/stats")
+def stats():
+    return jsonify(service_stats()), 200
+
+
+@app.get("/metrics")
+def metrics():
+    # Prometheus-tekstformaat: stage-latencies, fallbacks per reden, plus de tellers van /stats
+    return Response(render(service_stats()), mimetype="text/plain; version=0.0.4")
 
 
 @app.route("/optimize-route", methods=["POST", "OPTIONS"])
@@ -17,32 +55,94 @@ def health():
 def optimize_route_endpoint():
     # CORS preflight (browser stuurt OPTIONS)
     if request.method == "OPTIONS":
-        print("=== OPTIONS /optimize-route ontvangen ===")
         return jsonify({"status": "ok"}), 200
 
     # Echte POST-call
     data = request.get_json(force=True)
 
-    print("=== INKOMENDE DATA /optimize-route ===")
-    print(data)
-    print("=== EINDE INKOMENDE DATA ===")
+    # Volledige payloads alleen bij LOG_PAYLOADS=1, gesampled (zie metrics.py)
+    sampled = payload_sampled()
+    log_payload("INKOMENDE DATA /optimize-route", data, sampled)
+
+    try:
+        validate_request(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
     try:
         result = optimize_route(data)
+        log_payload("UITGAANDE DATA /optimize-route", result, sampled)
+        return jsonify(result)
+    except Exception as e:
+        print(f"=== SERVER ERROR /optimize-route: {e} ===")
+        return jsonify({"error": str(e)}), 500
 
-        print("=== UITGAANDE DATA /optimize-route ===")
-        print(result)
-        print("=== EINDE UITGAANDE DATA ===")
 
-        return jsonify(result)
+@app.route("/optimize-route/jobs", methods=["POST", "OPTIONS"])
+@cross_origin()
+def submit_job_endpoint():
+    """Zelfde body als /optimize-route; antwoordt direct (202) met een job-id om te pollen."""
+    if request.method == "OPTIONS":
+        return jsonify({"status": "ok"}), 200
+
+    data = request.get_json(force=True)
+    log_payload("INKOMENDE DATA /optimize-route/jobs", data)
+    try:
+        job = get_job_queue().submit(data)
+    except JobQueueFull as e:
+        return jsonify({"error": str(e)}), 429
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
-        print("=== SERVER ERROR /optimize-route ===")
-        print(str(e))
-        print("=== EINDE ERROR ===")
+        print(f"=== SERVER ERROR /optimize-route/jobs: {e} ===")
         return jsonify({"error": str(e)}), 500
 
+    job["status_url"] = f"/optimize-route/jobs/{job['job_id']}"
+    return jsonify(job), 202, {"Location": job["status_url"]}
+
+
+@app.get("/optimize-route/jobs/<job_id>")
+@cross_origin()
+def job_status_endpoint(job_id):
+    job = get_job_queue().get(job_id)
+    if job is None:
+        return jsonify({"error": "Onbekende of verlopen job"}), 404
+    return jsonify(job), 200
+
+
+@app.route("/optimize-routes", methods=["POST", "OPTIONS"])
+@cross_origin()
+def optimize_routes_endpoint():
+    """Batch: {"requests": [<optimize-route body>, ...]} -> resultaat + timing per dag."""
+    if request.method == "OPTIONS":
+        return jsonify({"status": "ok"}), 200
+
+    data = request.get_json(force=True)
+    day_requests = data.get("requests") if isinstance(data, dict) else data
+    if not isinstance(day_requests, list):
+        return jsonify({"error": "Verwacht een lijst 'requests'"}), 400
+    try:
+        check_batch_size(day_requests)
+    except BatchTooLarge as e:
+        return jsonify({"error": str(e)}), 413
+
+    print(f"=== INKOMENDE BATCH /optimize-routes: {len(day_requests)} dagen ===")
+
+    t = time.perf_counter()
+    results = optimize_routes(day_requests)
+    failed = sum(1 for r in results if r["status"] != "ok")
+
+    print(f"=== BATCH KLAAR: {len(results) - failed} ok, {failed} fout ===")
+    return jsonify({
+        "results": results,
+        "failed": failed,
+        "elapsed_ms": round((time.perf_counter() - t) * 1000, 1),
+    })
+
 
 if __name__ == "__main__":
     # alleen voor lokaal draaien; in Railway gebruiken we gunicorn
     port = int(os.environ.get("PORT", 8000))
+    if WARM_STARTUP:
+        warm_up()
     app.run(host="0.0.0.0", port=port, debug=False)
@@ -0,0 +1,243 @@
+# server_async.py
+# Async (ASGI) variant van server.py: veel gelijktijdige /optimize-route calls in 1 proces,
+# met 1 gedeelde kopie van de trainingsdata. /health blijft direct antwoorden terwijl
+# optimalisaties lopen: LLM-calls worden ge-await, rekenwerk (solver, sequencing) draait in
+# threads (asyncio.to_thread) i.p.v. op de event loop.
+#
+# Draaien: uvicorn server_async:app --host 0.0.0.0 --port $PORT
+# Limiet:  MAX_CONCURRENT_OPTIMIZATIONS (standaard 32) gelijktijdige optimalisaties (ook per batch-dag),
+#          BATCH_MAX_REQUESTS (standaard 31) dagen per /optimize-routes
+# Warm-up: WARM_STARTUP=1 laadt de data bij de lifespan startup (zie warmup.py)
+
+import os
+import json
+import time
+import asyncio
+
+from route_brain import (
+    optimize_route_async, optimize_routes_async, service_stats, validate_request,
+    check_batch_size, BatchTooLarge,
+)
+from metrics import REQUEST_SECONDS, render, log_payload, payload_sampled
+from warmup import WARM_STARTUP, warm_up_background, is_ready, warm_status
+from route_jobs import get_job_queue, JobQueueFull
+from llm_client import aclose_llm_client
+
+MAX_CONCURRENT_OPTIMIZATIONS = int(os.environ.get("MAX_CONCURRENT_OPTIMIZATIONS", "32"))
+
+CORS_HEADERS = [
+    (b"access-control-allow-origin", b"*"),
+    (b"access-control-allow-methods", b"GET, POST, OPTIONS"),
+    (b"access-control-allow-headers", b"Content-Type"),
+]
+
+# Wordt in de event loop van de server aangemaakt (zie _limiter)
+_LIMITER = None
+
+
+def _limiter():
+    global _LIMITER
+    if _LIMITER is None:
+        _LIMITER = asyncio.Semaphore(MAX_CONCURRENT_OPTIMIZATIONS)
+    return _LIMITER
+
+
+async def _read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+
+async def _send_json(send, status, payload, extra_headers=()):
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    headers = [
+        (b"content-type", b"application/json"),
+        (b"content-length", str(len(body)).encode()),
+    ] + CORS_HEADERS + list(extra_headers)
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def health(scope, receive, send):
+    # 503 tot de warm-up (lifespan startup) klaar is, en blijvend als die mislukt is
+    if not is_ready():
+        warmup = warm_status()
+        status = "error" if warmup["state"] == "error" else "warming"
+        return await _send_json(send, 503, {"status": status, "warmup": warmup})
+    await _send_json(send, 200, {"status": "ok", "warmup": warm_status()})
+
+
+async def stats(scope, receive, send):
+    await _send_json(send, 200, service_stats())
+
+
+async def metrics(scope, receive, send):
+    body = render(service_stats()).encode("utf-8")
+    headers = [
+        (b"content-type", b"text/plain; version=0.0.4"),
+        (b"content-length", str(len(body)).encode()),
+    ]
+    await send({"type": "http.response.start", "status": 200, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def optimize_route_endpoint(scope, receive, send):
+    # CORS preflight (browser stuurt OPTIONS)
+    if scope["method"] == "OPTIONS":
+        return await _send_json(send, 200, {"status": "ok"})
+
+    try:
+        data = json.loads(await _read_body(receive) or b"null")
+    except ValueError as e:
+        return await _send_json(send, 400, {"error": f"Ongeldige JSON: {e}"})
+
+    # Volledige payloads alleen bij LOG_PAYLOADS=1, gesampled (zie metrics.py)
+    sampled = payload_sampled()
+    log_payload("INKOMENDE DATA /optimize-route", data, sampled)
+
+    try:
+        validate_request(data)
+    except ValueError as e:
+        return await _send_json(send, 400, {"error": str(e)})
+
+    try:
+        async with _limiter():
+            result = await optimize_route_async(data)
+        log_payload("UITGAANDE DATA /optimize-route", result, sampled)
+        await _send_json(send, 200, result)
+    except Exception as e:
+        print(f"=== SERVER ERROR /optimize-route: {e} ===")
+        await _send_json(send, 500, {"error": str(e)})
+
+
+async def optimize_routes_endpoint(scope, receive, send):
+    """Batch: {"requests": [<optimize-route body>, ...]} -> resultaat + timing per dag."""
+    if scope["method"] == "OPTIONS":
+        return await _send_json(send, 200, {"status": "ok"})
+
+    try:
+        data = json.loads(await _read_body(receive) or b"null")
+    except ValueError as e:
+        return await _send_json(send, 400, {"error": f"Ongeldige JSON: {e}"})
+    day_requests = data.get("requests") if isinstance(data, dict) else data
+    if not isinstance(day_requests, list):
+        return await _send_json(send, 400, {"error": "Verwacht een lijst 'requests'"})
+    try:
+        check_batch_size(day_requests)
+    except BatchTooLarge as e:
+        return await _send_json(send, 413, {"error": str(e)})
+
+    print(f"=== INKOMENDE BATCH /optimize-routes: {len(day_requests)} dagen ===")
+
+    t = time.perf_counter()
+    # Limiter per dag (niet 1 plek voor de hele batch): zie optimize_routes_async
+    results = await optimize_routes_async(day_requests, shared_limiter=_limiter())
+    failed = sum(1 for r in results if r["status"] != "ok")
+
+    print(f"=== BATCH KLAAR: {len(results) - failed} ok, {failed} fout ===")
+    await _send_json(send, 200, {
+        "results": results,
+        "failed": failed,
+        "elapsed_ms": round((time.perf_counter() - t) * 1000, 1),
+    })
+
+
+async def submit_job_endpoint(scope, receive, send):
+    """Zelfde body als /optimize-route; antwoordt direct (202) met een job-id om te pollen."""
+    if scope["method"] == "OPTIONS":
+        return await _send_json(send, 200, {"status": "ok"})
+
+    try:
+        data = json.loads(await _read_body(receive) or b"null")
+    except ValueError as e:
+        return await _send_json(send, 400, {"error": f"Ongeldige JSON: {e}"})
+    log_payload("INKOMENDE DATA /optimize-route/jobs", data)
+
+    try:
+        # submit doet alleen een cache-lookup; de optimalisatie zelf draait in de job-pool
+        job = get_job_queue().submit(data)
+    except JobQueueFull as e:
+        return await _send_json(send, 429, {"error": str(e)})
+    except ValueError as e:
+        return await _send_json(send, 400, {"error": str(e)})
+    except Exception as e:
+        print(f"=== SERVER ERROR /optimize-route/jobs: {e} ===")
+        return await _send_json(send, 500, {"error": str(e)})
+
+    job["status_url"] = f"/optimize-route/jobs/{job['job_id']}"
+    await _send_json(send, 202, job, [(b"location", job["status_url"].encode())])
+
+
+async def job_status_endpoint(scope, receive, send):
+    job_id = scope["path"].rstrip("/").rsplit("/", 1)[-1]
+    job = get_job_queue().get(job_id)
+    if job is None:
+        return await _send_json(send, 404, {"error": "Onbekende of verlopen job"})
+    await _send_json(send, 200, job)
+
+
+ROUTES = {
+    ("GET", "/health"): health,
+    ("GET", "/stats"): stats,
+    ("GET", "/metrics"): metrics,
+    ("POST", "/optimize-route"): optimize_route_endpoint,
+    ("OPTIONS", "/optimize-route"): optimize_route_endpoint,
+    ("POST", "/optimize-routes"): optimize_routes_endpoint,
+    ("OPTIONS", "/optimize-routes"): optimize_routes_endpoint,
+    ("POST", "/optimize-route/jobs"): submit_job_endpoint,
+    ("OPTIONS", "/optimize-route/jobs"): submit_job_endpoint,
+}
+
+# Routes met een variabel laatste pad-deel: prefix -> (handler, endpoint-label voor de metrics)
+PREFIX_ROUTES = {
+    ("GET", "/optimize-route/jobs/"): (job_status_endpoint, "/optimize-route/jobs/<job_id>"),
+}
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            # Opwarmen in een thread: de server accepteert al verbindingen en /health meldt "warming"
+            if WARM_STARTUP:
+                warm_up_background()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            # Connection pool van de AsyncOpenAI-client netjes sluiten
+            await aclose_llm_client()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await _lifespan(receive, send)
+    if scope["type"] != "http":
+        return
+
+    path = scope["path"].rstrip("/") or "/"
+    handler = ROUTES.get((scope["method"], path))
+    endpoint = path
+    if handler is None:
+        for (method, prefix), (prefix_handler, label) in PREFIX_ROUTES.items():
+            if scope["method"] == method and path.startswith(prefix) and len(path) > len(prefix):
+                handler, endpoint = prefix_handler, label
+                break
+    t = time.perf_counter()
+    status = []
+
+    async def send_and_record(message):
+        if message["type"] == "http.response.start":
+            status.append(message["status"])
+        await send(message)
+
+    try:
+        if handler is None:
+            return await _send_json(send_and_record, 404, {"error": "Not found"})
+        await handler(scope, receive, send_and_record)
+    finally:
+        REQUEST_SECONDS.observe(time.perf_counter() - t, endpoint=endpoint if handler else "unmatched",
+                                status=str(status[0]) if status else "500")
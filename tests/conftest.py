@@ -0,0 +1,5 @@
+# Tests draaien vanuit de repo-root (python -m pytest); de modules staan plat in de root.
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,57 @@
+import threading
+
+import route_merge
+from address_matcher import AddressMatcher, normalize_street, parse_address
+
+CUSTOMERS = [
+    "Singel 460, 1017 AW, Amsterdam, NL",
+    "Quellijnstraat 79, 1072 XW, Amsterdam, NL",
+    "Willemstraat 9, 3511 RJ, Utrecht, NL",
+]
+
+
+def test_parse_and_normalize():
+    a = parse_address("1e Const. Huygensstr 12A, 1054 BR, Amsterdam, NL")
+    assert a.street == "eerste const huygensstraat"
+    assert (a.number, a.suffix, a.postcode, a.city) == (12, "a", "1054 BR", "amsterdam")
+    assert normalize_street("Mt. Ondinaweg") == "mt ondinaweg"
+
+
+def test_match_without_postcode_and_with_typo():
+    m = AddressMatcher(CUSTOMERS)
+    assert m.match("Quellijnstraat 79, Amsterdam, NL").key == CUSTOMERS[1]
+    assert m.match("Quellijnstr 79, Amsterdam, NL").key == CUSTOMERS[1]
+    assert m.match("Singel 461, Amsterdam, NL") is None  # ander huisnummer
+    assert m.match(CUSTOMERS[2]).method == "exact"
+
+
+def test_stats_are_consistent_under_threads():
+    m = AddressMatcher(CUSTOMERS)
+    queries = [f"Singel {n}, Amsterdam, NL" for n in range(400, 500)]
+
+    def work():
+        for q in queries:
+            m.match(q)
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert m.stats["queries"] + m.stats["cache_hits"] == 8 * len(queries)
+    assert m.stats["matched"] + m.stats["unmatched"] == m.stats["queries"]
+
+
+class _Store(dict):
+    def get(self, address):
+        return dict.get(self, address)
+
+
+def test_coords_for_uses_geocode_store_for_the_fuzzy_match(monkeypatch):
+    # Zoals het echte klantbestand: klantadressen zonder lat/lon; coördinaten komen uit de store
+    monkeypatch.setattr(route_merge, "get_customer_coords", lambda: {k: (None, None) for k in CUSTOMERS})
+    monkeypatch.setattr(route_merge, "get_address_matcher", lambda: AddressMatcher(CUSTOMERS))
+    monkeypatch.setattr(route_merge, "get_geocode_store", lambda: _Store({CUSTOMERS[1]: (52.36, 4.87)}))
+    assert route_merge.coords_for("Quellijnstraat 79, Amsterdam, NL") == (52.36, 4.87)
+    assert route_merge.coords_for("Singel 460, Amsterdam, NL") == (None, None)
+    assert route_merge.coords_for("") == (None, None)
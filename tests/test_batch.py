@@ -0,0 +1,63 @@
+import asyncio
+import json
+
+import pytest
+
+import route_brain
+from route_brain import BatchTooLarge, check_batch_size, optimize_routes_async
+
+REQUEST = {"date": "2025-03-18", "buses": ["Ocho", "Rebel"], "max_stops_per_bus": 18, "engine": "local",
+           "stops": [{"address": "Dam 1, Amsterdam, NL"}]}
+
+
+def test_check_batch_size():
+    check_batch_size([REQUEST] * 3, max_requests=3)
+    with pytest.raises(BatchTooLarge):
+        check_batch_size([REQUEST] * 4, max_requests=3)
+
+
+def test_batch_takes_the_shared_limiter_per_day(monkeypatch):
+    running, peak = 0, 0
+
+    async def fake_optimize(new_request, engine=None, use_cache=True):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return {"bus_routes": {}}
+
+    monkeypatch.setattr(route_brain, "optimize_route_async", fake_optimize)
+
+    async def run():
+        shared = asyncio.Semaphore(2)
+        return await optimize_routes_async([REQUEST] * 6, max_concurrency=6, shared_limiter=shared)
+
+    results = asyncio.run(run())
+    assert [r["status"] for r in results] == ["ok"] * 6
+    assert peak == 2
+
+
+def test_batch_endpoint_returns_413_above_max(monkeypatch):
+    monkeypatch.setenv("WARM_STARTUP", "0")
+    import server
+    monkeypatch.setattr(route_brain, "BATCH_MAX_REQUESTS", 2)
+    r = server.app.test_client().post("/optimize-routes", json={"requests": [REQUEST] * 3})
+    assert r.status_code == 413
+
+
+def test_async_batch_endpoint_returns_413_above_max(monkeypatch):
+    monkeypatch.setenv("WARM_STARTUP", "0")
+    import server_async
+    monkeypatch.setattr(route_brain, "BATCH_MAX_REQUESTS", 2)
+    sent = []
+
+    async def receive():
+        return {"body": json.dumps({"requests": [REQUEST] * 3}).encode(), "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "POST", "path": "/optimize-routes"}
+    asyncio.run(server_async.optimize_routes_endpoint(scope, receive, send))
+    assert sent[0]["status"] == 413
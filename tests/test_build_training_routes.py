@@ -0,0 +1,42 @@
+import json
+
+import pytest
+
+import build_training_routes as btr
+
+ROUTE = {"date": "2025-03-10", "route_id": "2025-03-10-Ocho", "bus_name": "Ocho", "num_stops": 2,
+         "stops": [{"address": "A"}, {"address": "B"}]}
+
+
+@pytest.fixture
+def outputs(tmp_path, monkeypatch):
+    jsonl, array = tmp_path / "routes.jsonl", tmp_path / "routes.json"
+    jsonl.write_text("oud\n", encoding="utf-8")
+    array.write_text("[]", encoding="utf-8")
+    monkeypatch.setattr(btr, "OUTPUT_JSONL", jsonl)
+    monkeypatch.setattr(btr, "OUTPUT_JSON", array)
+    monkeypatch.setattr(btr, "input_files", lambda: [tmp_path / "legs.csv"])
+    return tmp_path, jsonl, array
+
+
+def test_failed_run_keeps_previous_files(outputs, monkeypatch):
+    tmp_path, jsonl, array = outputs
+
+    def broken(files, chunk_rows):
+        yield ROUTE
+        raise ValueError("Invoer niet gegroepeerd op route_id")
+
+    monkeypatch.setattr(btr, "stream_routes", broken)
+    with pytest.raises(ValueError):
+        btr.main(["--formats", "jsonl,json"])
+    assert jsonl.read_text(encoding="utf-8") == "oud\n"
+    assert array.read_text(encoding="utf-8") == "[]"
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_successful_run_replaces_files(outputs, monkeypatch):
+    _, jsonl, array = outputs
+    monkeypatch.setattr(btr, "stream_routes", lambda files, chunk_rows: iter([ROUTE, ROUTE]))
+    btr.main(["--formats", "jsonl,json"])
+    assert [json.loads(line) for line in jsonl.read_text(encoding="utf-8").splitlines()] == [ROUTE, ROUTE]
+    assert json.loads(array.read_text(encoding="utf-8")) == [ROUTE, ROUTE]
@@ -0,0 +1,86 @@
+import types
+
+import pytest
+
+from geocode_store import GeocodeStore
+from geocoder import BatchGeocoder, FunctionBackend, GeocodeError, GeocodeTransientError, NominatimBackend
+
+FOUND = {"Dam 1, Amsterdam, NL": (52.373, 4.893)}
+
+
+@pytest.fixture
+def store(tmp_path):
+    s = GeocodeStore(tmp_path / "geocode.sqlite")
+    yield s
+    s.close()
+
+
+def _geocoder(store, fn):
+    return BatchGeocoder(FunctionBackend(fn), store, rate=1000, workers=2, backoff_base=0)
+
+
+def test_stored_misses_are_only_retried_on_request(store):
+    calls = []
+
+    def lookup(address):
+        calls.append(address)
+        return FOUND.get(address, (None, None))
+
+    addresses = ["Dam 1, Amsterdam, NL", "Nergensstraat 1, Nergens, NL"]
+    report = _geocoder(store, lookup).geocode_many(addresses)
+    assert (report["found"], report["not_found"]) == (1, 1)
+
+    calls.clear()
+    report = _geocoder(store, lookup).geocode_many(addresses)
+    assert report["looked_up"] == 0 and calls == []
+
+    report = _geocoder(store, lookup).geocode_many(addresses, retry_missing=True)
+    assert calls == ["Nergensstraat 1, Nergens, NL"]
+
+
+def test_client_error_fails_one_address_and_continues(store):
+    def lookup(address):
+        if address.startswith("Fout"):
+            raise GeocodeError("HTTP 400")
+        return FOUND.get(address, (None, None))
+
+    report = _geocoder(store, lookup).geocode_many(["Foutstraat 1", "Dam 1, Amsterdam, NL"])
+    assert (report["found"], report["failed"]) == (1, 1)
+    assert store.get("Foutstraat 1") is None  # niet opgeslagen: volgende run opnieuw
+
+
+def test_nominatim_maps_4xx_to_geocode_error(monkeypatch):
+    backend = NominatimBackend(url="http://127.0.0.1:9/search")
+    session = types.SimpleNamespace(get=lambda *a, **kw: types.SimpleNamespace(status_code=403))
+    monkeypatch.setattr(backend, "_session", lambda: session)
+    with pytest.raises(GeocodeError):
+        backend.geocode("Dam 1, Amsterdam, NL")
+
+
+def _backend_returning(monkeypatch, json_fn):
+    backend = NominatimBackend(url="http://127.0.0.1:9/search")
+    response = types.SimpleNamespace(status_code=200, json=json_fn)
+    session = types.SimpleNamespace(get=lambda *a, **kw: response)
+    monkeypatch.setattr(backend, "_session", lambda: session)
+    return backend
+
+
+def test_nominatim_non_json_body_is_transient(monkeypatch):
+    def html():
+        raise ValueError("Expecting value: line 1 column 1 (char 0)")
+
+    with pytest.raises(GeocodeTransientError):
+        _backend_returning(monkeypatch, html).geocode("Dam 1, Amsterdam, NL")
+
+
+@pytest.mark.parametrize("data", [{"error": "x"}, [{"lon": "4.9"}], [{"lat": "n/a", "lon": "4.9"}], ["x"]])
+def test_nominatim_unexpected_shape_is_geocode_error(monkeypatch, data):
+    with pytest.raises(GeocodeError):
+        _backend_returning(monkeypatch, lambda: data).geocode("Dam 1, Amsterdam, NL")
+
+
+def test_bad_body_fails_one_address_and_batch_continues(store, monkeypatch):
+    backend = _backend_returning(monkeypatch, lambda: {"error": "x"})
+    geocoder = BatchGeocoder(backend, store, rate=1000, workers=2, backoff_base=0)
+    report = geocoder.geocode_many(["Dam 1, Amsterdam, NL", "Singel 460, Amsterdam, NL"])
+    assert report["failed"] == 2 and report["looked_up"] == 2
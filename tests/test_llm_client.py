@@ -0,0 +1,265 @@
+import asyncio
+import types
+
+import openai
+import pytest
+
+import llm_client
+import route_brain
+from llm_client import CircuitBreaker, LLMClientManager, LLMConfigError, LLMUnavailableError
+from metrics import FALLBACKS
+
+
+class FakeClock:
+    def __init__(self):
+        self.t = 0.0
+
+    def __call__(self):
+        return self.t
+
+
+def _half_open_breaker():
+    clock = FakeClock()
+    breaker = CircuitBreaker(threshold=2, reset_timeout=10, clock=clock)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    clock.t = 10
+    assert breaker.state == "half-open"
+    return breaker, clock
+
+
+def _connection_error():
+    # request is alleen voor de foutmelding; None houdt de test los van de httpx-versie van de SDK
+    return openai.APIConnectionError(request=None)
+
+
+def _manager(create, breaker, max_retries=0):
+    m = LLMClientManager(api_key="test", max_retries=max_retries, backoff_base=0, breaker=breaker)
+    completions = types.SimpleNamespace(create=create)
+    m._client = m._async_client = types.SimpleNamespace(chat=types.SimpleNamespace(completions=completions))
+    return m
+
+
+# -------------------------------------------------
+# Breaker-toestanden
+# -------------------------------------------------
+def test_breaker_opens_after_threshold_and_rejects():
+    breaker = CircuitBreaker(threshold=3, reset_timeout=10, clock=FakeClock())
+    for _ in range(2):
+        breaker.record_failure()
+        assert breaker.allow() is True
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert breaker.allow() is False
+    assert breaker.rejected_count == 1
+
+
+def test_half_open_allows_exactly_one_probe():
+    breaker, _ = _half_open_breaker()
+    assert breaker.allow() == "probe"
+    assert breaker.allow() is False
+
+
+def test_probe_success_closes_and_failure_reopens():
+    breaker, clock = _half_open_breaker()
+    assert breaker.allow() == "probe"
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert breaker.opened_count == 2
+
+    clock.t = 20
+    assert breaker.allow() == "probe"
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.allow() is True
+
+
+def test_success_resets_failure_count():
+    breaker = CircuitBreaker(threshold=2, reset_timeout=10, clock=FakeClock())
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+
+
+# -------------------------------------------------
+# Manager + breaker
+# -------------------------------------------------
+def test_cancelled_async_probe_releases_breaker():
+    breaker, _ = _half_open_breaker()
+
+    async def hang(**kwargs):
+        await asyncio.sleep(60)
+
+    m = _manager(hang, breaker)
+
+    async def run():
+        task = asyncio.ensure_future(m.chat_completion_async([{"role": "user", "content": "x"}]))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+    # Geannuleerde probe zegt niets over upstream: breaker blijft half-open, nieuwe probe mag
+    assert breaker.state == "half-open"
+    assert breaker.allow() == "probe"
+
+
+def test_interrupted_sync_probe_releases_breaker():
+    breaker, _ = _half_open_breaker()
+
+    def interrupt(**kwargs):
+        raise KeyboardInterrupt
+
+    m = _manager(interrupt, breaker)
+    with pytest.raises(KeyboardInterrupt):
+        m.chat_completion([{"role": "user", "content": "x"}])
+    assert breaker.allow() == "probe"
+
+
+def test_retries_exhausted_opens_breaker():
+    breaker = CircuitBreaker(threshold=1, reset_timeout=10, clock=FakeClock())
+
+    def fail(**kwargs):
+        raise _connection_error()
+
+    m = _manager(fail, breaker, max_retries=2)
+    with pytest.raises(LLMUnavailableError):
+        m.chat_completion([{"role": "user", "content": "x"}])
+    assert m.retries == 2 and m.failures == 1
+    assert breaker.state == "open"
+    with pytest.raises(LLMUnavailableError):
+        m.chat_completion([{"role": "user", "content": "x"}])
+
+
+def test_non_transient_error_is_not_a_breaker_failure():
+    breaker = CircuitBreaker(threshold=1, reset_timeout=10, clock=FakeClock())
+
+    def bad_request(**kwargs):
+        raise ValueError("400")
+
+    m = _manager(bad_request, breaker)
+    with pytest.raises(ValueError):
+        m.chat_completion([{"role": "user", "content": "x"}])
+    assert breaker.state == "closed"
+
+
+# -------------------------------------------------
+# Retry-budget vs speculatieve deadline
+# -------------------------------------------------
+def test_worst_case_covers_all_attempts_and_backoff():
+    from llm_client import worst_case_seconds
+    assert worst_case_seconds(max_retries=2, connect_timeout=5, read_timeout=30,
+                              backoff_base=0.5, backoff_max=8) == pytest.approx(106.5)
+    assert worst_case_seconds(max_retries=0, connect_timeout=1, read_timeout=2) == pytest.approx(3)
+
+
+def test_speculative_deadline_not_shorter_than_one_retried_call():
+    import route_brain
+    from llm_client import LLM_WORST_CASE_S
+    assert route_brain.LLM_DEADLINE_S >= LLM_WORST_CASE_S
+
+
+# -------------------------------------------------
+# Configuratie: ontbrekende/geweigerde key -> lokale solver, geen 1-bus-fallback
+# -------------------------------------------------
+LLM_REQUEST = {"date": "2025-03-18", "buses": ["Ocho", "Rebel"], "max_stops_per_bus": 18, "engine": "llm",
+               "stops": [{"address": "Dam 1, Amsterdam, NL"}, {"address": "Singel 460, Amsterdam, NL"}]}
+
+
+@pytest.fixture
+def no_api_key(monkeypatch):
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    monkeypatch.setattr(llm_client, "_MANAGER", None)
+
+
+def _planned(result):
+    return sorted(a for stops in result["bus_routes"].values() for a in stops)
+
+
+def test_missing_key_falls_back_to_local_solver(no_api_key):
+    before = FALLBACKS.value(engine="llm", reason="llm_not_configured")
+    result = route_brain.optimize_route(dict(LLM_REQUEST), use_cache=False)
+    assert _planned(result) == sorted(s["address"] for s in LLM_REQUEST["stops"])
+    assert "API Error Fallback" not in str(result)
+    assert FALLBACKS.value(engine="llm", reason="llm_not_configured") == before + 1
+
+
+def test_missing_key_falls_back_to_local_solver_async(no_api_key):
+    result = asyncio.run(route_brain.optimize_route_async(dict(LLM_REQUEST), use_cache=False))
+    assert _planned(result) == sorted(s["address"] for s in LLM_REQUEST["stops"])
+
+
+def test_rejected_key_is_a_config_error_not_a_breaker_failure():
+    response = types.SimpleNamespace(status_code=401, headers={}, request=None)
+
+    def create(**kwargs):
+        raise openai.AuthenticationError("Incorrect API key", response=response, body=None)
+
+    breaker = CircuitBreaker(threshold=1, reset_timeout=10, clock=FakeClock())
+    m = _manager(create, breaker, max_retries=3)
+    with pytest.raises(LLMConfigError):
+        m.chat_completion(messages=[])
+    assert m.retries == 0
+    assert breaker.state == "closed"
+
+
+def test_check_config_requires_key(monkeypatch):
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    with pytest.raises(LLMConfigError):
+        llm_client.check_config()
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    llm_client.check_config()
+
+
+def test_call_counters_are_exact_under_threads():
+    from concurrent.futures import ThreadPoolExecutor
+
+    m = _manager(lambda **kwargs: "ok", CircuitBreaker(threshold=5, reset_timeout=10, clock=FakeClock()))
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda _: m.chat_completion(messages=[]), range(2000)))
+    assert m.calls == 2000
+
+
+# -------------------------------------------------
+# Afsluiten
+# -------------------------------------------------
+def test_aclose_closes_the_async_client():
+    m = LLMClientManager(api_key="test", base_url="http://127.0.0.1:9/v1")
+
+    async def run():
+        client = m.async_client
+        await m.aclose()
+        return client
+
+    client = asyncio.run(run())
+    assert client.is_closed()
+    assert m._async_client is None
+    asyncio.run(m.aclose())  # tweede keer: niets meer te sluiten
+
+
+def test_lifespan_shutdown_closes_the_shared_async_client(monkeypatch):
+    monkeypatch.setenv("WARM_STARTUP", "0")
+    import server_async
+    monkeypatch.setattr(server_async, "WARM_STARTUP", False)  # geen warm-up-thread in deze test
+    m = LLMClientManager(api_key="test", base_url="http://127.0.0.1:9/v1")
+    monkeypatch.setattr(llm_client, "_MANAGER", m)
+    messages = iter([{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}])
+    sent = []
+
+    async def receive():
+        return next(messages)
+
+    async def send(message):
+        sent.append(message["type"])
+
+    async def run():
+        client = m.async_client
+        await server_async.app({"type": "lifespan"}, receive, send)
+        return client
+
+    client = asyncio.run(run())
+    assert sent == ["lifespan.startup.complete", "lifespan.shutdown.complete"]
+    assert client.is_closed()
@@ -0,0 +1,36 @@
+import time
+
+import route_brain
+from metrics import CounterMetric, REGISTRY, collect_spans, span
+
+
+def _counter(name):
+    metric = CounterMetric(name, "test", ["reason"])
+    REGISTRY.remove(metric)
+    return metric
+
+
+def test_counter_type_line_matches_sample_name():
+    metric = _counter("routebot_test_events")
+    metric.inc(reason="a")
+    lines = metric.render()
+    assert lines[1] == "# TYPE routebot_test_events_total counter"
+    assert lines[2] == 'routebot_test_events_total{reason="a"} 1'
+
+
+def test_counter_name_with_total_is_not_doubled():
+    assert _counter("routebot_test_hits_total").name == "routebot_test_hits_total"
+
+
+def test_spans_include_speculative_candidate_threads(monkeypatch):
+    def fake_complete(messages, legend=None):
+        with span("llm_call"):
+            time.sleep(0.01)
+        return {"bus_routes": {"Ocho": ["Dam 1, Amsterdam, NL"], "Rebel": []}}
+
+    monkeypatch.setattr(route_brain, "_complete", fake_complete)
+    monkeypatch.setattr(route_brain, "_llm_messages", lambda prompt: [])
+    new_request = {"date": "2025-03-18", "buses": ["Ocho", "Rebel"], "stops": [{"address": "Dam 1, Amsterdam, NL"}]}
+    with collect_spans() as spans:
+        route_brain.call_llm_speculative("prompt", new_request, n=2, deadline=5)
+    assert spans.get("llm_call", 0) >= 0.01
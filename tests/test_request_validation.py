@@ -0,0 +1,59 @@
+import threading
+
+import pytest
+
+from route_brain import validate_request, optimize_routes
+from travel_times import parse_hhmm, TravelTimes
+
+REQUEST = {"date": "2025-03-18", "buses": ["Ocho", "Rebel"], "max_stops_per_bus": 18, "engine": "local",
+           "stops": [{"address": "Dam 1, Amsterdam, NL"}, {"address": "Singel 460, Amsterdam, NL"}]}
+
+
+@pytest.mark.parametrize("value, seconds", [("08:00", 8 * 3600), ("7:05", 7 * 3600 + 300), ("23:59:30", 86340)])
+def test_parse_hhmm_valid(value, seconds):
+    assert parse_hhmm(value) == seconds
+
+
+@pytest.mark.parametrize("value", ["8", "08h00", "24:00", "08:60", "", "ochtend"])
+def test_parse_hhmm_invalid(value):
+    with pytest.raises(ValueError):
+        parse_hhmm(value)
+
+
+def test_validate_request_start_time():
+    validate_request(dict(REQUEST, start_time="07:30"))
+    validate_request(dict(REQUEST, start_time=None))
+    with pytest.raises(ValueError, match="start_time"):
+        validate_request(dict(REQUEST, start_time="8"))
+
+
+def test_optimize_route_endpoint_returns_400_for_bad_start_time(monkeypatch):
+    monkeypatch.setenv("WARM_STARTUP", "0")
+    import server
+    client = server.app.test_client()
+    r = client.post("/optimize-route", json=dict(REQUEST, start_time="08h00"))
+    assert r.status_code == 400 and "start_time" in r.get_json()["error"]
+    assert client.post("/optimize-route", json=dict(REQUEST, start_time="08:00")).status_code == 200
+
+
+def test_batch_reports_invalid_day_without_failing_the_rest():
+    results = optimize_routes([dict(REQUEST, start_time="8"), dict(REQUEST)])
+    assert results[0]["status"] == "error" and "start_time" in results[0]["error"]
+    assert results[1]["status"] == "ok"
+
+
+def test_travel_time_stats_are_complete_under_threads():
+    tt = TravelTimes()
+    addresses = ["Dam 1, Amsterdam, NL", "Singel 460, Amsterdam, NL", "Willemstraat 9, Utrecht, NL"]
+    n_threads, n_calls = 8, 50
+
+    def work():
+        for _ in range(n_calls):
+            tt.durations(addresses)
+
+    threads = [threading.Thread(target=work) for _ in range(n_threads)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sum(tt.stats.values()) == n_threads * n_calls * 6
@@ -0,0 +1,151 @@
+import asyncio
+import types
+
+import pytest
+
+import route_brain
+from llm_client import LLMUnavailableError
+from route_cache import ResultCache, canonical_key
+
+REQUEST = {"date": "2025-03-18", "buses": ["Ocho", "Rebel"], "max_stops_per_bus": 18,
+           "stops": [{"address": "Dam 1, Amsterdam, NL"}, {"address": "Singel 460, Amsterdam, NL"}]}
+
+
+class FakeClock:
+    def __init__(self):
+        self.t = 0.0
+
+    def __call__(self):
+        return self.t
+
+
+# -------------------------------------------------
+# canonical_key
+# -------------------------------------------------
+def test_key_ignores_stop_order_and_extra_fields():
+    shuffled = dict(REQUEST, stops=list(reversed(REQUEST["stops"])), note="extra", client_id=7)
+    shuffled["stops"][0] = dict(shuffled["stops"][0], phone="0612345678")
+    assert canonical_key(shuffled, "local") == canonical_key(REQUEST, "local")
+
+
+def test_key_uses_weekday_not_date():
+    # 2025-03-18 en 2025-03-25 zijn allebei dinsdag
+    assert canonical_key(dict(REQUEST, date="2025-03-25"), "local") == canonical_key(REQUEST, "local")
+    assert canonical_key(dict(REQUEST, date="2025-03-19"), "local") != canonical_key(REQUEST, "local")
+
+
+def test_key_depends_on_engine_buses_limit_and_start_time():
+    base = canonical_key(REQUEST, "local")
+    assert canonical_key(REQUEST, "llm") != base
+    assert canonical_key(dict(REQUEST, buses=["Ocho"]), "local") != base
+    assert canonical_key(dict(REQUEST, max_stops_per_bus=10), "local") != base
+    assert canonical_key(dict(REQUEST, start_time="09:00"), "local") != base
+
+
+# -------------------------------------------------
+# ResultCache
+# -------------------------------------------------
+def test_entries_expire_after_ttl():
+    clock = FakeClock()
+    cache = ResultCache(maxsize=4, ttl=10, clock=clock)
+    cache.put("a", {"v": 1})
+    clock.t = 9.9
+    assert cache.get("a") == {"v": 1}
+    clock.t = 10
+    assert cache.get("a") is None
+    assert (cache.hits, cache.misses, cache.stats()["size"]) == (1, 1, 0)
+
+
+def test_lru_evicts_least_recently_used():
+    cache = ResultCache(maxsize=2, ttl=60, clock=FakeClock())
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1  # a is nu het recentst gebruikt
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert cache.evictions == 1
+
+
+def test_cached_values_are_isolated_copies():
+    cache = ResultCache(maxsize=2, ttl=60, clock=FakeClock())
+    value = {"bus_routes": {"Ocho": ["A"]}}
+    cache.put("a", value)
+    value["bus_routes"]["Ocho"].append("B")
+    hit = cache.get("a")
+    assert hit == {"bus_routes": {"Ocho": ["A"]}}
+    hit["bus_routes"]["Ocho"].append("C")
+    assert cache.get("a") == {"bus_routes": {"Ocho": ["A"]}}
+
+
+def test_sqlite_entries_survive_a_new_cache(tmp_path):
+    path = tmp_path / "cache.sqlite"
+    ResultCache(maxsize=2, ttl=60, path=path).put("a", {"v": 1})
+    cache = ResultCache(maxsize=2, ttl=60, path=path)
+    assert cache.get("a") == {"v": 1}
+    assert cache.stats()["size"] == 1
+
+
+# -------------------------------------------------
+# optimize_route: fallbacks niet cachen
+# -------------------------------------------------
+LLM_REQUEST = dict(REQUEST, engine="llm")
+GOOD_ANSWER = '{"bus_routes": {"Ocho": [1, 2], "Rebel": []}}'
+
+
+class FakeLLM:
+    """chat_completion volgens een script: een exceptie of de tekst van het antwoord."""
+
+    def __init__(self, *script):
+        self.script = list(script)
+        self.calls = 0
+
+    def _next(self):
+        self.calls += 1
+        item = self.script.pop(0)
+        if isinstance(item, Exception):
+            raise item
+        message = types.SimpleNamespace(content=item)
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)])
+
+    def chat_completion(self, **kwargs):
+        return self._next()
+
+    async def chat_completion_async(self, **kwargs):
+        return self._next()
+
+
+@pytest.fixture
+def fresh_cache(monkeypatch):
+    cache = ResultCache(maxsize=8, ttl=3600)
+    monkeypatch.setattr(route_brain, "get_result_cache", lambda: cache)
+    monkeypatch.setattr(route_brain, "LLM_CANDIDATES", 1)
+    return cache
+
+
+def _use(monkeypatch, llm):
+    monkeypatch.setattr(route_brain, "get_llm_client", lambda: llm)
+    return llm
+
+
+@pytest.mark.parametrize("error", [RuntimeError("HTTP 400"), LLMUnavailableError("breaker open")],
+                         ids=["api_error", "llm_unavailable"])
+def test_fallback_result_is_not_cached(fresh_cache, monkeypatch, error):
+    llm = _use(monkeypatch, FakeLLM(error, GOOD_ANSWER, GOOD_ANSWER))
+    route_brain.optimize_route(dict(LLM_REQUEST))
+    assert fresh_cache.stats()["size"] == 0
+
+    result = route_brain.optimize_route(dict(LLM_REQUEST))
+    assert llm.calls == 2
+    assert "API Error Fallback" not in str(result)
+    # Geldig resultaat wel: de derde aanvraag komt uit de cache
+    route_brain.optimize_route(dict(LLM_REQUEST))
+    assert llm.calls == 2
+
+
+def test_parse_error_result_is_not_cached_async(fresh_cache, monkeypatch):
+    llm = _use(monkeypatch, FakeLLM("geen json", GOOD_ANSWER))
+    asyncio.run(route_brain.optimize_route_async(dict(LLM_REQUEST)))
+    asyncio.run(route_brain.optimize_route_async(dict(LLM_REQUEST)))
+    assert llm.calls == 2
+    assert fresh_cache.stats()["size"] == 1
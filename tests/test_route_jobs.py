@@ -0,0 +1,139 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import route_jobs
+from route_jobs import JobQueue, JobQueueFull
+
+REQUEST = {"date": "2025-03-18", "buses": ["Ocho", "Rebel"], "max_stops_per_bus": 18,
+           "stops": [{"address": "Dam 1, Amsterdam, NL"}]}
+
+
+def _wait(queue, job_id, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = queue.get(job_id)
+        if job["status"] in route_jobs.FINISHED:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} niet klaar")
+
+
+def _queue(optimize, cached=lambda r, engine=None: None, **kwargs):
+    return JobQueue(optimize=optimize, cached=cached, **kwargs)
+
+
+def test_lifecycle_queued_running_done_with_timings():
+    release = threading.Event()
+
+    def optimize(request, engine=None):
+        release.wait(5)
+        return {"bus_routes": {"Ocho": ["Dam 1, Amsterdam, NL"]}}
+
+    q = _queue(optimize, workers=1)
+    job = q.submit(dict(REQUEST))
+    assert job["status"] == "queued" and "result" not in job
+    time.sleep(0.05)
+    assert q.get(job["job_id"])["status"] == "running"
+    release.set()
+
+    done = _wait(q, job["job_id"])
+    assert done["result"] == {"bus_routes": {"Ocho": ["Dam 1, Amsterdam, NL"]}}
+    assert "error" not in done
+    t = done["timings"]
+    assert t["queue_ms"] >= 0 and t["run_ms"] >= 40 and t["total_ms"] >= t["run_ms"]
+    assert q.stats()["pending"] == 0
+
+
+def test_failed_job_reports_error():
+    def optimize(request, engine=None):
+        raise RuntimeError("kapot")
+
+    q = _queue(optimize)
+    job = _wait(q, q.submit(dict(REQUEST))["job_id"])
+    assert job["status"] == "error" and job["error"] == "kapot" and "result" not in job
+
+
+def test_cache_hit_is_done_without_queueing():
+    calls = []
+    q = _queue(lambda r, engine=None: calls.append(r), cached=lambda r, engine=None: {"bus_routes": {}})
+    job = q.submit(dict(REQUEST))
+    assert job["status"] == "done" and job["result"] == {"bus_routes": {}}
+    assert job["timings"]["queue_ms"] == 0.0
+    assert calls == [] and q.stats()["pending"] == 0
+
+
+def test_invalid_request_raises_before_a_job_exists():
+    from route_brain import cached_route
+    q = _queue(lambda r, engine=None: {}, cached=cached_route)
+    for bad in ({"stops": []}, {"date": "18-03-2025", "stops": []}, {"date": "2025-03-18"},
+                {"date": "2025-03-18", "stops": [{"colli": 1}]}, ["niet", "een", "object"]):
+        with pytest.raises(ValueError):
+            q.submit(bad)
+    assert q.stats()["stored"] == 0
+
+
+def test_max_pending_rejects_and_frees_up():
+    release = threading.Event()
+    q = _queue(lambda r, engine=None: release.wait(5) and {}, workers=1, max_pending=2)
+    ids = [q.submit(dict(REQUEST))["job_id"] for _ in range(2)]
+    with pytest.raises(JobQueueFull):
+        q.submit(dict(REQUEST))
+    assert q.stats()["rejected"] == 1
+    release.set()
+    for job_id in ids:
+        _wait(q, job_id)
+    assert q.submit(dict(REQUEST))["status"] == "queued"
+
+
+def test_retention_expires_finished_jobs():
+    q = _queue(lambda r, engine=None: {}, retention=0.2)
+    job_id = q.submit(dict(REQUEST))["job_id"]
+    _wait(q, job_id)
+    time.sleep(0.3)
+    assert q.get(job_id) is None
+
+
+def test_max_jobs_drops_oldest_finished_first():
+    q = _queue(lambda r, engine=None: {}, max_jobs=2)
+    ids = []
+    for _ in range(3):
+        ids.append(q.submit(dict(REQUEST))["job_id"])
+        _wait(q, ids[-1])
+    q.submit(dict(REQUEST))
+    assert q.get(ids[0]) is None
+    assert q.get(ids[2]) is not None
+
+
+def test_sqlite_store_shares_status_between_queues(tmp_path):
+    path = tmp_path / "jobs.sqlite"
+    a = _queue(lambda r, engine=None: {"ok": 1}, path=path)
+    b = _queue(lambda r, engine=None: {}, path=path)
+    job_id = a.submit(dict(REQUEST))["job_id"]
+    _wait(a, job_id)
+    assert b.get(job_id)["result"] == {"ok": 1}
+
+
+def test_get_job_queue_creates_one_queue_under_concurrency(monkeypatch):
+    monkeypatch.setattr(route_jobs, "_JOB_QUEUE", None)
+    created = []
+
+    class SlowQueue:
+        def __init__(self, path=None):
+            time.sleep(0.05)
+            created.append(self)
+
+    monkeypatch.setattr(route_jobs, "JobQueue", SlowQueue)
+    with ThreadPoolExecutor(8) as ex:
+        queues = list(ex.map(lambda _: route_jobs.get_job_queue(), range(8)))
+    assert len(created) == 1 and all(q is created[0] for q in queues)
+
+
+def test_submit_endpoint_returns_400_without_date(monkeypatch):
+    monkeypatch.setenv("WARM_STARTUP", "0")
+    import server
+    r = server.app.test_client().post("/optimize-route/jobs", json={"stops": []})
+    assert r.status_code == 400
+    assert "date" in r.get_json()["error"]
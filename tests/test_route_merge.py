@@ -0,0 +1,74 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+import route_merge
+
+
+def test_watermark_for_legs_without_bus_is_found_again(tmp_path):
+    legs = pd.DataFrame({"date": ["2025-03-10", "2025-03-11"], "bus_name": [None, None], "leg": [1, 1]})
+    manifest = {"watermarks": {}}
+    route_merge.merge_legs(legs, manifest, tmp_path)
+    assert manifest["watermarks"] == {route_merge.NO_BUS: "2025-03-11"}
+
+    raw = pd.DataFrame({"Datum": ["10-03-2025", "11-03-2025", "12-03-2025"],
+                        "Bestuurder": ["2 (V-435-BX)"] * 3})
+    new = route_merge._new_rows(raw, Path("export.csv"), manifest["watermarks"])
+    assert list(new["Datum"]) == ["11-03-2025", "12-03-2025"]
+
+
+def test_bus_from_filename_shares_the_watermark_key():
+    raw = pd.DataFrame({"Datum": ["10-03-2025", "12-03-2025"], "Bestuurder": ["2 (V-435-BX)"] * 2})
+    new = route_merge._new_rows(raw, Path("Ocho_export.csv"), {"Ocho": "2025-03-11"})
+    assert list(new["Datum"]) == ["12-03-2025"]
+
+
+# -------------------------------------------------
+# Kolomsgewijze parser == rij-parser
+# -------------------------------------------------
+EXPORTS = sorted((Path(route_merge.__file__).parent / "data" / "fleetgo_csv").glob("*.csv"))
+
+
+@pytest.mark.parametrize("csv_path", EXPORTS, ids=lambda p: p.name.split("_")[0])
+def test_vectorized_parser_matches_rowwise_on_exports(csv_path):
+    df = route_merge.read_csv_auto(csv_path)
+    pd.testing.assert_frame_equal(route_merge.legs_vectorized(df, csv_path), route_merge.legs_rowwise(df, csv_path))
+
+
+def test_vectorized_parser_matches_rowwise_on_edge_cases():
+    df = route_merge.read_csv_auto(EXPORTS[0]).head(8).astype(object)
+    df.loc[df.index[0], "Datum"] = ""                       # geen datum: rij valt weg
+    df.loc[df.index[1], "Rit"] = "x"                        # geen ritnummer
+    df.loc[df.index[2], "Bestuurder"] = "2 (V-435-BX)"      # geen busnaam
+    df.loc[df.index[3], "Bestuurder"] = "onbekend"          # geen bestuurder-patroon
+    df.loc[df.index[4], ["Start", "Duur"]] = ["", "nan"]
+    df.loc[df.index[5], "Totale afstand (km)"] = ""
+    df.loc[df.index[6], "Van/naar"] = "Amsterdam"           # geen "van - naar"
+    df.loc[df.index[7], "Administratie"] = float("nan")  # lege cel in de CSV
+    path = Path("export.csv")                               # geen bus in de bestandsnaam
+    pd.testing.assert_frame_equal(route_merge.legs_vectorized(df, path), route_merge.legs_rowwise(df, path))
+
+
+def test_import_does_not_probe_pyarrow():
+    # Meta-path finder die alleen noteert of pyarrow gezocht wordt (ook als het niet geïnstalleerd is);
+    # pandas zelf probeert pyarrow al bij zijn eigen import, dus die eerst
+    code = (
+        "import sys\n"
+        "import pandas\n"
+        "seen = []\n"
+        "class Spy:\n"
+        "    def find_spec(self, name, path=None, target=None):\n"
+        "        if name.split('.')[0] == 'pyarrow': seen.append(name)\n"
+        "sys.meta_path.insert(0, Spy())\n"
+        "import route_merge\n"
+        "print(len(seen))\n"
+        "route_merge.partition_path('Ocho', '2025-03')\n"
+        "print(len(seen))\n"
+    )
+    out = subprocess.run([sys.executable, "-c", code], cwd=Path(route_merge.__file__).parent,
+                         capture_output=True, text=True, check=True)
+    at_import, after_partition = map(int, out.stdout.split())
+    assert at_import == 0 and after_partition > 0
@@ -0,0 +1,18 @@
+import json
+
+from route_store import JsonlRoutes
+
+ROUTES = [{"date": "2025-03-10", "bus_routes": {"Ocho": ["A"]}}, {"date": "2025-03-11", "bus_routes": {"Rebel": ["B"]}}]
+
+
+def test_jsonl_skips_blank_lines_in_len_index_and_iteration(tmp_path):
+    path = tmp_path / "routes.jsonl"
+    path.write_text("\n" + json.dumps(ROUTES[0]) + "\n\n   \n" + json.dumps(ROUTES[1]), encoding="utf-8")
+    routes = JsonlRoutes(path)
+    try:
+        assert len(routes) == 2
+        assert list(routes) == ROUTES
+        assert [routes[i] for i in range(len(routes))] == ROUTES
+        assert routes[-1] == ROUTES[1] and routes[0:2] == ROUTES
+    finally:
+        routes.close()
@@ -0,0 +1,30 @@
+import asyncio
+import time
+
+import route_brain
+
+REQUEST = {"date": "2025-03-18", "buses": ["Ocho", "Rebel"], "max_stops_per_bus": 18, "engine": "local",
+           "stops": [{"address": "Dam 1, Amsterdam, NL"}, {"address": "Singel 460, Amsterdam, NL"}]}
+
+
+def test_local_solve_does_not_block_the_event_loop(monkeypatch):
+    solve = route_brain.solve_local
+
+    def slow_solve(new_request):
+        time.sleep(0.3)  # CPU-werk dat de loop zou blokkeren
+        return solve(new_request)
+
+    monkeypatch.setattr(route_brain, "solve_local", slow_solve)
+
+    async def run():
+        ticks = 0
+        task = asyncio.ensure_future(route_brain.optimize_route_async(dict(REQUEST), use_cache=False))
+        while not task.done():
+            await asyncio.sleep(0.01)
+            ticks += 1
+        return task.result(), ticks
+
+    result, ticks = asyncio.run(run())
+    assert sorted(result["bus_routes"]["Ocho"] + result["bus_routes"]["Rebel"]) == \
+        sorted(s["address"] for s in REQUEST["stops"])
+    assert ticks >= 10  # de loop bleef draaien terwijl de solver rekende
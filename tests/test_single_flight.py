@@ -0,0 +1,125 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import route_cache
+from route_cache import SingleFlight
+
+
+# -------------------------------------------------
+# Threads: do()
+# -------------------------------------------------
+release = threading.Event()
+
+
+@pytest.fixture(autouse=True)
+def _reset_release():
+    release.clear()
+
+
+def _run_concurrently(sf, fn, n=4):
+    """n aanroepen met dezelfde key; fn blokkeert tot alle followers binnen zijn."""
+    with ThreadPoolExecutor(max_workers=n) as ex:
+        futures = [ex.submit(sf.do, "k", fn) for _ in range(n)]
+        while sf.stats()["coalesced"] < n - 1:
+            threading.Event().wait(0.001)
+        release.set()
+        return futures
+
+
+def test_concurrent_calls_compute_once_and_share_copies():
+    sf = SingleFlight()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        release.wait(5)
+        return {"bus_routes": {"Ocho": ["A"]}}
+
+    results = [f.result() for f in _run_concurrently(sf, compute)]
+    assert len(calls) == 1
+    assert sorted(leader for _, leader in results) == [False, False, False, True]
+    values = [value for value, _ in results]
+    assert all(v == {"bus_routes": {"Ocho": ["A"]}} for v in values)
+    values[0]["bus_routes"]["Ocho"].append("B")
+    assert values[1]["bus_routes"]["Ocho"] == ["A"]
+    assert sf.stats() == {"in_flight": 0, "leaders": 1, "coalesced": 3}
+
+
+def test_error_reaches_leader_and_followers():
+    sf = SingleFlight()
+
+    def compute():
+        release.wait(5)
+        raise RuntimeError("kapot")
+
+    for f in _run_concurrently(sf, compute):
+        with pytest.raises(RuntimeError, match="kapot"):
+            f.result()
+    # Key is vrijgegeven: de volgende aanroep rekent opnieuw
+    assert sf.do("k", lambda: 42) == (42, True)
+
+
+# -------------------------------------------------
+# Event loop: do_async()
+# -------------------------------------------------
+def test_async_calls_compute_once():
+    sf = SingleFlight()
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"v": 1}
+
+    async def run():
+        return await asyncio.gather(*(sf.do_async("k", compute) for _ in range(3)))
+
+    results = asyncio.run(run())
+    assert len(calls) == 1
+    assert [leader for _, leader in results] == [True, False, False]
+    assert all(value == {"v": 1} for value, _ in results)
+    assert sf.stats()["in_flight"] == 0
+
+
+def test_async_error_reaches_all_callers():
+    sf = SingleFlight()
+
+    async def compute():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("kapot")
+
+    async def run():
+        return await asyncio.gather(*(sf.do_async("k", compute) for _ in range(2)), return_exceptions=True)
+
+    assert [str(r) for r in asyncio.run(run())] == ["kapot", "kapot"]
+
+
+def test_cancelled_leader_does_not_cancel_the_computation():
+    sf = SingleFlight()
+
+    async def compute():
+        await asyncio.sleep(0.02)
+        return "klaar"
+
+    async def run():
+        leader = asyncio.ensure_future(sf.do_async("k", compute))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(sf.do_async("k", compute))
+        await asyncio.sleep(0)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    assert asyncio.run(run()) == ("klaar", False)
+    assert sf.stats()["in_flight"] == 0
+
+
+def test_get_single_flight_creates_one_instance_under_threads(monkeypatch):
+    monkeypatch.setattr(route_cache, "_SINGLE_FLIGHT", None)
+    with ThreadPoolExecutor(max_workers=8) as ex:
+        instances = set(map(id, ex.map(lambda _: route_cache.get_single_flight(), range(64))))
+    assert len(instances) == 1
@@ -0,0 +1,70 @@
+import pytest
+
+import warmup
+
+
+@pytest.fixture
+def fresh_warmup(monkeypatch):
+    monkeypatch.setattr(warmup, "_STATUS", {"state": "cold", "pid": None, "steps_ms": {}, "total_ms": None,
+                                            "error": None})
+    monkeypatch.setattr(warmup, "_READY", warmup.threading.Event())
+
+
+def test_cold_process_is_ready_for_lazy_loading(fresh_warmup):
+    assert warmup.is_ready()
+
+
+def test_successful_warm_up_is_ready(fresh_warmup, monkeypatch):
+    monkeypatch.setattr(warmup, "_steps", lambda: [("noop", lambda: None)])
+    assert warmup.warm_up()["state"] == "ready"
+    assert warmup.is_ready()
+
+
+def test_failed_warm_up_stays_unhealthy(fresh_warmup, monkeypatch):
+    def boom():
+        raise RuntimeError("kapot")
+
+    monkeypatch.setattr(warmup, "_steps", lambda: [("training", boom)])
+    status = warmup.warm_up()
+    assert status["state"] == "error" and "training" in status["error"]
+    assert not warmup.is_ready()
+
+    monkeypatch.setenv("WARM_STARTUP", "0")
+    import server
+    r = server.app.test_client().get("/health")
+    assert r.status_code == 503 and r.get_json()["status"] == "error"
+
+
+def test_failing_imports_are_reported_as_a_step(fresh_warmup, monkeypatch):
+    def broken_steps():
+        raise ImportError("No module named 'distance_matrix'")
+
+    monkeypatch.setattr(warmup, "_steps", broken_steps)
+    status = warmup.warm_up()
+    assert status["state"] == "error" and status["error"].startswith("imports:")
+    assert not warmup.is_ready()
+
+    # Ook in de achtergrond: de thread eindigt met "error", niet eeuwig "warming"
+    monkeypatch.setattr(warmup, "_STATUS", dict(status, state="cold", error=None))
+    monkeypatch.setattr(warmup, "_READY", warmup.threading.Event())
+    warmup.warm_up_background().join(5)
+    assert warmup.warm_status()["state"] == "error"
+
+
+def test_background_warm_up_is_not_ready_before_the_thread_runs(fresh_warmup, monkeypatch):
+    gate = warmup.threading.Event()
+    monkeypatch.setattr(warmup, "_steps", lambda: [("wait", gate.wait)])
+    t = warmup.warm_up_background()
+    assert not warmup.is_ready()
+    gate.set()
+    t.join(5)
+    assert warmup.is_ready()
+
+
+def test_importing_server_does_not_warm_up(fresh_warmup, monkeypatch):
+    import importlib
+    import server
+    monkeypatch.setenv("WARM_STARTUP", "1")
+    monkeypatch.setattr(warmup, "WARM_STARTUP", True)
+    importlib.reload(server)
+    assert warmup.warm_status()["state"] == "cold"
@@ -0,0 +1,327 @@
+# travel_times.py
+# Geleerde reistijden uit de historische FleetGO-legs (data/matched): per adrespaar (van -> naar)
+# de mediaan en p90 van de rijtijd en de mediaan van de afstand, plus dezelfde statistieken per
+# gebiedspaar (postcode-4 als het adres een postcode heeft, anders de stad) voor onbekende paren.
+# Paren die ook daar ontbreken vallen terug op de hemelsbrede schatting van distance_matrix.
+#
+# Layout (map data/travel_times/, arrays als .npy zodat np.load(mmap_mode="r") werkt):
+#   strings.json                  adressen en gebieden (positie = id)
+#   pair_key.npy     int64        (van_id << 32) | naar_id, oplopend gesorteerd
+#   pair_count.npy   int32        aantal legs per paar
+#   pair_dur.npy     float32 (k, 2) mediaan en p90 rijtijd in seconden
+#   pair_dist.npy    float32      mediaan afstand in meters
+#   area_*.npy                    zelfde, per gebiedspaar
+#   dwell_id.npy     int32        adres-id (oplopend) met een geleerde stoptijd
+#   dwell_s.npy      float32      mediaan stoptijd op dat adres (seconden)
+#   meta.json                     versie, aantallen, globale mediaan stoptijd en starttijd
+#
+# Bouwen:  python travel_times.py
+# Gebruik: from travel_times import get_travel_times; tt = get_travel_times(); tt.durations([...])
+
+import re
+import sys
+import json
+import time
+import threading
+from collections import Counter
+from pathlib import Path
+import numpy as np
+
+from distance_matrix import get_matrix, AVG_SPEED_KMH
+from route_solver import DEPOT_ADDRESS, DEPOT_COORDS, address_city, resolve_coords
+
+BASE = Path(__file__).parent
+TT_DIR = BASE / "data" / "travel_times"
+TT_VERSION = 1
+
+# Minimaal aantal legs voor een gebiedspaar (1 rit tussen 2 steden zegt weinig)
+MIN_AREA_LEGS = 3
+# Stoptijden boven deze grens zijn pauzes of einde dienst, geen afleveringen
+MAX_DWELL_S = 2 * 3600
+# Als er geen tabel is: stoptijd en starttijd van een route
+DEFAULT_DWELL_S = 600.0
+DEFAULT_START_S = 8 * 3600
+
+PAIR_ARRAYS = ("key", "count", "dur", "dist")
+
+# GLOBALE CACHE: 1 tabel per worker
+_TRAVEL_TIMES = None
+
+
+def area_of(address):
+    """Postcode-4 ('1017') als het adres een postcode heeft, anders de stad ('amsterdam')."""
+    from address_matcher import parse_address
+    pc = parse_address(address).postcode
+    return pc[:4] if pc else address_city(address)
+
+
+def _key(a, b):
+    return (np.asarray(a, dtype=np.int64) << 32) | np.asarray(b, dtype=np.int64)
+
+
+def format_hhmm(seconds):
+    m = int(round(seconds / 60.0))
+    return f"{(m // 60) % 24:02d}:{m % 60:02d}"
+
+
+_HHMM_RE = re.compile(r"^([01]?\d|2[0-3]):([0-5]\d)(?::[0-5]\d)?$")
+
+
+def parse_hhmm(value):
+    """'08:30' (of '08:30:00') -> seconden na middernacht; ValueError bij iets anders."""
+    m = _HHMM_RE.match(str(value).strip())
+    if not m:
+        raise ValueError(f"Ongeldige tijd: {value!r} (verwacht \"HH:MM\")")
+    return int(m.group(1)) * 3600 + int(m.group(2)) * 60
+
+
+# -------------------------------------------------
+# Aggregeren (offline, met pandas)
+# -------------------------------------------------
+def load_legs(files=None):
+    import pandas as pd
+    import route_merge
+    files = route_merge.iter_partitions() if files is None else files
+    cols = ["route_id", "leg", "start_s", "end_s", "duration_s", "distance_m", "from_address", "to_address"]
+    frames = [route_merge.read_partition(p)[cols] for p in files]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=cols)
+
+
+def _stats(legs, by):
+    g = legs.groupby(by, sort=False)
+    out = g["duration_s"].agg(["size", "median"])
+    out["p90"] = g["duration_s"].quantile(0.9)
+    out["dist"] = g["distance_m"].median()
+    return out.reset_index()
+
+
+def aggregate(legs):
+    """
+    legs: DataFrame met route_id, leg, start_s, end_s, duration_s, distance_m, from_address, to_address.
+    Geeft (paren, gebiedsparen, stoptijden per adres, meta) als DataFrames/dict.
+    """
+    legs = legs.sort_values(["route_id", "leg"], kind="stable")
+
+    # Stoptijd: begin volgende leg - eind van deze leg, als de volgende leg hier vertrekt
+    nxt = legs.groupby("route_id", sort=False)[["start_s", "from_address"]].shift(-1)
+    dwell = nxt["start_s"] - legs["end_s"]
+    ok = (nxt["from_address"] == legs["to_address"]) & dwell.between(0, MAX_DWELL_S)
+    dwell = legs.loc[ok, ["to_address"]].assign(dwell_s=dwell[ok])
+    first = legs.groupby("route_id", sort=False)["start_s"].first()
+
+    drive = legs[
+        legs["from_address"].notna() & legs["to_address"].notna()
+        & (legs["from_address"] != legs["to_address"]) & (legs["duration_s"] > 0)
+    ]
+    pairs = _stats(drive, ["from_address", "to_address"])
+
+    areas = {a: area_of(a) for a in set(drive["from_address"]) | set(drive["to_address"])}
+    drive = drive.assign(from_area=drive["from_address"].map(areas), to_area=drive["to_address"].map(areas))
+    area_pairs = _stats(drive, ["from_area", "to_area"])
+    area_pairs = area_pairs[area_pairs["size"] >= MIN_AREA_LEGS]
+
+    per_addr = dwell.groupby("to_address")["dwell_s"].median()
+    meta = {
+        "legs": int(len(drive)),
+        "dwell_median_s": float(dwell["dwell_s"].median()) if len(dwell) else DEFAULT_DWELL_S,
+        "start_median_s": float(first.median()) if len(first) else DEFAULT_START_S,
+    }
+    return pairs, area_pairs, per_addr, meta
+
+
+def _write_pairs(out_dir, prefix, df, ids, a_col, b_col):
+    key = _key(df[a_col].map(ids).to_numpy(), df[b_col].map(ids).to_numpy())
+    order = np.argsort(key, kind="stable")
+    np.save(out_dir / f"{prefix}_key.npy", key[order])
+    np.save(out_dir / f"{prefix}_count.npy", df["size"].to_numpy(dtype=np.int32)[order])
+    np.save(out_dir / f"{prefix}_dur.npy", df[["median", "p90"]].to_numpy(dtype=np.float32)[order])
+    np.save(out_dir / f"{prefix}_dist.npy", df["dist"].to_numpy(dtype=np.float32)[order])
+
+
+def build_table(legs, out_dir: Path = TT_DIR):
+    pairs, area_pairs, per_addr, meta = aggregate(legs)
+    strings = sorted(
+        set(pairs["from_address"]) | set(pairs["to_address"]) | set(per_addr.index)
+        | set(area_pairs["from_area"]) | set(area_pairs["to_area"])
+    )
+    ids = {s: i for i, s in enumerate(strings)}
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    (out_dir / "strings.json").write_text(json.dumps(strings, ensure_ascii=False), encoding="utf-8")
+    _write_pairs(out_dir, "pair", pairs, ids, "from_address", "to_address")
+    _write_pairs(out_dir, "area", area_pairs, ids, "from_area", "to_area")
+    dwell_id = per_addr.index.map(ids).to_numpy(dtype=np.int32)
+    order = np.argsort(dwell_id)
+    np.save(out_dir / "dwell_id.npy", dwell_id[order])
+    np.save(out_dir / "dwell_s.npy", per_addr.to_numpy(dtype=np.float32)[order])
+
+    meta.update({"version": TT_VERSION, "pairs": int(len(pairs)), "area_pairs": int(len(area_pairs)),
+                 "strings": len(strings)})
+    (out_dir / "meta.json").write_text(json.dumps(meta), encoding="utf-8")
+    return meta
+
+
+# -------------------------------------------------
+# Lezen
+# -------------------------------------------------
+class _PairTable:
+    def __init__(self, key, count, dur, dist):
+        self.key, self.count, self.dur, self.dist = key, count, dur, dist
+
+    @classmethod
+    def empty(cls):
+        return cls(np.empty(0, np.int64), np.empty(0, np.int32), np.empty((0, 2), np.float32),
+                   np.empty(0, np.float32))
+
+    def find(self, keys):
+        """Rij-index per key, -1 als het paar niet in de tabel staat."""
+        keys = np.asarray(keys, dtype=np.int64)
+        if not len(self.key):
+            return np.full(keys.shape, -1)
+        pos = np.minimum(np.searchsorted(self.key, keys), len(self.key) - 1)
+        return np.where(self.key[pos] == keys, pos, -1)
+
+
+class TravelTimes:
+    """
+    Reistijden tussen adressen. durations()/distances() geven (n, n) matrices in dezelfde
+    volgorde als de adressen; bron per cel: geleerd paar, gebiedspaar of hemelsbrede schatting.
+    """
+
+    def __init__(self, strings=(), pairs=None, areas=None, dwell_id=None, dwell_s=None, meta=None):
+        self.strings = list(strings)
+        self.ids = {s: i for i, s in enumerate(self.strings)}
+        self.pairs = pairs or _PairTable.empty()
+        self.areas = areas or _PairTable.empty()
+        self.dwell = dict(zip(np.asarray(dwell_id if dwell_id is not None else [], dtype=np.int64).tolist(),
+                              np.asarray(dwell_s if dwell_s is not None else [], dtype=np.float64).tolist()))
+        self.meta = meta or {}
+        self.stats = Counter()
+        self._stats_lock = threading.Lock()  # durations() draait ook vanuit de batch-threads
+
+    @classmethod
+    def load(cls, tt_dir: Path = TT_DIR):
+        tt_dir = Path(tt_dir)
+        meta = json.loads((tt_dir / "meta.json").read_text(encoding="utf-8"))
+        if meta.get("version") != TT_VERSION:
+            raise ValueError(f"Onbekende travel_times-versie: {meta.get('version')}")
+        strings = json.loads((tt_dir / "strings.json").read_text(encoding="utf-8"))
+
+        def table(prefix):
+            return _PairTable(*(np.load(tt_dir / f"{prefix}_{n}.npy", mmap_mode="r") for n in PAIR_ARRAYS))
+
+        return cls(strings, table("pair"), table("area"), np.load(tt_dir / "dwell_id.npy"),
+                   np.load(tt_dir / "dwell_s.npy"), meta)
+
+    @staticmethod
+    def exists(tt_dir: Path = TT_DIR):
+        return (Path(tt_dir) / "meta.json").exists()
+
+    def __len__(self):
+        return len(self.pairs.key)
+
+    def _ids(self, names):
+        return np.array([self.ids.get(s, -1) for s in names], dtype=np.int64)
+
+    def _lookup(self, addresses):
+        """(duur (n, n, 2), afstand (n, n), bron (n, n): 2 = paar, 1 = gebied, 0 = schatting)."""
+        n = len(addresses)
+        dur = np.zeros((n, n, 2))
+        dist = np.zeros((n, n))
+        source = np.zeros((n, n), dtype=np.int8)
+        names = np.array(addresses, dtype=object)
+        todo = names[:, None] != names[None, :]  # zelfde adres (bv. depot 2x): 0 s
+
+        for level, table, labels in ((2, self.pairs, addresses), (1, self.areas, [area_of(a) for a in addresses])):
+            ids = self._ids(labels)
+            known = (ids[:, None] >= 0) & (ids[None, :] >= 0) & todo
+            if not known.any():
+                continue
+            rows = np.full((n, n), -1)
+            rows[known] = table.find(_key(np.broadcast_to(ids[:, None], (n, n))[known],
+                                          np.broadcast_to(ids[None, :], (n, n))[known]))
+            hit = rows >= 0
+            dur[hit] = table.dur[rows[hit]]
+            dist[hit] = table.dist[rows[hit]]
+            source[hit] = level
+            todo &= ~hit
+
+        if todo.any():
+            fallback = resolve_coords(addresses)
+            matrix = get_matrix()
+            if DEPOT_ADDRESS in fallback and DEPOT_ADDRESS not in matrix:
+                fallback[DEPOT_ADDRESS] = DEPOT_COORDS
+            km = matrix.submatrix(list(addresses), fallback_coords=fallback)
+            est = km / AVG_SPEED_KMH * 3600.0
+            dur[todo, 0] = dur[todo, 1] = est[todo]
+            dist[todo] = km[todo] * 1000.0
+
+        off = names[:, None] != names[None, :]
+        counts = {"pair": int((source[off] == 2).sum()), "area": int((source[off] == 1).sum()),
+                  "estimate": int((source[off] == 0).sum())}
+        with self._stats_lock:
+            self.stats.update(counts)
+        return dur, dist, source
+
+    def durations(self, addresses, p90: bool = False):
+        """(n, n) rijtijd in seconden (mediaan, of p90)."""
+        return self._lookup(addresses)[0][:, :, 1 if p90 else 0]
+
+    def distances(self, addresses):
+        """(n, n) afstand in meters."""
+        return self._lookup(addresses)[1]
+
+    def dwell_s(self, address):
+        """Geleerde stoptijd op een adres (mediaan), anders de globale mediaan."""
+        i = self.ids.get(address)
+        if i is not None and i in self.dwell:
+            return self.dwell[i]
+        return self.meta.get("dwell_median_s", DEFAULT_DWELL_S)
+
+    def route_timing(self, addresses, start=DEPOT_ADDRESS, start_s=None, return_to_depot: bool = True):
+        """
+        ETA per stop voor een rit in de gegeven volgorde vanaf het depot.
+        Geeft {"eta": ["HH:MM", ...], "duration_s", "drive_s", "dwell_s"} terug.
+        """
+        if start_s is None:
+            start_s = self.meta.get("start_median_s", DEFAULT_START_S)
+        points = [start] + list(addresses)
+        dur = self.durations(points)
+        t, drive, dwell, eta = float(start_s), 0.0, 0.0, []
+        prev = 0
+        for i in range(1, len(points)):
+            leg = dur[prev, i]
+            t += leg
+            drive += leg
+            eta.append(format_hhmm(t))
+            if points[i] != start:
+                d = self.dwell_s(points[i])
+                t += d
+                dwell += d
+            prev = i
+        if return_to_depot and len(points) > 1:
+            drive += dur[prev, 0]
+            t += dur[prev, 0]
+        return {"eta": eta, "duration_s": t - start_s, "drive_s": drive, "dwell_s": dwell}
+
+
+def get_travel_times():
+    """Tabel voor de request-path (1x geladen); zonder gebouwde tabel alleen hemelsbrede schattingen."""
+    global _TRAVEL_TIMES
+    if _TRAVEL_TIMES is None:
+        _TRAVEL_TIMES = TravelTimes.load(TT_DIR) if TravelTimes.exists(TT_DIR) else TravelTimes()
+    return _TRAVEL_TIMES
+
+
+def main(argv=None):
+    t = time.perf_counter()
+    legs = load_legs()
+    print(f"Legs: {len(legs)} uit data/matched")
+    meta = build_table(legs, TT_DIR)
+    print(f"Adresparen: {meta['pairs']}, gebiedsparen: {meta['area_pairs']}, "
+          f"stoptijd mediaan {meta['dwell_median_s'] / 60:.1f} min, start mediaan {format_hhmm(meta['start_median_s'])}")
+    print(f"Geschreven naar: {TT_DIR} ({time.perf_counter() - t:.2f} s)")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,118 @@
+# warmup.py
+# Warme start: alle data voor de request-path 1x laden vóórdat er requests binnenkomen.
+# Met gunicorn --preload gebeurt dit in de master (when_ready in gunicorn.conf.py), vóór de fork:
+# de workers erven dan dezelfde pages (copy-on-write) i.p.v. elk een eigen kopie te laden.
+# Verder alleen vanuit `python server.py` en de lifespan van server_async; `import server`
+# (tests, bench, flask run) warmt niet op en laadt lazy.
+#
+# Configuratie via environment (Railway Variables):
+#   WARM_STARTUP   1 = opwarmen bij het starten (standaard), 0 = lazy laden bij het eerste request
+#
+# /health geeft 503 ("warming") tot warm_up() klaar is, zodat Railway pas verkeer stuurt
+# als de eerste request niet meer de hele trainingsdata hoeft te laden. Mislukt een stap,
+# dan blijft /health 503 ("error", met de fout) en wordt de deploy niet gezond.
+#
+# Bewust NIET opgewarmd: de LLM-client (HTTP-pool) en de resultaat-cache (SQLite): die horen
+# per proces, dus na de fork, en worden bij het eerste gebruik aangemaakt. Alleen de imports
+# van de OpenAI-SDK worden vooraf gedaan.
+
+import os
+import time
+import threading
+
+WARM_STARTUP = os.environ.get("WARM_STARTUP", "1") == "1"
+
+_LOCK = threading.Lock()
+_READY = threading.Event()
+_STATUS = {"state": "cold", "pid": None, "steps_ms": {}, "total_ms": None, "error": None}
+
+
+def _steps():
+    """(naam, functie) in volgorde; imports hier zodat `import warmup` zelf licht blijft."""
+    from route_brain import get_example_index, TRAINING_JSON, DEFAULT_ENGINE
+    from llm_client import check_config
+    from distance_matrix import get_matrix
+    from route_solver import load_coords, resolve_coords, DEPOT_ADDRESS
+    from route_sequencer import sequence_stops
+    from travel_times import get_travel_times
+
+    def llm_sdk():
+        # De OpenAI-SDK importeert zijn resources pas bij de eerste client (~0.13 s). Een wegwerp-client
+        # zonder netwerk haalt die imports naar voren; de echte client blijft per proces (llm_client.py).
+        import openai
+        client = openai.OpenAI(api_key="warm-up", base_url="http://127.0.0.1:9/v1")
+        client.chat.completions
+        client.close()
+
+    def sequencer():
+        # Eén kleine rit: raakt submatrix, fallback-coördinaten en reistijden 1x aan
+        sequence_stops([DEPOT_ADDRESS, "Dam 1, Amsterdam, NL"], time_budget_s=0.01)
+
+    def llm_config():
+        # ROUTE_ENGINE=llm zonder API key: warm-up faalt (en /health meldt het) i.p.v. stil lokaal rekenen
+        if DEFAULT_ENGINE == "llm":
+            check_config()
+
+    return [
+        ("training", lambda: get_example_index(TRAINING_JSON)),
+        ("distance_matrix", get_matrix),
+        ("coords", lambda: resolve_coords([DEPOT_ADDRESS], load_coords())),
+        ("travel_times", get_travel_times),
+        ("sequencer", sequencer),
+        ("llm_sdk", llm_sdk),
+        ("llm_config", llm_config),  # als laatste: de data is dan toch geladen
+    ]
+
+
+def warm_up():
+    """
+    Laad trainingsdata + voorbeeld-index, afstandsmatrix, coördinaten (klanten + geocode-cache)
+    en reistijden. Idempotent: een tweede aanroep doet niets. Geeft warm_status() terug.
+    """
+    with _LOCK:
+        if _READY.is_set():
+            return warm_status()
+        _STATUS.update(state="warming", pid=os.getpid(), error=None)
+        t0 = time.perf_counter()
+        name = "imports"  # _steps() importeert eerst de modules; een ImportError hoort bij die stap
+        try:
+            for name, fn in _steps():
+                t = time.perf_counter()
+                fn()
+                _STATUS["steps_ms"][name] = round((time.perf_counter() - t) * 1000, 1)
+        except Exception as e:
+            # Requests laden alsnog lazy, maar /health blijft 503 met de fout (zie is_ready)
+            _STATUS.update(state="error", error=f"{name}: {e}")
+            print(f"=== WARM-UP MISLUKT: {e} ===")
+        else:
+            _STATUS["state"] = "ready"
+        _STATUS["total_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+        _READY.set()
+        print(f"=== WARM-UP {_STATUS['state'].upper()} in {_STATUS['total_ms']} ms: {_STATUS['steps_ms']} ===")
+        return warm_status()
+
+
+def warm_up_background():
+    """Opwarmen in een daemon-thread (server_async: de event loop blijft /health beantwoorden)."""
+    # Meteen "warming", zodat /health niet "cold" (= ready) ziet voordat de thread draait
+    with _LOCK:
+        if not _READY.is_set():
+            _STATUS.update(state="warming", pid=os.getpid())
+    t = threading.Thread(target=warm_up, name="warm-up", daemon=True)
+    t.start()
+    return t
+
+
+def is_ready() -> bool:
+    """
+    True als warm_up() gelukt is, of als er nooit opgewarmd is ("cold": lazy laden, bv.
+    WARM_STARTUP=0 of `import server` in tests). False tijdens het opwarmen en na een fout.
+    """
+    return _STATUS["state"] in ("cold", "ready")
+
+
+def warm_status() -> dict:
+    out = dict(_STATUS, steps_ms=dict(_STATUS["steps_ms"]))
+    # pid != huidige pid: opgewarmd in de gunicorn-master en via fork geërfd
+    out["inherited"] = out["pid"] is not None and out["pid"] != os.getpid()
+    return out